@@ -14,11 +14,17 @@ aws s3 cp --recursive s3://alchemab-ml/autoantibody_model temporary/autoantibody
 
 
 # Download predict script
-wget -O temporary/predict.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/predict_cpu.py
+wget -O temporary/predict.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/predict.py
 wget -O temporary/analyse_metrics.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/analyse_metrics.py
 wget -O temporary/utils.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/utils.py
 wget -O temporary/aws_handler.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/aws_handler.py
 wget -O temporary/secrets_manager.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/secrets_manager.py
+wget -O temporary/prediction_cache.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/prediction_cache.py
+wget -O temporary/fast_tokenizer.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/fast_tokenizer.py
+wget -O temporary/ingest.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/ingest.py
+wget -O temporary/fasta.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/fasta.py
+wget -O temporary/sketches.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/sketches.py
+wget -O temporary/evaluation.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/evaluation.py
 wget -O temporary/handler.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/autoantibody_app/api/functions/classify-small/handler.py
 
 # Verify downloads
@@ -42,6 +48,30 @@ if [ ! -f "temporary/secrets_manager.py" ]; then
     echo "Error: aws secrets manager not downloaded"
     exit 1
 fi
+if [ ! -f "temporary/prediction_cache.py" ]; then
+    echo "Error: prediction cache not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/fast_tokenizer.py" ]; then
+    echo "Error: fast tokenizer not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/ingest.py" ]; then
+    echo "Error: ingest not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/fasta.py" ]; then
+    echo "Error: fasta not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/sketches.py" ]; then
+    echo "Error: sketches not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/evaluation.py" ]; then
+    echo "Error: evaluation not downloaded"
+    exit 1
+fi
 if [ ! -f "temporary/handler.py" ]; then
     echo "Error: classify small handler not downloaded"
     exit 1
@@ -23,6 +23,12 @@ wget -O /app/analyse_metrics.py https://raw.githubusercontent.com/JessAlchemab/F
 wget -O /app/utils.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/utils.py
 wget -O /app/aws_handler.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/aws_handler.py
 wget -O /app/secrets_manager.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/secrets_manager.py
+wget -O /app/prediction_cache.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/prediction_cache.py
+wget -O /app/fast_tokenizer.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/fast_tokenizer.py
+wget -O /app/ingest.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/ingest.py
+wget -O /app/fasta.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/fasta.py
+wget -O /app/sketches.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/sketches.py
+wget -O /app/evaluation.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/evaluation.py
 
 # Verify downloads
 if [ ! -d "/app/autoantibody_model" ]; then
@@ -45,5 +51,29 @@ if [ ! -f "/app/secrets_manager.py" ]; then
     echo "Error: aws secrets manager not downloaded"
     exit 1
 fi
+if [ ! -f "/app/prediction_cache.py" ]; then
+    echo "Error: prediction cache not downloaded"
+    exit 1
+fi
+if [ ! -f "/app/fast_tokenizer.py" ]; then
+    echo "Error: fast tokenizer not downloaded"
+    exit 1
+fi
+if [ ! -f "/app/ingest.py" ]; then
+    echo "Error: ingest not downloaded"
+    exit 1
+fi
+if [ ! -f "/app/fasta.py" ]; then
+    echo "Error: fasta not downloaded"
+    exit 1
+fi
+if [ ! -f "/app/sketches.py" ]; then
+    echo "Error: sketches not downloaded"
+    exit 1
+fi
+if [ ! -f "/app/evaluation.py" ]; then
+    echo "Error: evaluation not downloaded"
+    exit 1
+fi
 
 echo "All assets downloaded successfully"
\ No newline at end of file
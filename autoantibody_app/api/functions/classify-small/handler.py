@@ -1,81 +1,116 @@
+import io
 import json
 import os
-import shutil
-import subprocess
-import tempfile
-import csv
-import uuid
-from typing import Dict, Any
-import sys
-import time
+from typing import Dict, Any, List, Tuple
 import logging
-from predict import (predict_cpu)
+from Bio import SeqIO
+from predict import AutoantibodyClassifier, HUMAN_THRESHOLD
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-def create_input_file(sequence: str, temp_dir: str) -> str:
-    input_file = os.path.join(temp_dir, 'input.csv')
-    with open(input_file, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['sequence_vh'])  
-        writer.writerow([sequence])
-    return input_file
+# per-request limits, set in serverless.yml to fit the function's memory and timeout
+MAX_SEQUENCES = int(os.environ.get('MAX_SEQUENCES', 2000))
+MAX_SEQUENCE_LENGTH = int(os.environ.get('MAX_SEQUENCE_LENGTH', 256))
 
-def read_output_file(output_file: str) -> Dict[str, Any]:
-    try:
-        with open(output_file, 'r') as f:
-            reader = csv.DictReader(f, delimiter='\t')
-            return next(reader)  
-    except Exception as e:
-        return {"error": f"Failed to read output file: {str(e)}"}
+# loaded once per container at init, so warm invocations only pay for the forward pass
+classifier = AutoantibodyClassifier(
+    os.environ['TOKENIZER_PATH'],
+    os.environ['MODEL_PATH']
+)
+
+def classify_sequences(sequences: List[str]) -> List[Dict[str, Any]]:
+    human_probabilities = classifier.predict_sequences(sequences)
+    return [
+        {
+            'sequence_vh_x': sequence,
+            'human_probability': str(float(human_probability)),
+            'prediction': 'human' if human_probability > HUMAN_THRESHOLD else ''
+        }
+        for sequence, human_probability in zip(sequences, human_probabilities)
+    ]
+
+
+def parse_request(body: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """
+    Sequences to classify from the request body, which holds one of 'sequence' (a single
+    sequence), 'sequences' (a list) or 'fasta' (pasted FASTA text). Returns the sequences
+    and their ids: FASTA record ids, or None for plain sequences. Raises ValueError for
+    a malformed request or one outside the limits.
+    """
+    if not isinstance(body, dict):
+        raise ValueError('Request body must be a JSON object')
+    if body.get('fasta'):
+        if not isinstance(body['fasta'], str):
+            raise ValueError('fasta must be a string')
+        records = list(SeqIO.parse(io.StringIO(body['fasta']), 'fasta'))
+        ids = [record.id for record in records]
+        sequences = [str(record.seq) for record in records]
+    elif body.get('sequences'):
+        sequences = body['sequences']
+        if not isinstance(sequences, list) or not all(isinstance(sequence, str) for sequence in sequences):
+            raise ValueError('sequences must be a list of strings')
+        ids = [None] * len(sequences)
+    else:
+        sequence = body.get('sequence') or ''
+        if not isinstance(sequence, str):
+            raise ValueError('sequence must be a string')
+        sequences = [sequence]
+        ids = [None]
+
+    sequences = [''.join(sequence.split()).upper() for sequence in sequences]
+    if not any(sequences):
+        raise ValueError('No sequence provided')
+    if not all(sequences):
+        raise ValueError('Empty sequence provided')
+    if len(sequences) > MAX_SEQUENCES:
+        raise ValueError(f'Too many sequences: {len(sequences)}. Submit at most {MAX_SEQUENCES} per request, or upload a file')
+    too_long = [sequence for sequence in sequences if len(sequence) > MAX_SEQUENCE_LENGTH]
+    if too_long:
+        raise ValueError(f'{len(too_long)} sequences are longer than {MAX_SEQUENCE_LENGTH} residues')
+    return sequences, ids
 
 
 def lambda_handler(event, context):
     print('event')
     print(event)
     try:
-        body = json.loads(event['body'])
-        sequence = body.get('sequence')
-        
-        
-        if not sequence:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'No sequence provided'})
-            }
-
-        temp_dir = tempfile.mkdtemp()
-
         try:
-            input_file = create_input_file(sequence, temp_dir)
-            
-            file_id = str(uuid.uuid4())
-            output_file = f"autoantibody_annotated.{file_id}.tsv"
-            output_path = os.path.join(temp_dir, output_file)
-            predict_cpu(
-                input_file,
-                output_path,
-                os.environ['TOKENIZER_PATH'],
-                os.environ['MODEL_PATH']
-            )
-
-            results = read_output_file(output_path)
-            logger.info(f"Results: {results}")
-            
+            body = json.loads(event['body'])
+            sequences, ids = parse_request(body)
+        except ValueError as e:
             return {
-                'statusCode': 200,
+                'statusCode': 400,
                 'headers': {
                     'Access-Control-Allow-Origin': '*',
                     'Content-Type': 'application/json'
                 },
-                'body': json.dumps(results)
+                'body': json.dumps({'error': str(e)})
             }
 
-        finally:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-                logger.info("Cleaned up temp dir")
+        results = classify_sequences(sequences)
+        if not (body.get('fasta') or body.get('sequences')):
+            # single sequence requests keep their original response shape
+            results = results[0]
+        else:
+            for result, sequence_id in zip(results, ids):
+                if sequence_id is not None:
+                    result['id'] = sequence_id
+            results = {
+                'n_sequences': len(sequences),
+                'n_unique': len(set(sequences)),
+                'results': results
+            }
+        logger.info(f"Results: {results}")
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Content-Type': 'application/json'
+            },
+            'body': json.dumps(results)
+        }
 
     except Exception as e:
         logger.error(f"Error: {str(e)}", exc_info=True)
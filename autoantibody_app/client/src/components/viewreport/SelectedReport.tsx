@@ -71,12 +71,32 @@ export const SelectedReport = (props: Properties) => {
       info: "A histogram displaying the distribution of probabilities the autoantibody classifier model assigned to sequences in the input file.",
       name: "Probability Distribution",
     },
+    distinct_clonotypes: {
+      info: "Estimated number of distinct clonotypes (V gene and CDR3), counted with a HyperLogLog sketch to within about 1%",
+      name: "Distinct Clonotypes",
+    },
+    human_probability_quantiles: {
+      info: "Estimated 5th, 25th, 50th, 75th and 95th percentiles of the probabilities the autoantibody classifier model assigned to sequences in the input file",
+      name: "Probability Quantiles",
+    },
+    mu_count_quantiles: {
+      info: "Estimated 5th, 25th, 50th, 75th and 95th percentiles of the number of mutations from germline",
+      name: "Mutation Count Quantiles",
+    },
+    cdr3_length_quantiles: {
+      info: "Estimated 5th, 25th, 50th, 75th and 95th percentiles of CDR3 length",
+      name: "CDR3 Length Quantiles",
+    },
+    top_human_v_genes: {
+      info: "The most frequent V genes among sequences the autoantibody classifier model has assigned 'human'",
+      name: "Top V Genes (Human)",
+    },
     date: { info: "The date on which the file completed piping", name: "Date" },
   };
   // Convert the object to an array of key-value pairs for the table
   const tableData: DataItem[] = props.reportContent
     ? Object.entries(props.reportContent)
-        .filter(([key]) => key !== "hash_id" && key !== "probability_histogram")
+        .filter(([key]) => key !== "hash_id" && key !== "probability_histogram" && key !== "sketches")
         .map(([key, value]) => ({
           metric: key,
           statistic: value,
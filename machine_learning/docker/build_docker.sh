@@ -18,6 +18,18 @@ wget -O temporary/analyse_metrics.py https://raw.githubusercontent.com/JessAlche
 wget -O temporary/utils.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/utils.py
 wget -O temporary/aws_handler.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/aws_handler.py
 wget -O temporary/secrets_manager.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/secrets_manager.py
+wget -O temporary/prediction_cache.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/prediction_cache.py
+wget -O temporary/onnx_backend.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/onnx_backend.py
+wget -O temporary/quantization.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/quantization.py
+wget -O temporary/inference_server.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/inference_server.py
+wget -O temporary/batch_worker.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/batch_worker.py
+wget -O temporary/pipeline.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/pipeline.py
+wget -O temporary/fast_tokenizer.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/fast_tokenizer.py
+wget -O temporary/ingest.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/ingest.py
+wget -O temporary/fasta.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/fasta.py
+wget -O temporary/dedup.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/dedup.py
+wget -O temporary/sketches.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/sketches.py
+wget -O temporary/evaluation.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/machine_learning/predict/evaluation.py
 wget -O temporary/handler.py https://raw.githubusercontent.com/JessAlchemab/FinalYearProject/refs/heads/main/autoantibody_app/api/functions/classify-small/handler.py
 # Verify downloads
 if [ ! -d "temporary/autoantibody_model" ]; then
@@ -40,6 +52,54 @@ if [ ! -f "temporary/secrets_manager.py" ]; then
     echo "Error: aws secrets manager not downloaded"
     exit 1
 fi
+if [ ! -f "temporary/prediction_cache.py" ]; then
+    echo "Error: prediction cache not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/onnx_backend.py" ]; then
+    echo "Error: onnx backend not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/quantization.py" ]; then
+    echo "Error: quantization not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/inference_server.py" ]; then
+    echo "Error: inference server not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/batch_worker.py" ]; then
+    echo "Error: batch worker not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/pipeline.py" ]; then
+    echo "Error: pipeline not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/fast_tokenizer.py" ]; then
+    echo "Error: fast tokenizer not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/ingest.py" ]; then
+    echo "Error: ingest not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/fasta.py" ]; then
+    echo "Error: fasta not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/dedup.py" ]; then
+    echo "Error: dedup not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/sketches.py" ]; then
+    echo "Error: sketches not downloaded"
+    exit 1
+fi
+if [ ! -f "temporary/evaluation.py" ]; then
+    echo "Error: evaluation not downloaded"
+    exit 1
+fi
 if [ ! -f "temporary/handler.py" ]; then
     echo "Error: classify small handler not downloaded"
     exit 1
@@ -16,5 +16,5 @@ workflow {
 
     PREDICT_AUTOANTIBODY(ch_input)
 
-    METRICS_ANALYSIS(PREDICT_AUTOANTIBODY.out.output_file)
+    METRICS_ANALYSIS(PREDICT_AUTOANTIBODY.out.metrics_file)
 }
\ No newline at end of file
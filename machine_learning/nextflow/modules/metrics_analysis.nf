@@ -2,13 +2,14 @@ process METRICS_ANALYSIS {
     container "189545766043.dkr.ecr.eu-west-2.amazonaws.com/alchemab/autoantibody_classifier:latest"
     
     input:
-        tuple val(file_id), path(annotated_file)
+        // metrics accumulated by PREDICT_AUTOANTIBODY as it wrote the annotated file
+        tuple val(file_id), path(metrics_file)
         
     script:
-        println "Metrics analysis input file: ${annotated_file}" // Debug log
+        println "Metrics analysis input file: ${metrics_file}" // Debug log
         """
         python3 /app/analyse_metrics.py \\
-               --file_path ${annotated_file} \\
+               --metrics_files ${metrics_file} \\
                --hash_id ${params.hash_id} \\
                --rds_table ${params.rds_table} 
         """
@@ -8,7 +8,8 @@ process PREDICT_AUTOANTIBODY {
         tuple val(file_id), path(input_file)
     output:
         // path "autoantibody_annotated.tsv"
-        tuple val(file_id), path("autoantibody_annotated.${file_id}.tsv"), emit: output_file
+        tuple val(file_id), path("autoantibody_annotated.${file_id}.${params.output_format}"), emit: output_file
+        tuple val(file_id), path("autoantibody_metrics.${file_id}.json"), emit: metrics_file
     script:
         println "Input file: ${input_file}" // Log the input_file value
         println "Using container: ${task.container}"
@@ -17,11 +18,12 @@ process PREDICT_AUTOANTIBODY {
         def args = task.ext.args ? task.ext.args.join(' ') : ''
 
         """
-        torchrun --nproc_per_node=1 \\
+        torchrun --nproc_per_node=${params.with_gpu ? 1 : params.cpu_workers} \\
         /app/predict.py \\
         ${args} \\
         --input_path "${input_file}" \\
-        --output_file "autoantibody_annotated.${file_id}.tsv" \\
+        --output_file "autoantibody_annotated.${file_id}.${params.output_format}" \\
+        --metrics_file "autoantibody_metrics.${file_id}.json" \\
         --tokenizer_path /app/autoantibody_model/tokenizers \\
         --model_path /app/autoantibody_model/trained_model/classifier-model
         """
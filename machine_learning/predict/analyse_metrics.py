@@ -1,91 +1,445 @@
 import pandas as pd
 import numpy as np
-from pathlib import Path
-from aws_handler import upload_metrics_to_rds
+import pyarrow as pa
+import pyarrow.compute as pc
+from ingest import METRICS_COLUMNS, read_column_table
+from sketches import HeavyHitters, HyperLogLog, KLLSketch, hash_strings, mix_hashes
 import argparse
 import json
 
-def analyze_antibody_data(file_path):
+# bins of the human probability histogram, [0.00, 0.05) to [0.95, 1.00)
+HISTOGRAM_BINS = np.arange(0, 1.05, 0.05)
+HISTOGRAM_LABELS = [f"{HISTOGRAM_BINS[i]:.2f}-{HISTOGRAM_BINS[i+1]:.2f}" for i in range(len(HISTOGRAM_BINS)-1)]
+# quantiles reported from the KLL sketches
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+# number of V genes of human-predicted rows reported from the heavy hitters sketch
+TOP_V_GENES = 10
+
+
+def histogram_codes(probabilities):
+    """
+    Index i of the histogram bin HISTOGRAM_BINS[i] <= p < HISTOGRAM_BINS[i+1] of each
+    probability, as pd.cut(right=False) bins them, or -1 for missing and out of range
+    values. The bin is estimated as floor(20 p) and corrected by one against the edges,
+    which costs a few passes rather than a binary search per value.
+    """
+    probabilities = probabilities.astype(np.float64)
+    n_bins = len(HISTOGRAM_LABELS)
+    with np.errstate(invalid='ignore'):
+        in_range = (probabilities >= HISTOGRAM_BINS[0]) & (probabilities < HISTOGRAM_BINS[-1])
+    codes = np.floor(np.where(in_range, probabilities, 0) * n_bins).astype(np.int64)
+    np.clip(codes, 0, n_bins - 1, out=codes)
+    codes -= probabilities < HISTOGRAM_BINS[codes]
+    codes += probabilities >= HISTOGRAM_BINS[codes + 1]
+    codes[~in_range] = -1
+    return codes
+
+
+def dictionary_codes(column):
+    """
+    Returns:
+        tuple: (categories as a list, np.ndarray of each row's category index or -1 if missing)
+    """
+    if not pa.types.is_dictionary(column.type):
+        column = pc.dictionary_encode(column)
+    array = column.combine_chunks()
+    return array.dictionary.to_pylist(), pc.fill_null(array.indices, -1).to_numpy().astype(np.int64)
+
+
+def category_counts(column, rows=None):
+    """
+    Categories of a dictionary-encoded column and the number of rows in each, from one
+    bincount over the dictionary codes. Missing values are not counted.
+
+    Args:
+        column: Arrow column
+        rows: Boolean mask of the rows to count, or None for all of them
+
+    Returns:
+        tuple: (categories as a list of str, counts as an np.ndarray)
+    """
+    categories, codes = dictionary_codes(column)
+    if rows is not None:
+        codes = codes[rows]
+    counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+    return categories, counts
+
+
+def v_gene(call):
+    """V gene of a V call, without the allele: IGHV3-30*02 -> IGHV3-30"""
+    return call.split('*')[0]
+
+
+def clonotype_hashes(v_calls, cdr3s):
+    """
+    64-bit hashes of the distinct (V gene, CDR3) clonotypes among the rows with both.
+    Each distinct V call and CDR3 is hashed once, and each distinct pair of them mixed once.
+    """
+    v_call_categories, v_call_codes = dictionary_codes(v_calls)
+    cdr3_categories, cdr3_codes = dictionary_codes(cdr3s)
+    present = (v_call_codes >= 0) & (cdr3_codes >= 0)
+    pairs = pd.unique(v_call_codes[present] * len(cdr3_categories) + cdr3_codes[present])
+    gene_hashes = hash_strings([v_gene(call) for call in v_call_categories])
+    cdr3_hashes = hash_strings(cdr3_categories)
+    return mix_hashes(gene_hashes[pairs // len(cdr3_categories)], cdr3_hashes[pairs % len(cdr3_categories)])
+
+
+def percentage_of_rows(count, total_rows):
+    """(flags * 100).mean() for count flagged rows out of total_rows"""
+    if not total_rows:
+        return np.nan
+    return np.float64(count * 100) / total_rows
+
+
+def fraction_of_rows_percentage(count, total_rows):
+    """flags.mean() * 100 for count flagged rows out of total_rows"""
+    if not total_rows:
+        return np.nan
+    return np.float64(count) / total_rows * 100
+
+
+def mean_of_present(total, count):
+    """Series.mean() of a column whose count present values sum to total"""
+    if not count:
+        return np.nan
+    return np.float64(total) / count
+
+
+class CategoryCounts:
+    """Number of rows per category of a gene call column, e.g. v_call. Missing calls are not counted"""
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {})
+
+    def update(self, column):
+        categories, counts = category_counts(column)
+        for category, count in zip(categories, counts.tolist()):
+            if count:
+                self.counts[category] = self.counts.get(category, 0) + count
+
+    def merge(self, other):
+        for category, count in other.counts.items():
+            self.counts[category] = self.counts.get(category, 0) + count
+
+    def count(self, matches):
+        """Number of rows whose category satisfies matches(category), tested once per category"""
+        return sum(count for category, count in self.counts.items() if matches(category))
+
+
+class MeanAccumulator:
+    """Sum and number of the present values of a numeric column"""
+    def __init__(self, total=0, count=0):
+        self.total = total
+        self.count = count
+
+    def update(self, values):
+        if pa.types.is_integer(values.type):
+            self.total += pc.sum(values).as_py() or 0
+            self.count += pc.count(values).as_py()
+        else:
+            # summed as pandas sums them, so one update gives exactly Series.mean()
+            values = values.to_numpy().astype(np.float64)
+            self.total += float(np.nansum(values))
+            self.count += int(np.count_nonzero(~np.isnan(values)))
+
+    def merge(self, other):
+        self.total += other.total
+        self.count += other.count
+
+    def mean(self):
+        return mean_of_present(self.total, self.count)
+
+
+class HistogramAccumulator:
+    """Counts of human probabilities in each bin of HISTOGRAM_BINS"""
+    def __init__(self, counts=None):
+        self.counts = np.zeros(len(HISTOGRAM_LABELS), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    def update(self, probabilities):
+        codes = histogram_codes(probabilities.to_numpy())
+        self.counts += np.bincount(codes[codes >= 0], minlength=len(HISTOGRAM_LABELS))
+
+    def merge(self, other):
+        self.counts += other.counts
+
+    def to_json(self):
+        """Bin counts as JSON, most frequent first, ordered as pd.cut(...).value_counts() orders them"""
+        histogram = pd.Series(self.counts, index=HISTOGRAM_LABELS).sort_values(ascending=False, kind='stable')
+        return json.dumps(histogram.to_dict())
+
+
+class RepertoireSketches:
+    """
+    Statistics that would take memory in proportion to the repertoire to compute exactly,
+    kept in fixed-size mergeable sketches: the number of distinct clonotypes (V gene and
+    CDR3) in a HyperLogLog, quantiles of human_probability, mu_count_total and CDR3 length
+    in KLL sketches, and the most frequent V genes of human-predicted rows in a
+    Misra-Gries summary. The sketches are serialized into the metrics row (see to_json), so
+    runs can be aggregated from the RDS table alone (see aggregate_sketches).
+
+    Args:
+        precision (int): HyperLogLog precision. The distinct count has a relative standard
+            error of 1.04 / sqrt(2**precision)
+        k (int): KLL sketch size. Quantiles are within a rank error of about 2/k
+        capacity (int): V genes kept. Counts are low by at most n / (capacity + 1)
+    """
+    def __init__(self, precision=14, k=200, capacity=256):
+        self.clonotypes = HyperLogLog(precision)
+        self.human_probabilities = KLLSketch(k)
+        self.mu_counts = KLLSketch(k)
+        self.cdr3_lengths = KLLSketch(k)
+        self.human_v_genes = HeavyHitters(capacity)
+
+    def merge(self, other):
+        self.clonotypes.merge(other.clonotypes)
+        self.human_probabilities.merge(other.human_probabilities)
+        self.mu_counts.merge(other.mu_counts)
+        self.cdr3_lengths.merge(other.cdr3_lengths)
+        self.human_v_genes.merge(other.human_v_genes)
+        return self
+
+    def summary(self):
+        """
+        Returns:
+            dict: distinct_clonotypes, the human_probability, mu_count and cdr3_length
+            quantiles and top_human_v_genes, each None if nothing was added to its sketch.
+            The quantiles and V genes are JSON, as probability_histogram is
+        """
+        labels = [f'{fraction:.2f}' for fraction in QUANTILES]
+        summary = {}
+        summary['distinct_clonotypes'] = self.clonotypes.estimate() if self.clonotypes.registers.any() else None
+        for key, sketch in [
+            ('human_probability_quantiles', self.human_probabilities),
+            ('mu_count_quantiles', self.mu_counts),
+            ('cdr3_length_quantiles', self.cdr3_lengths)
+        ]:
+            summary[key] = json.dumps(dict(zip(labels, sketch.quantiles(QUANTILES)))) if sketch.n else None
+        summary['top_human_v_genes'] = json.dumps(self.human_v_genes.top(TOP_V_GENES)) if self.human_v_genes.n else None
+        return summary
+
+    def to_json(self):
+        return json.dumps({
+            'clonotypes': self.clonotypes.to_dict(),
+            'human_probabilities': self.human_probabilities.to_dict(),
+            'mu_counts': self.mu_counts.to_dict(),
+            'cdr3_lengths': self.cdr3_lengths.to_dict(),
+            'human_v_genes': self.human_v_genes.to_dict()
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        state = json.loads(text)
+        sketches = cls()
+        sketches.clonotypes = HyperLogLog.from_dict(state['clonotypes'])
+        sketches.human_probabilities = KLLSketch.from_dict(state['human_probabilities'])
+        sketches.mu_counts = KLLSketch.from_dict(state['mu_counts'])
+        sketches.cdr3_lengths = KLLSketch.from_dict(state['cdr3_lengths'])
+        sketches.human_v_genes = HeavyHitters.from_dict(state['human_v_genes'])
+        return sketches
+
+
+def aggregate_sketches(serialized):
+    """
+    Sketch statistics of several runs together, from the sketches column of their
+    metrics rows, without reading their files
+
+    Args:
+        serialized (list): RepertoireSketches.to_json strings, e.g. from the RDS table
+
+    Returns:
+        dict: As RepertoireSketches.summary
+    """
+    sketches = RepertoireSketches.from_json(serialized[0])
+    for text in serialized[1:]:
+        sketches.merge(RepertoireSketches.from_json(text))
+    return sketches.summary()
+
+
+class MetricsAccumulator:
+    """
+    The metrics of analyze_antibody_data, accumulated over chunks of annotated rows so
+    they can be computed while the output is written rather than by reading it back.
+    Accumulators of different chunks, files or shards combine with merge, and to_dict /
+    from_dict carry their state through JSON (see save and load). precision, k and
+    capacity set the error bounds of the sketches, see RepertoireSketches.
+    """
+    def __init__(self, precision=14, k=200, capacity=256):
+        self.total_rows = 0
+        # metrics columns seen in any chunk; the metrics of absent columns are None
+        self.columns = set()
+        self.human_rows = 0
+        self.v_calls = CategoryCounts()
+        self.c_calls = CategoryCounts()
+        self.cdr3_lengths = MeanAccumulator()
+        self.mu_counts = MeanAccumulator()
+        self.histogram = HistogramAccumulator()
+        self.sketches = RepertoireSketches(precision, k, capacity)
+
+    def update(self, chunk):
+        """Add a chunk of annotated rows, as a DataFrame or Arrow table"""
+        if isinstance(chunk, pd.DataFrame):
+            chunk = pa.Table.from_pandas(chunk[[name for name in METRICS_COLUMNS if name in chunk.columns]], preserve_index=False)
+        table = chunk.select([name for name in METRICS_COLUMNS if name in chunk.column_names]).unify_dictionaries()
+        self.total_rows += table.num_rows
+        self.columns.update(table.column_names)
+
+        if 'prediction' in table.column_names:
+            human = pc.fill_null(pc.equal(table['prediction'], 'human'), False)
+            self.human_rows += pc.sum(human).as_py() or 0
+        if 'v_call' in table.column_names:
+            self.v_calls.update(table['v_call'])
+            if 'prediction' in table.column_names:
+                categories, counts = category_counts(table['v_call'], human.to_numpy())
+                human_v_genes = {}
+                for call, count in zip(categories, counts.tolist()):
+                    if count:
+                        human_v_genes[v_gene(call)] = human_v_genes.get(v_gene(call), 0) + count
+                self.sketches.human_v_genes.update(human_v_genes)
+        if 'c_call' in table.column_names:
+            self.c_calls.update(table['c_call'])
+        # a chunk in which every CDR3 is missing has no strings to measure
+        if 'cdr3_aa' in table.column_names and not pa.types.is_null(table['cdr3_aa'].type):
+            cdr3_lengths = pc.utf8_length(table['cdr3_aa'])
+            self.cdr3_lengths.update(cdr3_lengths)
+            self.sketches.cdr3_lengths.update(cdr3_lengths.to_numpy())
+            if 'v_call' in table.column_names:
+                self.sketches.clonotypes.update(clonotype_hashes(table['v_call'], table['cdr3_aa']))
+        if 'mu_count_total' in table.column_names:
+            self.mu_counts.update(table['mu_count_total'])
+            self.sketches.mu_counts.update(table['mu_count_total'].to_numpy())
+        if 'human_probability' in table.column_names:
+            self.histogram.update(table['human_probability'])
+            self.sketches.human_probabilities.update(table['human_probability'].to_numpy())
+
+    def merge(self, other):
+        """Add the rows accumulated by other"""
+        self.total_rows += other.total_rows
+        self.columns.update(other.columns)
+        self.human_rows += other.human_rows
+        self.v_calls.merge(other.v_calls)
+        self.c_calls.merge(other.c_calls)
+        self.cdr3_lengths.merge(other.cdr3_lengths)
+        self.mu_counts.merge(other.mu_counts)
+        self.histogram.merge(other.histogram)
+        self.sketches.merge(other.sketches)
+        return self
+
+    def metrics(self):
+        """
+        Returns:
+            dict: The metrics of every row added, as analyze_antibody_data returns them
+        """
+        total_rows = self.total_rows
+        metrics = {}
+        metrics['total_rows'] = total_rows
+        metrics['human_rows'] = np.int64(self.human_rows)
+
+        if 'v_call' in self.columns:
+            metrics['IGHV4_34_percentage'] = percentage_of_rows(self.v_calls.count(lambda call: 'IGHV4-34' in call), total_rows)
+            metrics['IGHV3_30_percentage'] = percentage_of_rows(self.v_calls.count(lambda call: 'IGHV3-30' in call), total_rows)
+        else:
+            metrics['IGHV4_34_percentage'] = None
+            metrics['IGHV3_30_percentage'] = None
+
+        if 'c_call' in self.columns:
+            metrics['IGHG_percentage'] = percentage_of_rows(self.c_calls.count(lambda call: call.startswith('IGHG')), total_rows)
+            for subclass in ['IGHG1', 'IGHG2', 'IGHG3', 'IGHG4']:
+                metrics[f'{subclass}_percentage'] = fraction_of_rows_percentage(self.c_calls.counts.get(subclass, 0), total_rows)
+        else:
+            metrics['IGHG_percentage'] = None
+            for subclass in ['IGHG1', 'IGHG2', 'IGHG3', 'IGHG4']:
+                metrics[f'{subclass}_percentage'] = None
+
+        metrics['average_cdr3_length'] = self.cdr3_lengths.mean() if 'cdr3_aa' in self.columns else None
+        metrics['average_mu_count'] = self.mu_counts.mean() if 'mu_count_total' in self.columns else None
+        if 'prediction' in self.columns:
+            metrics['human_prediction_percentage'] = fraction_of_rows_percentage(self.human_rows, total_rows)
+        else:
+            metrics['human_prediction_percentage'] = None
+        metrics['probability_histogram'] = self.histogram.to_json() if 'human_probability' in self.columns else None
+        metrics.update(self.sketches.summary())
+        metrics['sketches'] = self.sketches.to_json()
+        return metrics
+
+    def to_dict(self):
+        return {
+            'total_rows': self.total_rows,
+            'columns': sorted(self.columns),
+            'human_rows': self.human_rows,
+            'v_call_counts': self.v_calls.counts,
+            'c_call_counts': self.c_calls.counts,
+            'cdr3_length': [self.cdr3_lengths.total, self.cdr3_lengths.count],
+            'mu_count_total': [self.mu_counts.total, self.mu_counts.count],
+            'probability_histogram': self.histogram.counts.tolist(),
+            'sketches': self.sketches.to_json()
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        accumulator = cls()
+        accumulator.total_rows = state['total_rows']
+        accumulator.columns = set(state['columns'])
+        accumulator.human_rows = state['human_rows']
+        accumulator.v_calls = CategoryCounts(state['v_call_counts'])
+        accumulator.c_calls = CategoryCounts(state['c_call_counts'])
+        accumulator.cdr3_lengths = MeanAccumulator(*state['cdr3_length'])
+        accumulator.mu_counts = MeanAccumulator(*state['mu_count_total'])
+        accumulator.histogram = HistogramAccumulator(state['probability_histogram'])
+        accumulator.sketches = RepertoireSketches.from_json(state['sketches'])
+        return accumulator
+
+    def save(self, path):
+        """Write the accumulated state, and the metrics it gives, as JSON"""
+        metrics = {key: value.item() if isinstance(value, np.generic) else value for key, value in self.metrics().items()}
+        with open(path, 'w') as f:
+            json.dump({'accumulator': self.to_dict(), 'metrics': metrics}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f)['accumulator'])
+
+
+def merge_metrics_files(paths, precision=None, k=None, capacity=None):
+    """
+    MetricsAccumulator of every row counted in the given saved metrics files. The
+    sketches keep the sizes they were saved with, the smaller where files differ.
+    precision, k and capacity, if given, shrink them further; a sketch cannot be made
+    larger than it was built.
+    """
+    accumulator = MetricsAccumulator.load(paths[0])
+    for path in paths[1:]:
+        accumulator.merge(MetricsAccumulator.load(path))
+    if precision is not None or k is not None or capacity is not None:
+        sketches = accumulator.sketches
+        # merging an empty accumulator of the requested sizes shrinks every sketch to them
+        accumulator.merge(MetricsAccumulator(
+            precision or sketches.clonotypes.precision,
+            k or sketches.human_probabilities.k,
+            capacity or sketches.human_v_genes.capacity
+        ))
+    return accumulator
+
+
+def analyze_antibody_data(file_path, precision=14, k=200, capacity=256):
     """
     Analyze antibody sequencing data from a parquet or tsv file.
+
+    Each column is scanned once, on its Arrow representation. v_call and c_call are
+    counted per category, and the gene matches are worked out once per category rather
+    than per row. The metrics are identical to the per-metric pandas scans this
+    replaces, down to the order of the floating point operations.
     
     Args:
         file_path (str): Path to the input file
+        precision, k, capacity: Error bounds of the sketch statistics, see RepertoireSketches
         
     Returns:
         dict: Dictionary containing the computed metrics
     """
-    # Read the file based on extension
-    path = Path(file_path)
-    if path.suffix == '.parquet':
-        df = pd.read_parquet(file_path)
-    elif path.suffix == '.tsv':
-        df = pd.read_csv(file_path, sep='\t')
-    elif path.suffix == '.csv':
-        df = pd.read_csv(file_path)
-    else:
-        raise ValueError("File must be .parquet or .tsv/.txt")
-    
-    metrics = {}
-    
-    # Store total number of rows
-    metrics['total_rows'] = len(df)
-    metrics['human_rows'] = (df['prediction'] == 'human').sum()
-
-    # V gene metrics
-    if 'v_call' in df.columns:
-        metrics['IGHV4_34_percentage'] = (df['v_call'].str.contains('IGHV4-34', na=False) * 100).mean()
-        metrics['IGHV3_30_percentage'] = (df['v_call'].str.contains('IGHV3-30', na=False) * 100).mean()
-    else:
-        metrics['IGHV4_34_percentage'] = None
-        metrics['IGHV3_30_percentage'] = None
-    
-    # Constant region metrics
-    if 'c_call' in df.columns:
-        metrics['IGHG_percentage'] = (df['c_call'].str.startswith('IGHG', na=False) * 100).mean()
-        
-        # Individual IGHG subclass percentages
-        for subclass in ['IGHG1', 'IGHG2', 'IGHG3', 'IGHG4']:
-            metrics[f'{subclass}_percentage'] = (df['c_call'] == subclass).mean() * 100
-    else:
-        metrics['IGHG_percentage'] = None
-        for subclass in ['IGHG1', 'IGHG2', 'IGHG3', 'IGHG4']:
-            metrics[f'{subclass}_percentage'] = None
-    
-    # CDR3 length
-    if 'cdr3_aa' in df.columns:
-        metrics['average_cdr3_length'] = df['cdr3_aa'].str.len().mean()
-    else:
-        metrics['average_cdr3_length'] = None
-    
-    # Mu count
-    if 'mu_count_total' in df.columns:
-        metrics['average_mu_count'] = df['mu_count_total'].mean()
-    else:
-        metrics['average_mu_count'] = None
-    
-    # Prediction percentage
-    if 'prediction' in df.columns:
-        metrics['human_prediction_percentage'] = (df['prediction'] == 'human').mean() * 100
-    else:
-        metrics['human_prediction_percentage'] = None
-    
-    # Human probability histogram data
-    if 'human_probability' in df.columns:
-        # Create bins from 0 to 1 with step size 0.05
-        bins = np.arange(0, 1.05, 0.05)
-        
-        # Create histogram data
-        hist_data = pd.cut(df['human_probability'], 
-                          bins=bins, 
-                          right=False,
-                          labels=[f"{bins[i]:.2f}-{bins[i+1]:.2f}" for i in range(len(bins)-1)])
-        
-        metrics['probability_histogram'] = json.dumps(hist_data.value_counts().to_dict())
-    else:
-        metrics['probability_histogram'] = None
-    
-    return metrics
+    # Read only the columns the metrics use, with gene calls dictionary encoded
+    accumulator = MetricsAccumulator(precision, k, capacity)
+    accumulator.update(read_column_table(file_path, METRICS_COLUMNS))
+    return accumulator.metrics()
 
 def format_metrics(metrics):
     """
@@ -114,6 +468,17 @@ def format_metrics(metrics):
     formatted += f"Average mu count: {metrics['average_mu_count']:.2f}\n" if metrics['average_mu_count'] is not None else "Average mu count: N/A\n"
     formatted += f"Human prediction percentage: {metrics['human_prediction_percentage']:.2f}%\n" if metrics['human_prediction_percentage'] is not None else "Human prediction percentage: N/A\n"
     
+    # Sketch estimates
+    formatted += "\nRepertoire Estimates:\n"
+    formatted += f"Distinct clonotypes: {metrics['distinct_clonotypes']}\n" if metrics['distinct_clonotypes'] is not None else "Distinct clonotypes: N/A\n"
+    for key, name in [
+        ('human_probability_quantiles', 'Human probability quantiles'),
+        ('mu_count_quantiles', 'Mu count quantiles'),
+        ('cdr3_length_quantiles', 'CDR3 length quantiles'),
+        ('top_human_v_genes', 'Top V genes of human predictions')
+    ]:
+        formatted += f"{name}: {metrics[key] if metrics[key] is not None else 'N/A'}\n"
+
     # Histogram data
     if metrics['probability_histogram'] is not None:
         formatted += "\nHuman Probability Distribution:\n"
@@ -127,8 +492,16 @@ if __name__ == "__main__":
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
     parser.add_argument('--file_path', 
-                       help='Path to the input file (parquet or TSV format)')
-    parser.add_argument('--rds_table', help='RDS table to add metrics to')
+                       help='Path or s3:// URI of the input file (parquet, or CSV/TSV optionally compressed as .gz, .zst or .bz2)')
+    parser.add_argument('--metrics_files', nargs='+', default=None,
+                       help='Metrics JSON files written by predict.py --metrics_file, e.g. one per shard. Their counts are merged instead of reading --file_path, and their sketches shrunk to the sizes below where they were built larger')
+    parser.add_argument('--hll_precision', type=int, default=14,
+                       help='HyperLogLog precision of the distinct clonotype count, whose relative error is 1.04 / sqrt(2**precision)')
+    parser.add_argument('--quantile_k', type=int, default=200,
+                       help='Size of the KLL quantile sketches, whose rank error is about 2/k')
+    parser.add_argument('--v_gene_capacity', type=int, default=256,
+                       help='V genes kept by the heavy hitters sketch of human-predicted rows')
+    parser.add_argument('--rds_table', help='RDS table to add metrics to. Unused: metrics go to autoantibody_dev, the table the report API reads')
     parser.add_argument('--hash_id', help='hash id from zeus to use as primary key')
     parser.add_argument('--output', '-o',
                        help='Path to save output as JSON (optional)',
@@ -139,11 +512,16 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     try:
-        metrics = analyze_antibody_data(args.file_path)
+        if args.metrics_files:
+            metrics = merge_metrics_files(args.metrics_files, args.hll_precision, args.quantile_k, args.v_gene_capacity).metrics()
+        else:
+            metrics = analyze_antibody_data(args.file_path, args.hll_precision, args.quantile_k, args.v_gene_capacity)
         if not args.quiet:
             print(format_metrics(metrics))
         print("METRICS")
         print(metrics)
+        # aws_handler needs psycopg2 and the RDS credentials, so it is only imported to upload
+        from aws_handler import upload_metrics_to_rds
         upload_metrics_to_rds(metrics, args.hash_id, args.rds_table)
     except Exception as e:
         print(f"Error analyzing file: {str(e)}")
\ No newline at end of file
@@ -3,19 +3,58 @@ import os
 import sys
 from urllib.parse import urlparse
 from botocore.exceptions import ClientError
-import pandas as pd
+import numpy as np
 import psycopg2
+from psycopg2 import sql
 from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from psycopg2 import OperationalError
 from secrets_manager import get_secret
+from contextlib import contextmanager
 import datetime
 
-rds_secrets = get_secret("FRANKLIN_RDS")
-rds_database_name = rds_secrets["DB_NAME"]
-rds_database_user = rds_secrets["DB_USER"]
-rds_database_host = rds_secrets["DB_HOST"]
-rds_database_port = rds_secrets["DB_PORT"]
-rds_database_password = rds_secrets["DB_PASSWORD"]
+# database the metrics tables are in
+METRICS_DATABASE = "franklin_metrics"
+# table the pipeline's metrics go to, whatever --rds_table it passes: the report API
+# (contact-rds) reads this table only, and the per-stage tables autoantibody_<stage> do not exist
+RDS_METRICS_TABLE = "autoantibody_dev"
+# libpq connection string used instead of the FRANKLIN_RDS secret if set, e.g. for a local Postgres
+METRICS_DSN_VARIABLE = "FRANKLIN_METRICS_DSN"
+# columns of a metrics table besides hash_id and date, as keys of analyse_metrics' metrics.
+# The sketch columns from distinct_clonotypes on are added by migrations/001_repertoire_sketch_columns.sql
+RDS_METRICS_COLUMNS = [
+    'total_rows',
+    'human_rows',
+    'IGHV4_34_percentage',
+    'IGHV3_30_percentage',
+    'IGHG_percentage',
+    'IGHG1_percentage',
+    'IGHG2_percentage',
+    'IGHG3_percentage',
+    'IGHG4_percentage',
+    'average_cdr3_length',
+    'average_mu_count',
+    'human_prediction_percentage',
+    'probability_histogram',
+    'distinct_clonotypes',
+    'human_probability_quantiles',
+    'mu_count_quantiles',
+    'cdr3_length_quantiles',
+    'top_human_v_genes',
+    'sketches',
+]
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 4
+# see rds_credentials and get_connection_pool
+rds_secrets = None
+connection_pool = None
+
+def rds_credentials():
+    """The FRANKLIN_RDS secret, fetched from Secrets Manager on first use"""
+    global rds_secrets
+    if rds_secrets is None:
+        rds_secrets = get_secret("FRANKLIN_RDS")
+    return rds_secrets
 
 def create_connection(db_name, db_user, db_password, db_host, db_port):
     connection = None
@@ -45,85 +84,91 @@ def execute_query(conn, query):
     finally:
         conn.close()
 
-def upload_metrics_to_rds(metrics, hash_id, table_name):
+def get_connection_pool():
     """
-    Upload the metrics dictionary to an RDS table using the provided hash_id as the primary key.
-    
-    Args:
-        metrics (dict): Dictionary of metrics to be uploaded.
-        hash_id (str): Unique identifier to use as the primary key.
-        table_name (str): Name of the RDS table to upload to.
-        rds_connection_string (str): Connection string for the RDS database.
+    Pool of connections to the metrics database, created on first use and shared by
+    every upload in the process, so repeated uploads do not reconnect each time.
+    Connects to $FRANKLIN_METRICS_DSN if it is set, otherwise with the FRANKLIN_RDS secret.
     """
-    # Convert metrics dictionary to a DataFrame with hash_id as the index
-    print(metrics)
-    # df = pd.DataFrame(list(metrics.items()), columns=['metric', 'values'])
-    df = pd.DataFrame([metrics])
-    
-    
-    df['hash_id'] = hash_id
-    print(df)
-    
-    # Establish connection to RDS
-    connection = create_connection(
-        "franklin_metrics", 
-        rds_database_user, 
-        rds_database_password, 
-        rds_database_host, 
-        rds_database_port
-    )
-    cursor = connection.cursor()
+    global connection_pool
+    if connection_pool is None:
+        dsn = os.environ.get(METRICS_DSN_VARIABLE)
+        if dsn:
+            connection_pool = ThreadedConnectionPool(POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, dsn=dsn)
+        else:
+            credentials = rds_credentials()
+            connection_pool = ThreadedConnectionPool(
+                POOL_MIN_CONNECTIONS,
+                POOL_MAX_CONNECTIONS,
+                database=METRICS_DATABASE,
+                user=credentials["DB_USER"],
+                password=credentials["DB_PASSWORD"],
+                host=credentials["DB_HOST"],
+                port=credentials["DB_PORT"],
+            )
+        print("Connection pool to PostgreSQL DB created")
+    return connection_pool
 
-    # Insert data into PostgreSQL table
-    insert_query = """
-        INSERT INTO autoantibody_dev (
-            hash_id,
-            date,
-            total_rows,
-            human_rows,
-            IGHV4_34_percentage,
-            IGHV3_30_percentage,
-            IGHG_percentage,
-            IGHG1_percentage,
-            IGHG2_percentage,
-            IGHG3_percentage,
-            IGHG4_percentage,
-            average_cdr3_length,
-            average_mu_count,
-            human_prediction_percentage,
-            probability_histogram
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
+@contextmanager
+def pooled_connection():
+    """A connection from the pool, committed if the block succeeds and rolled back if not"""
+    pool = get_connection_pool()
+    connection = pool.getconn()
+    try:
+        with connection:
+            yield connection
+    finally:
+        pool.putconn(connection)
+
+def to_sql_value(value):
+    # numpy scalars, e.g. the counts of analyse_metrics, are not adapted by psycopg2
+    return value.item() if isinstance(value, np.generic) else value
 
-    # Assuming 'hash_id' is provided separately
+def upload_metrics_batch(rows, table_name):
+    """
+    Upsert the metrics of many runs or shards into table_name in one statement.
+    Rows are keyed on hash_id: uploading a hash_id again, e.g. from a retried
+    Nextflow task, replaces its row rather than duplicating it. The upsert needs the
+    unique index on hash_id added by migrations/002_unique_hash_id.sql.
 
-    # Insert each row in the DataFrame
+    Args:
+        rows (list): (hash_id, metrics dict) pairs. Of repeated hash_ids the last is kept.
+        table_name (str): Name of the RDS table to upload to, optionally schema qualified.
+    """
     date = datetime.datetime.now()
+    # a statement may not upsert the same key twice
+    latest = {hash_id: metrics for hash_id, metrics in rows}
+    values = [
+        (hash_id, date, *(to_sql_value(metrics[name]) for name in RDS_METRICS_COLUMNS))
+        for hash_id, metrics in latest.items()
+    ]
+    # the tables were created with unquoted names, which Postgres folds to lower case
+    columns = [name.lower() for name in ['hash_id', 'date'] + RDS_METRICS_COLUMNS]
+    query = sql.SQL("INSERT INTO {table} ({columns}) VALUES %s ON CONFLICT (hash_id) DO UPDATE SET {updates}").format(
+        table=sql.Identifier(*table_name.split('.')),
+        columns=sql.SQL(', ').join(map(sql.Identifier, columns)),
+        updates=sql.SQL(', ').join(
+            sql.SQL("{column} = EXCLUDED.{column}").format(column=sql.Identifier(name))
+            for name in columns[1:]
+        ),
+    )
 
-    for _, row in df.iterrows():
-        cursor.execute(insert_query, (
-            hash_id,
-            date,
-            row['total_rows'],
-            row['human_rows'],
-            row['IGHV4_34_percentage'],
-            row['IGHV3_30_percentage'],
-            row['IGHG_percentage'],
-            row['IGHG1_percentage'],
-            row['IGHG2_percentage'],
-            row['IGHG3_percentage'],
-            row['IGHG4_percentage'],
-            row['average_cdr3_length'],
-            row['average_mu_count'],
-            row['human_prediction_percentage'],
-            row['probability_histogram']
-        ))
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            # a single page, so the whole batch is one round trip
+            execute_values(cursor, query, values, page_size=max(len(values), 1))
 
-    # Commit the transaction
-    connection.commit()
+    print(f"Metrics of {len(values)} runs upserted to RDS table: {table_name}")
 
-    # Close the cursor and connection
-    cursor.close()
-    connection.close()
+def upload_metrics_to_rds(metrics, hash_id, table_name):
+    """
+    Upload the metrics dictionary to an RDS table using the provided hash_id as the primary key.
     
-    print(f"Metrics uploaded to RDS table: {table_name}")
\ No newline at end of file
+    Args:
+        metrics (dict): Dictionary of metrics to be uploaded.
+        hash_id (str): Unique identifier to use as the primary key.
+        table_name (str): RDS table named by the caller. Unused: the metrics always go to
+            RDS_METRICS_TABLE, the table the report API reads.
+    """
+    print(metrics)
+    upload_metrics_batch([(hash_id, metrics)], RDS_METRICS_TABLE)
@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import shutil
+import signal
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import boto3
+
+from analyse_metrics import MetricsAccumulator
+from predict import AutoantibodyClassifier
+
+
+class SQSQueue:
+    """
+    Job queue backed by Amazon SQS. Failed jobs are made visible again for another
+    worker; the queue's redrive policy decides when they move to a dead-letter queue.
+    """
+    def __init__(self, queue_url, visibility_timeout=600):
+        self.queue_url = queue_url
+        self.visibility_timeout = visibility_timeout
+        self.client = boto3.client('sqs')
+
+    def send(self, body):
+        self.client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(body))
+
+    def receive(self, wait_seconds=20):
+        """Returns (receipt, body) for the next job, or None if none arrived within wait_seconds"""
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=1,
+            WaitTimeSeconds=wait_seconds,
+            VisibilityTimeout=self.visibility_timeout
+        )
+        for message in response.get('Messages', []):
+            return message['ReceiptHandle'], json.loads(message['Body'])
+        return None
+
+    def extend(self, receipt):
+        self.client.change_message_visibility(
+            QueueUrl=self.queue_url, ReceiptHandle=receipt, VisibilityTimeout=self.visibility_timeout
+        )
+
+    def delete(self, receipt):
+        self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt)
+
+    def release(self, receipt):
+        self.client.change_message_visibility(QueueUrl=self.queue_url, ReceiptHandle=receipt, VisibilityTimeout=0)
+
+
+class SQLiteQueue:
+    """
+    Local stand-in for SQSQueue with the same visibility-timeout semantics, kept in a
+    SQLite file. A job released more than max_receives times is marked failed instead
+    of being retried.
+    """
+    def __init__(self, queue_path, visibility_timeout=600, max_receives=3):
+        self.queue_path = queue_path
+        self.visibility_timeout = visibility_timeout
+        self.max_receives = max_receives
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(queue_path, timeout=60, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    body TEXT NOT NULL,
+                    visible_at REAL NOT NULL,
+                    receive_count INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending'
+                )
+            """)
+
+    def send(self, body):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO messages (body, visible_at) VALUES (?, ?)", (json.dumps(body), time.time())
+            )
+
+    def receive(self, wait_seconds=20):
+        deadline = time.time() + wait_seconds
+        while True:
+            with self.lock, self.connection:
+                now = time.time()
+                row = self.connection.execute(
+                    "SELECT id, body FROM messages WHERE status = 'pending' AND visible_at <= ? ORDER BY id LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is not None:
+                    self.connection.execute(
+                        "UPDATE messages SET visible_at = ?, receive_count = receive_count + 1 WHERE id = ?",
+                        (now + self.visibility_timeout, row[0])
+                    )
+                    return row[0], json.loads(row[1])
+            if time.time() >= deadline:
+                return None
+            time.sleep(min(1.0, max(0.0, deadline - time.time())))
+
+    def extend(self, receipt):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE messages SET visible_at = ? WHERE id = ?", (time.time() + self.visibility_timeout, receipt)
+            )
+
+    def delete(self, receipt):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM messages WHERE id = ?", (receipt,))
+
+    def release(self, receipt):
+        with self.lock, self.connection:
+            self.connection.execute(
+                """
+                UPDATE messages
+                SET visible_at = ?, status = CASE WHEN receive_count >= ? THEN 'failed' ELSE 'pending' END
+                WHERE id = ?
+                """,
+                (time.time(), self.max_receives, receipt)
+            )
+
+
+def open_queue(queue_url, visibility_timeout=600, max_receives=3):
+    """SQS for an https:// queue URL, otherwise a local SQLite queue file"""
+    if queue_url.startswith('https://'):
+        return SQSQueue(queue_url, visibility_timeout)
+    return SQLiteQueue(queue_url, visibility_timeout, max_receives)
+
+
+def fetch(uri, directory):
+    """Local path of uri, downloading it into directory first if it is on S3"""
+    if not uri.startswith('s3://'):
+        return uri
+    parsed = urlparse(uri)
+    local_path = os.path.join(directory, os.path.basename(parsed.path))
+    boto3.client('s3').download_file(parsed.netloc, parsed.path.lstrip('/'), local_path)
+    return local_path
+
+
+def publish(local_path, uri):
+    """Copy local_path to uri, which may be on S3"""
+    if uri.startswith('s3://'):
+        parsed = urlparse(uri)
+        boto3.client('s3').upload_file(local_path, parsed.netloc, parsed.path.lstrip('/'))
+    elif os.path.abspath(local_path) != os.path.abspath(uri):
+        shutil.copyfile(local_path, uri)
+
+
+class BatchWorker:
+    """
+    Long-running replacement for one Nextflow PREDICT_AUTOANTIBODY + METRICS_ANALYSIS run
+    per container. The model is loaded once; each job message
+
+        {"input_uri": ..., "output_uri": ..., "hash_id": ..., "rds_table": optional}
+
+    is predicted in-process, its output uploaded and its metrics written to RDS, and the
+    message deleted on success or released for a retry on failure. While a job runs its
+    message visibility is extended so no other worker picks it up.
+
+    Args:
+        queue: SQSQueue or SQLiteQueue
+        classifier (AutoantibodyClassifier): Resident model, shared by the job threads
+        concurrency (int): Number of jobs processed at once
+        rds_table (str): Default table for metrics, passed on to upload_metrics_to_rds, which writes
+            to aws_handler.RDS_METRICS_TABLE. None skips the upload unless the message names one
+        translation_processes (int): Processes used to translate AIRR inputs
+    """
+    def __init__(self, queue, classifier, concurrency=1, rds_table=None, translation_processes=1):
+        self.queue = queue
+        self.classifier = classifier
+        self.concurrency = concurrency
+        self.rds_table = rds_table
+        self.translation_processes = translation_processes
+        self.stopping = threading.Event()
+
+    def stop(self, *_):
+        """Stop taking new jobs; jobs already running are finished and acknowledged"""
+        print('Draining: finishing running jobs and taking no new ones')
+        self.stopping.set()
+
+    def keep_visible(self, receipt, done):
+        while not done.wait(self.queue.visibility_timeout / 2):
+            self.queue.extend(receipt)
+
+    def process(self, job):
+        with tempfile.TemporaryDirectory() as work_dir:
+            input_path = fetch(job['input_uri'], work_dir)
+            output_path = os.path.join(work_dir, os.path.basename(urlparse(job['output_uri']).path))
+            rds_table = job.get('rds_table', self.rds_table)
+            # the metrics are accumulated as the output is written, rather than read back from it
+            metrics_path = os.path.join(work_dir, 'metrics.json') if rds_table else None
+            self.classifier.predict_file(input_path, output_path, self.translation_processes, metrics_path)
+            publish(output_path, job['output_uri'])
+
+            if rds_table:
+                # aws_handler needs psycopg2 and the RDS credentials, so it is only imported to upload
+                from aws_handler import upload_metrics_to_rds
+                upload_metrics_to_rds(MetricsAccumulator.load(metrics_path).metrics(), job['hash_id'], rds_table)
+
+    def poll(self):
+        while not self.stopping.is_set():
+            message = self.queue.receive(wait_seconds=5)
+            if message is None:
+                continue
+            receipt, job = message
+
+            done = threading.Event()
+            heartbeat = threading.Thread(target=self.keep_visible, args=(receipt, done), daemon=True)
+            heartbeat.start()
+            start = time.perf_counter()
+            try:
+                self.process(job)
+            except Exception as e:
+                print(f"Job {job.get('hash_id')} failed, releasing for retry: {e}")
+                self.queue.release(receipt)
+            else:
+                self.queue.delete(receipt)
+                print(f"Job {job.get('hash_id')} done in {time.perf_counter() - start:.1f}s")
+            finally:
+                done.set()
+                heartbeat.join()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pollers = [executor.submit(self.poll) for _ in range(self.concurrency)]
+            for poller in pollers:
+                poller.result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Long-running prediction worker which takes jobs from a queue and keeps the model loaded')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Process jobs until SIGTERM')
+    enqueue_parser = subparsers.add_parser('enqueue', help='Add a job to the queue')
+    for command_parser in (run_parser, enqueue_parser):
+        command_parser.add_argument('--queue_url', type=str, required=True, help='SQS queue URL, or a SQLite file used as a local queue')
+    run_parser.add_argument('--tokenizer_path', type=str, default='./fabcon-small/', help='Path to the tokenizer for your model')
+    run_parser.add_argument('--model_path', type=str, required=True, help='Path to the model')
+    run_parser.add_argument('--concurrency', type=int, default=1, help='Number of jobs processed at once')
+    run_parser.add_argument('--visibility_timeout', type=int, default=600, help='Seconds a received job stays hidden from other workers; extended while it runs')
+    run_parser.add_argument('--max_receives', type=int, default=3, help='Attempts per job before the local queue marks it failed. SQS uses its redrive policy')
+    run_parser.add_argument('--rds_table', type=str, default=None, help='RDS table for metrics when the job does not name one. Unset skips the upload. Metrics currently always go to autoantibody_dev')
+    run_parser.add_argument('--max_tokens', type=int, default=4096, help='Maximum number of padded tokens per batch')
+    run_parser.add_argument('--translation_processes', type=int, default=1, help='Processes used to translate AIRR inputs')
+    run_parser.add_argument('--backend', type=str, default='torch', choices=['torch', 'onnx'], help='Inference backend')
+    run_parser.add_argument('--quantize', type=str, default='none', choices=['none', 'int8'], help='Dynamic int8 quantization of the linear layers')
+    run_parser.add_argument('--intra_op_threads', type=int, default=0, help='Threads used within each operator. 0 leaves the backend default')
+    enqueue_parser.add_argument('--input_uri', type=str, required=True, help='Input file, local or s3://')
+    enqueue_parser.add_argument('--output_uri', type=str, required=True, help='Annotated output file, local or s3://')
+    enqueue_parser.add_argument('--hash_id', type=str, required=True, help='hash id from zeus used as the metrics primary key')
+    enqueue_parser.add_argument('--rds_table', type=str, default=None, help='RDS table for this job\'s metrics')
+    args = parser.parse_args()
+
+    if args.command == 'enqueue':
+        job = {'input_uri': args.input_uri, 'output_uri': args.output_uri, 'hash_id': args.hash_id}
+        if args.rds_table:
+            job['rds_table'] = args.rds_table
+        open_queue(args.queue_url).send(job)
+    else:
+        classifier = AutoantibodyClassifier(
+            args.tokenizer_path,
+            args.model_path,
+            args.max_tokens,
+            args.backend,
+            intra_op_threads=args.intra_op_threads,
+            quantize=args.quantize
+        )
+        queue = open_queue(args.queue_url, args.visibility_timeout, args.max_receives)
+        BatchWorker(queue, classifier, args.concurrency, args.rds_table, args.translation_processes).run()
@@ -0,0 +1,85 @@
+import argparse
+import time
+
+import numpy as np
+from sklearn.metrics import (
+    roc_auc_score,
+    recall_score,
+    precision_score,
+    f1_score,
+    matthews_corrcoef,
+    average_precision_score
+)
+
+from evaluation import confusion_metrics, evaluate
+from ingest import peak_rss_mb
+
+
+def synthetic_predictions(n_rows, seed=0):
+    """Balanced 0/1 labels and float32 probabilities that separate them imperfectly, some tied"""
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(2, size=n_rows)
+    probabilities = np.clip(rng.normal(0.4 + 0.2 * labels, 0.2), 0, 1).astype(np.float32)
+    probabilities[:n_rows // 10] = np.round(probabilities[:n_rows // 10], 2)
+    return labels, probabilities
+
+
+def sklearn_metrics(labels, probabilities, threshold):
+    """The sklearn calls compute_metrics made, as the reference"""
+    probs_binary = [1 if x > threshold else 0 for x in probabilities]
+    return {
+        'roc_auc': roc_auc_score(labels, probabilities),
+        'average_precision': average_precision_score(labels, probabilities),
+        'f1': f1_score(labels, probs_binary),
+        'precision': precision_score(labels, probs_binary),
+        'recall': recall_score(labels, probs_binary),
+        'mcc': matthews_corrcoef(labels, probs_binary)
+    }
+
+
+def main(n_rows, threshold, n_bootstrap, sweep_thresholds):
+    labels, probabilities = synthetic_predictions(n_rows)
+
+    start = time.perf_counter()
+    reference = sklearn_metrics(labels, probabilities, threshold)
+    sklearn_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    report, sweep = evaluate(labels, probabilities, threshold)
+    evaluation_seconds = time.perf_counter() - start
+
+    metrics = {'roc_auc': report['roc_auc'], 'average_precision': report['average_precision'], **report['at_threshold']}
+    for key, value in reference.items():
+        assert abs(metrics[key] - value) < 1e-9, f'{key}: {metrics[key]!r} != {value!r}'
+    print(f'sklearn at one threshold: {sklearn_seconds:.2f} s, evaluate at all {len(sweep)} thresholds: {evaluation_seconds:.2f} s, metrics agree')
+
+    # what a sweep costs with sklearn, extrapolated from a few thresholds
+    start = time.perf_counter()
+    for value in np.linspace(0, 1, sweep_thresholds, endpoint=False):
+        predicted = probabilities > value
+        f1_score(labels, predicted)
+        matthews_corrcoef(labels, predicted)
+    per_threshold = (time.perf_counter() - start) / sweep_thresholds
+    print(f'sklearn F1 and MCC: {per_threshold:.2f} s per threshold, {per_threshold * len(sweep) / 3600:.0f} h for the sweep')
+
+    row = sweep.iloc[len(sweep) // 2]
+    predicted = probabilities > row['threshold']
+    expected = confusion_metrics(*(int(np.sum((predicted == guess) & (labels == truth))) for guess, truth in ((True, 1), (True, 0), (False, 1), (False, 0))))
+    assert all(abs(row[name] - value) < 1e-12 for name, value in expected.items())
+
+    start = time.perf_counter()
+    report, _ = evaluate(labels, probabilities, threshold, n_bootstrap)
+    print(f'evaluate with {n_bootstrap} bootstrap resamples: {time.perf_counter() - start:.2f} s')
+    print(f"Best F1 {report['best_f1']['f1']:.4f} above {report['best_f1']['threshold']:.4f}, best MCC {report['best_mcc']['mcc']:.4f} above {report['best_mcc']['threshold']:.4f}")
+    print(f'Peak RSS {peak_rss_mb():.0f} MB')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the single-sort evaluation of evaluation.py against the sklearn metrics it replaced')
+    parser.add_argument('--n_rows', type=int, default=5000000, help='Number of synthetic predictions')
+    parser.add_argument('--threshold', type=float, default=0.99, help='Operating threshold')
+    parser.add_argument('--n_bootstrap', type=int, default=1000, help='Bootstrap resamples')
+    parser.add_argument('--sweep_thresholds', type=int, default=3, help='Thresholds sklearn is timed at to extrapolate the cost of a sweep')
+    args = parser.parse_args()
+
+    main(args.n_rows, args.threshold, args.n_bootstrap, args.sweep_thresholds)
@@ -0,0 +1,89 @@
+import argparse
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ingest import peak_rss_mb
+from utils import random_heavy_chains
+
+
+def write_synthetic_input(input_path, n_rows, n_unique, seed=0):
+    """
+    Parquet file of n_rows heavy chains drawn from n_unique distinct sequences, with a
+    label and a couple of AIRR-style metadata columns, written one row group at a time
+    """
+    rng = np.random.default_rng(seed)
+    sequences = pa.array(random_heavy_chains(n_unique, seed=seed))
+    v_calls = pa.array([f'IGHV{family}-{gene}*01' for family in range(1, 8) for gene in range(1, 10)])
+    schema = pa.schema([
+        ('sequence_vh', pa.string()),
+        ('label', pa.int64()),
+        ('v_call', pa.string()),
+        ('mu_count_total', pa.int64())
+    ])
+    with pq.ParquetWriter(input_path, schema) as writer:
+        for start in range(0, n_rows, 1000000):
+            size = min(1000000, n_rows - start)
+            writer.write_table(pa.table({
+                'sequence_vh': sequences.take(rng.integers(n_unique, size=size)),
+                'label': rng.integers(2, size=size),
+                'v_call': v_calls.take(rng.integers(len(v_calls), size=size)),
+                'mu_count_total': rng.integers(40, size=size)
+            }, schema=schema))
+
+
+def run_join(input_path, method):
+    """
+    Read the input, deduplicate it and join random probabilities back on with method,
+    in a fresh process so its peak RSS is its own. Returns (RSS before the join in MB,
+    peak RSS in MB, join seconds, number of distinct sequences)
+    """
+    # predict pulls in torch, which only the measuring processes need
+    from predict import add_fabcon_sequence, annotate_predictions, deduplicate_sequences, read_input
+
+    original_columns = add_fabcon_sequence(read_input(input_path))
+    before_mb = peak_rss_mb()
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    if method == 'merge':
+        sequences = original_columns['fabcon_sequence'].unique().tolist()
+        human_probabilities = rng.random(len(sequences), dtype=np.float32)
+        output_df = pd.DataFrame({'sequence_vh': sequences, 'human_probability': human_probabilities})
+        merged_df = original_columns.merge(output_df, left_on='fabcon_sequence', right_on='sequence_vh', how='left')
+    else:
+        codes, sequences = deduplicate_sequences(original_columns)
+        human_probabilities = rng.random(len(sequences), dtype=np.float32)
+        merged_df = annotate_predictions(original_columns, codes, human_probabilities)
+    seconds = time.perf_counter() - start
+    assert len(merged_df) == len(original_columns)
+    return before_mb, peak_rss_mb(), seconds, len(sequences)
+
+
+def main(input_path, n_rows, n_unique):
+    if not os.path.exists(input_path):
+        print(f'Writing {n_rows} rows ({n_unique} distinct sequences) to {input_path}')
+        write_synthetic_input(input_path, n_rows, n_unique)
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'join':<12}{'read MB':>10}{'peak MB':>10}{'join MB':>10}{'join s':>9}")
+    for method in ('merge', 'factorize'):
+        with context.Pool(1) as pool:
+            before_mb, peak_mb, seconds, n_sequences = pool.apply(run_join, (input_path, method))
+        print(f'{method:<12}{before_mb:>10.0f}{peak_mb:>10.0f}{peak_mb - before_mb:>10.0f}{seconds:>9.2f}')
+    print(f'{n_sequences} distinct sequences')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark peak memory of the string merge against the factorized join of predictions back onto the input rows')
+    parser.add_argument('--input_path', type=str, default='join_benchmark.parquet', help='Synthetic input parquet, written if it does not exist')
+    parser.add_argument('--n_rows', type=int, default=10000000, help='Number of synthetic rows')
+    parser.add_argument('--n_unique', type=int, default=3000000, help='Number of distinct sequences among them')
+    args = parser.parse_args()
+
+    main(args.input_path, args.n_rows, args.n_unique)
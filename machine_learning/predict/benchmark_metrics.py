@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from analyse_metrics import analyze_antibody_data
+from ingest import METRICS_COLUMNS, peak_rss_mb, read_column_table
+
+
+def write_synthetic_output(output_path, n_rows, seed=0):
+    """
+    Parquet file of n_rows annotated rows with the columns analyse_metrics reads, about
+    2% of each missing, written one row group at a time
+    """
+    rng = np.random.default_rng(seed)
+    v_calls = np.array([f'IGHV{family}-{gene}*0{allele}' for family in range(1, 8) for gene in range(1, 40) for allele in range(1, 4)])
+    c_calls = np.array(['IGHG1', 'IGHG2', 'IGHG3', 'IGHG4', 'IGHM', 'IGHA1', 'IGHA2', 'IGHD', 'IGHE'])
+    cdr3s = np.array(['CAR' + 'GYSW'[:length % 4] * (length // 4) + 'DYW' for length in range(4, 40)])
+    schema = pa.schema([
+        ('v_call', pa.string()),
+        ('c_call', pa.string()),
+        ('cdr3_aa', pa.string()),
+        ('mu_count_total', pa.int64()),
+        ('prediction', pa.string()),
+        ('human_probability', pa.float32())
+    ])
+
+    def missing(size):
+        return rng.random(size) < 0.02
+
+    with pq.ParquetWriter(output_path, schema) as writer:
+        for start in range(0, n_rows, 1000000):
+            size = min(1000000, n_rows - start)
+            probabilities = rng.random(size, dtype=np.float32)
+            writer.write_table(pa.table({
+                'v_call': pa.array(v_calls[rng.integers(len(v_calls), size=size)], mask=missing(size)),
+                'c_call': pa.array(c_calls[rng.integers(len(c_calls), size=size)], mask=missing(size)),
+                'cdr3_aa': pa.array(cdr3s[rng.integers(len(cdr3s), size=size)], mask=missing(size)),
+                'mu_count_total': pa.array(rng.integers(40, size=size), mask=missing(size)),
+                'prediction': pa.array(np.where(probabilities > 0.5, 'human', 'other'), mask=missing(size)),
+                'human_probability': pa.array(probabilities, mask=missing(size))
+            }, schema=schema))
+
+
+def analyze_with_pandas(file_path):
+    """The per-metric pandas scans analyze_antibody_data replaced, as the reference"""
+    df = read_column_table(file_path, METRICS_COLUMNS).to_pandas()
+    metrics = {}
+    metrics['total_rows'] = len(df)
+    metrics['human_rows'] = (df['prediction'] == 'human').sum()
+    metrics['IGHV4_34_percentage'] = (df['v_call'].str.contains('IGHV4-34', na=False) * 100).mean()
+    metrics['IGHV3_30_percentage'] = (df['v_call'].str.contains('IGHV3-30', na=False) * 100).mean()
+    metrics['IGHG_percentage'] = (df['c_call'].str.startswith('IGHG', na=False) * 100).mean()
+    for subclass in ['IGHG1', 'IGHG2', 'IGHG3', 'IGHG4']:
+        metrics[f'{subclass}_percentage'] = (df['c_call'] == subclass).mean() * 100
+    metrics['average_cdr3_length'] = df['cdr3_aa'].str.len().mean()
+    metrics['average_mu_count'] = df['mu_count_total'].mean()
+    metrics['human_prediction_percentage'] = (df['prediction'] == 'human').mean() * 100
+    bins = np.arange(0, 1.05, 0.05)
+    hist_data = pd.cut(df['human_probability'],
+                       bins=bins,
+                       right=False,
+                       labels=[f"{bins[i]:.2f}-{bins[i+1]:.2f}" for i in range(len(bins)-1)])
+    metrics['probability_histogram'] = json.dumps(hist_data.value_counts().to_dict())
+    return metrics
+
+
+def main(input_path, n_rows):
+    if not os.path.exists(input_path):
+        print(f'Writing {n_rows} rows to {input_path}')
+        write_synthetic_output(input_path, n_rows)
+
+    start = time.perf_counter()
+    read_column_table(input_path, METRICS_COLUMNS)
+    read_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference = analyze_with_pandas(input_path)
+    pandas_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    metrics = analyze_antibody_data(input_path)
+    arrow_seconds = time.perf_counter() - start
+
+    for key, value in reference.items():
+        assert type(metrics[key]) is type(value) and metrics[key] == value, f'{key}: {metrics[key]!r} != {value!r}'
+    print(f'read: {read_seconds:.2f} s, pandas: {pandas_seconds:.2f} s, single pass: {arrow_seconds:.2f} s, metrics identical')
+    print(f'Metrics after the read: pandas {pandas_seconds - read_seconds:.2f} s, single pass {arrow_seconds - read_seconds:.2f} s')
+    print(f'Peak RSS {peak_rss_mb():.0f} MB')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the single-pass metrics of analyse_metrics against the per-metric pandas scans they replaced')
+    parser.add_argument('--input_path', type=str, default='metrics_benchmark.parquet', help='Synthetic annotated parquet, written if it does not exist')
+    parser.add_argument('--n_rows', type=int, default=10000000, help='Number of synthetic rows')
+    args = parser.parse_args()
+
+    main(args.input_path, args.n_rows)
@@ -0,0 +1,81 @@
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from Bio import BiopythonWarning
+
+from utils import get_full_aa_sub, get_full_aa_sub_batch
+
+
+def synthetic_airr_columns(n_rows, n_germlines=50, n_clonotypes=None, seed=0):
+    """
+    Synthetic sequence_alignment / germline_alignment_d_mask columns shaped like AIRR
+    output: IMGT-gapped germlines of ~300 nt, alignments with a leading run of '.'
+    where the read starts late, a sprinkling of point mutations and the occasional
+    deletion. n_clonotypes limits the number of distinct pairs, to mimic expanded clones.
+    """
+    rng = np.random.default_rng(seed)
+    nucleotides = np.array(list('ACGT'))
+
+    germlines = []
+    for _ in range(n_germlines):
+        germline = rng.choice(nucleotides, size=rng.integers(290, 330))
+        germline[rng.choice(len(germline), size=15, replace=False)] = '.'
+        germlines.append(germline)
+
+    n_unique = n_rows if n_clonotypes is None else n_clonotypes
+    aln_seqs = []
+    germ_seqs = []
+    for _ in range(n_unique):
+        germline = germlines[rng.integers(n_germlines)]
+        alignment = germline.copy()
+        mutated = rng.choice(len(alignment), size=rng.integers(0, 25), replace=False)
+        alignment[mutated] = rng.choice(nucleotides, size=len(mutated))
+        alignment[:rng.integers(0, 40)] = '.'
+        if rng.random() < 0.1:
+            alignment[rng.integers(60, 250):][:3] = '-'
+        aln_seqs.append(''.join(alignment))
+        germ_seqs.append(''.join(germline))
+
+    if n_clonotypes is not None:
+        picks = rng.integers(n_clonotypes, size=n_rows)
+        aln_seqs = [aln_seqs[i] for i in picks]
+        germ_seqs = [germ_seqs[i] for i in picks]
+    return pd.DataFrame({'sequence_alignment': aln_seqs, 'germline_alignment_d_mask': germ_seqs})
+
+
+def main(n_rows, n_processes):
+    dataset = synthetic_airr_columns(n_rows)
+    warnings.simplefilter('ignore', BiopythonWarning)
+
+    start = time.perf_counter()
+    expected = dataset.apply(
+        lambda row: get_full_aa_sub(str(row['sequence_alignment']), str(row['germline_alignment_d_mask'])),
+        axis=1
+    )
+    apply_seconds = time.perf_counter() - start
+    print(f'apply(get_full_aa_sub):  {apply_seconds:.2f}s')
+
+    # the lookup table is built once per process; exclude that from the timings
+    get_full_aa_sub_batch(['ATG'], ['ATG'])
+    for processes in sorted({1, n_processes}):
+        start = time.perf_counter()
+        translated = get_full_aa_sub_batch(
+            dataset['sequence_alignment'],
+            dataset['germline_alignment_d_mask'],
+            n_processes=processes
+        )
+        batch_seconds = time.perf_counter() - start
+        assert list(translated) == list(expected), 'get_full_aa_sub_batch output differs from get_full_aa_sub'
+        print(f'get_full_aa_sub_batch (n_processes={processes}): {batch_seconds:.2f}s ({apply_seconds / batch_seconds:.1f}x)')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark row-wise against vectorised translation of AIRR alignments')
+    parser.add_argument('--n_rows', type=int, default=200000, help='Number of synthetic rows')
+    parser.add_argument('--n_processes', type=int, default=4, help='Processes for the multiprocessing run')
+    args = parser.parse_args()
+
+    main(args.n_rows, args.n_processes)
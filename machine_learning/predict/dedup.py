@@ -0,0 +1,197 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from transformers import PreTrainedTokenizerFast
+
+from predict import (
+    OutputWriter,
+    add_fabcon_sequence,
+    annotate_predictions,
+    close_prediction_cache,
+    load_model,
+    open_prediction_cache,
+    print_metrics,
+    read_input_chunks,
+    score_sequences,
+)
+from utils import TranslationCache
+
+BUCKET_SCHEMA = pa.schema([('row_id', pa.int64()), ('fabcon_sequence', pa.large_string())])
+UNIQUE_SCHEMA = pa.schema([('fabcon_sequence', pa.large_string())])
+
+
+class PartitionedDeduplicator:
+    """
+    Out-of-core replacement for deduplicate_sequences. Rows are added a chunk at a time
+    and spilled to parquet under spill_dir: the rows themselves, a file per chunk, and their
+    (row_id, fabcon_sequence) pairs hash-partitioned into n_buckets bucket files, so
+    every copy of a sequence lands in the same bucket. finish() then dedupes one bucket
+    at a time into a unique-sequence store and an on-disk row -> unique id array, so
+    memory is bounded by the chunk and bucket sizes rather than the input.
+
+    Args:
+        spill_dir (str): Directory for the spill files, which are removed by cleanup
+        n_buckets (int): Number of hash partitions. Each bucket holds about
+            1/n_buckets of the rows
+    """
+    def __init__(self, spill_dir, n_buckets=256):
+        os.makedirs(spill_dir, exist_ok=True)
+        self.directory = tempfile.TemporaryDirectory(dir=spill_dir, prefix='dedup-')
+        self.n_buckets = n_buckets
+        self.rows_paths = []
+        self.unique_path = os.path.join(self.directory.name, 'unique.parquet')
+        self.bucket_paths = [os.path.join(self.directory.name, f'bucket_{bucket}.parquet') for bucket in range(n_buckets)]
+        self.bucket_writers = [pq.ParquetWriter(path, BUCKET_SCHEMA) for path in self.bucket_paths]
+        self.n_rows = 0
+        self.n_unique = 0
+        self.row_unique_ids = None
+
+    def add(self, original_columns):
+        """Spill a chunk of rows with a fabcon_sequence column"""
+        # each chunk keeps the schema its reader gave it, so a column that is empty in
+        # one chunk and not another never has to be coerced to a common type
+        rows_path = os.path.join(self.directory.name, f'rows_{len(self.rows_paths)}.parquet')
+        pq.write_table(pa.Table.from_pandas(original_columns, preserve_index=False), rows_path)
+        self.rows_paths.append(rows_path)
+
+        # each distinct sequence in the chunk is hashed once
+        codes, sequences = pd.factorize(original_columns['fabcon_sequence'])
+        present = np.flatnonzero(codes >= 0)
+        buckets = (pd.util.hash_array(np.asarray(sequences, dtype=object)) % self.n_buckets).astype(np.int64)[codes[present]]
+        order = present[np.argsort(buckets, kind='stable')]
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(buckets, minlength=self.n_buckets))])
+
+        pieces = pa.table({
+            'row_id': self.n_rows + order,
+            'fabcon_sequence': pa.array(original_columns['fabcon_sequence'].to_numpy(dtype=object)[order], type=pa.large_string())
+        }, schema=BUCKET_SCHEMA)
+        for bucket, writer in enumerate(self.bucket_writers):
+            if bounds[bucket + 1] > bounds[bucket]:
+                writer.write_table(pieces.slice(bounds[bucket], bounds[bucket + 1] - bounds[bucket]))
+        self.n_rows += len(original_columns)
+
+    def finish(self):
+        """
+        Dedupe each bucket, appending its distinct sequences to the unique store and
+        recording each row's unique id. Rows without a sequence get id -1.
+
+        Returns:
+            int: Number of distinct sequences
+        """
+        for writer in self.bucket_writers:
+            writer.close()
+
+        self.row_unique_ids = np.lib.format.open_memmap(
+            os.path.join(self.directory.name, 'row_unique_ids.npy'), mode='w+', dtype=np.int64, shape=(self.n_rows,)
+        )
+        self.row_unique_ids[:] = -1
+        with pq.ParquetWriter(self.unique_path, UNIQUE_SCHEMA) as unique_writer:
+            for path in self.bucket_paths:
+                bucket = pq.read_table(path)
+                encoded = pc.dictionary_encode(bucket['fabcon_sequence'].combine_chunks())
+                self.row_unique_ids[bucket['row_id'].to_numpy()] = self.n_unique + encoded.indices.to_numpy()
+                if len(encoded.dictionary):
+                    unique_writer.write_table(pa.table([encoded.dictionary], schema=UNIQUE_SCHEMA))
+                self.n_unique += len(encoded.dictionary)
+                os.remove(path)
+        self.row_unique_ids.flush()
+        print(f'Deduplicated {self.n_rows} rows to {self.n_unique} distinct sequences in {self.n_buckets} buckets')
+        return self.n_unique
+
+    def unique_sequences(self, batch_size):
+        """Yield (first unique id, list of sequences) from the unique store, batch_size at a time"""
+        start = 0
+        for record_batch in pq.ParquetFile(self.unique_path).iter_batches(batch_size=batch_size):
+            sequences = record_batch['fabcon_sequence'].to_pylist()
+            yield start, sequences
+            start += len(sequences)
+
+    def row_chunks(self):
+        """Yield (rows, unique ids) in input order, a spilled chunk at a time"""
+        start = 0
+        for rows_path in self.rows_paths:
+            rows = pd.read_parquet(rows_path)
+            yield rows, np.asarray(self.row_unique_ids[start:start + len(rows)])
+            start += len(rows)
+
+    def cleanup(self):
+        self.row_unique_ids = None
+        self.directory.cleanup()
+
+
+def predict_partitioned(
+    input_path: str,
+    output_file: str,
+    tokenizer_path: str,
+    model_path: str,
+    device,
+    spill_dir: str,
+    n_buckets: int = 256,
+    chunk_size: int = 100000,
+    max_tokens: int = 4096,
+    translation_processes: int = 1,
+    cache_path: str = None,
+    cache_max_entries: int = 10000000,
+    backend: str = 'torch',
+    onnx_path: str = None,
+    intra_op_threads: int = 0,
+    quantize: str = None,
+    row_group_size: int = 1000000,
+    predictions_only: bool = False,
+    metrics_file: str = None
+):
+    """
+    predict_stream for inputs whose distinct sequences do not fit in memory either. The
+    input is read and translated chunk_size rows at a time and spilled to spill_dir,
+    deduplicated bucket by bucket (see PartitionedDeduplicator), every distinct sequence
+    is scored once from the unique store, and the output is written by streaming the
+    spilled rows back with their probabilities. Unlike predict_stream, a sequence
+    repeated across chunks is scored only once.
+    """
+    tokenizer = PreTrainedTokenizerFast.from_pretrained(tokenizer_path)
+    model, weights_path = load_model(model_path, device, backend, onnx_path, intra_op_threads, quantize)
+    prediction_cache = open_prediction_cache(cache_path, weights_path, tokenizer_path, cache_max_entries)
+
+    deduplicator = PartitionedDeduplicator(spill_dir, n_buckets)
+    try:
+        # clonotypes recur across chunks, so translations are kept between them
+        translation_cache = TranslationCache()
+        for chunk in read_input_chunks(input_path, chunk_size, translation_processes):
+            deduplicator.add(add_fabcon_sequence(chunk, translation_processes, translation_cache))
+        n_unique = deduplicator.finish()
+
+        human_probabilities = np.lib.format.open_memmap(
+            os.path.join(deduplicator.directory.name, 'human_probabilities.npy'),
+            mode='w+', dtype=np.float32, shape=(n_unique,)
+        )
+        for start, sequences in deduplicator.unique_sequences(chunk_size):
+            human_probabilities[start:start + len(sequences)] = score_sequences(
+                model, tokenizer, sequences, device, max_tokens, prediction_cache
+            )
+
+        writer = OutputWriter(output_file, row_group_size, predictions_only, metrics_file)
+        labels = []
+        probs = []
+        for rows, unique_ids in deduplicator.row_chunks():
+            merged_df = annotate_predictions(rows, unique_ids, human_probabilities)
+            writer.write(merged_df)
+
+            if 'label' in merged_df.columns:
+                labels.append(merged_df['label'].values)
+                probs.append(merged_df['human_probability'].values)
+        writer.close()
+        print(f'Rows written: {writer.rows_written}')
+    finally:
+        close_prediction_cache(prediction_cache)
+        human_probabilities = None
+        deduplicator.cleanup()
+
+    if translation_cache.hits + translation_cache.misses:
+        print(f'Translation cache hit rate: {translation_cache.hit_rate:.3f}')
+    if labels:
+        print_metrics(np.concatenate(labels), np.concatenate(probs))
@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ingest import read_column_table
+
+# metrics of a confusion matrix, reported at a threshold and bootstrapped
+THRESHOLD_METRICS = ['precision', 'recall', 'f1', 'mcc']
+
+
+def _divide(numerator, denominator):
+    """numerator / denominator, 0 where the denominator is 0 as sklearn's zero_division"""
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=np.float64), np.asarray(denominator, dtype=np.float64))
+    result = np.zeros(numerator.shape)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+def _trapezoid(y, x):
+    """Trapezoidal area under y(x) along the last axis, np.trapz without its numpy version dependence"""
+    return np.sum(np.diff(x, axis=-1) * (y[..., 1:] + y[..., :-1]) / 2, axis=-1)
+
+
+def confusion_metrics(tp, fp, fn, tn):
+    """
+    Precision, recall, F1 and MCC of confusion counts, arrays of any (matching) shape
+
+    Returns:
+        dict: metric name -> np.ndarray
+    """
+    tp, fp, fn, tn = (np.asarray(count, dtype=np.float64) for count in (tp, fp, fn, tn))
+    return {
+        'precision': _divide(tp, tp + fp),
+        'recall': _divide(tp, tp + fn),
+        'f1': _divide(2 * tp, 2 * tp + fp + fn),
+        'mcc': _divide(tp * tn - fp * fn, np.sqrt((tp + fp) * (tp + fn) * (tn + fp) * (tn + fn)))
+    }
+
+
+def _clean(labels, probabilities):
+    """Labels as bool and probabilities as floats, without rows missing either"""
+    labels = np.asarray(labels, dtype=np.float64)
+    probabilities = np.asarray(probabilities)
+    # float32 probabilities stay float32, so thresholds compare as they do for the prediction column
+    if not np.issubdtype(probabilities.dtype, np.floating):
+        probabilities = probabilities.astype(np.float64)
+    present = ~(np.isnan(labels) | np.isnan(probabilities))
+    return labels[present] == 1, probabilities[present]
+
+
+class Curve:
+    """
+    Counts of positives and negatives at or above each distinct probability, from one sort
+    of the probabilities. Every threshold metric, the ROC and precision-recall curves and
+    their areas are derived from these cumulative counts.
+
+    Args:
+        labels: 0/1 labels, rows with a missing label or probability are dropped
+        probabilities: Predicted probabilities of the positive class
+    """
+    def __init__(self, labels, probabilities):
+        labels, probabilities = _clean(labels, probabilities)
+        order = np.argsort(probabilities, kind='stable')[::-1]
+        sorted_probabilities = probabilities[order]
+        # last row of each run of tied probabilities, in decreasing order of probability
+        group_ends = np.append(np.flatnonzero(np.diff(sorted_probabilities)), len(sorted_probabilities) - 1)
+        if not len(sorted_probabilities):
+            group_ends = group_ends[:0]
+
+        self.n = len(labels)
+        self.positives = int(labels.sum())
+        self.negatives = self.n - self.positives
+        self.scores = sorted_probabilities[group_ends]
+        # positives and negatives with probability >= each score
+        self.tp = np.cumsum(labels[order])[group_ends]
+        self.fp = group_ends + 1 - self.tp
+
+    def roc_auc(self):
+        """Area under the ROC curve, as sklearn's roc_auc_score"""
+        if not self.positives or not self.negatives:
+            return np.nan
+        tpr = np.concatenate([[0], self.tp / self.positives])
+        fpr = np.concatenate([[0], self.fp / self.negatives])
+        return float(_trapezoid(tpr, fpr))
+
+    def average_precision(self):
+        """Average precision, as sklearn's average_precision_score"""
+        if not self.positives:
+            return np.nan
+        precision = self.tp / (self.tp + self.fp)
+        recall = self.tp / self.positives
+        return float(np.sum(np.diff(np.concatenate([[0], recall])) * precision))
+
+    def confusion_at(self, threshold):
+        """tp, fp, fn, tn for rows predicted positive when their probability is above threshold"""
+        # scores decrease, so the groups above threshold are the first ones
+        above = np.searchsorted(-self.scores, -np.asarray(threshold, dtype=self.scores.dtype), side='left')
+        tp = int(self.tp[above - 1]) if above else 0
+        fp = int(self.fp[above - 1]) if above else 0
+        return tp, fp, self.positives - tp, self.negatives - fp
+
+    def sweep(self):
+        """
+        Metrics with each distinct probability as the threshold, rows above it predicted
+        positive as for the prediction column, in decreasing order of threshold.
+
+        Returns:
+            pd.DataFrame: threshold, tp, fp, fn, tn, fpr, precision, recall, f1 and mcc
+        """
+        # rows above a score are those of the groups before it
+        tp = np.concatenate([[0], self.tp])[:len(self.scores)].astype(np.int64)
+        fp = np.concatenate([[0], self.fp])[:len(self.scores)].astype(np.int64)
+        sweep = pd.DataFrame({
+            'threshold': self.scores.astype(np.float64),
+            'tp': tp,
+            'fp': fp,
+            'fn': self.positives - tp,
+            'tn': self.negatives - fp,
+            'fpr': _divide(fp, self.negatives)
+        })
+        for name, values in confusion_metrics(sweep['tp'], sweep['fp'], sweep['fn'], sweep['tn']).items():
+            sweep[name] = values
+        return sweep
+
+    def blocks(self, max_blocks):
+        """
+        Positives and negatives of at most max_blocks runs of consecutive thresholds, of
+        about n / max_blocks rows each. Tied probabilities stay in one block.
+
+        Returns:
+            tuple: (positives, negatives) per block, in decreasing order of probability
+        """
+        if len(self.scores) <= max_blocks:
+            ends = np.arange(len(self.scores))
+        else:
+            rows = self.tp + self.fp
+            ends = np.unique(np.searchsorted(rows, np.linspace(0, self.n, max_blocks + 1)[1:], side='left'))
+        tp = np.diff(np.concatenate([[0], self.tp[ends]]))
+        fp = np.diff(np.concatenate([[0], self.fp[ends]]))
+        return tp, fp
+
+
+def bootstrap_intervals(curve, threshold, n_bootstrap=1000, confidence=0.95, max_blocks=10000, batch_size=100, seed=0):
+    """
+    Percentile bootstrap confidence intervals of the threshold metrics and the curve areas.
+
+    Resampling rows only changes the counts of each confusion cell, so the threshold
+    metrics are bootstrapped from multinomial draws of the four confusion counts. ROC AUC
+    and average precision are bootstrapped with Poisson weights on the curve coarsened to
+    max_blocks blocks of thresholds (see Curve.blocks), batch_size resamples at a time,
+    so a resample costs O(max_blocks) rather than O(n). Resamples that drew no positives,
+    or for ROC AUC no negatives, are left out of the curve-area intervals.
+
+    Returns:
+        dict: metric name -> [lower, upper]
+    """
+    rng = np.random.default_rng(seed)
+    tails = [100 * (1 - confidence) / 2, 100 * (1 + confidence) / 2]
+    intervals = {}
+
+    tp, fp, fn, tn = curve.confusion_at(threshold)
+    if curve.n:
+        counts = rng.multinomial(curve.n, np.array([tp, fp, fn, tn]) / curve.n, size=n_bootstrap)
+        for name, values in confusion_metrics(*counts.T).items():
+            intervals[name] = np.percentile(values, tails).tolist()
+
+    block_positives, block_negatives = curve.blocks(max_blocks)
+    roc_aucs = []
+    average_precisions = []
+    for start in range(0, n_bootstrap, batch_size):
+        size = min(batch_size, n_bootstrap - start)
+        positives = np.cumsum(rng.poisson(block_positives, size=(size, len(block_positives))), axis=1)
+        negatives = np.cumsum(rng.poisson(block_negatives, size=(size, len(block_negatives))), axis=1)
+        total_positives = positives[:, -1:] if len(block_positives) else np.zeros((size, 1))
+        total_negatives = negatives[:, -1:] if len(block_negatives) else np.zeros((size, 1))
+        tpr = np.hstack([np.zeros((size, 1)), _divide(positives, total_positives)])
+        fpr = np.hstack([np.zeros((size, 1)), _divide(negatives, total_negatives)])
+        precision = _divide(positives, positives + negatives)
+        roc_auc = _trapezoid(tpr, fpr)
+        average_precision = np.sum(np.diff(tpr, axis=1) * precision, axis=1)
+        # a resample that drew no positives (or no negatives) has no curve to score
+        roc_auc[(total_positives[:, 0] == 0) | (total_negatives[:, 0] == 0)] = np.nan
+        average_precision[total_positives[:, 0] == 0] = np.nan
+        roc_aucs.append(roc_auc)
+        average_precisions.append(average_precision)
+    for name, values in [('roc_auc', roc_aucs), ('average_precision', average_precisions)]:
+        values = np.concatenate(values) if values else np.array([])
+        if not np.isnan(values).all():
+            intervals[name] = np.nanpercentile(values, tails).tolist()
+    return intervals
+
+
+def _operating_point(sweep, index):
+    row = sweep.iloc[index]
+    return {'threshold': float(row['threshold']), **{name: float(row[name]) for name in THRESHOLD_METRICS}}
+
+
+def evaluate(labels, probabilities, threshold, n_bootstrap=0, confidence=0.95, seed=0):
+    """
+    Evaluate probabilities against labels from a single sort: ROC AUC, average precision,
+    the threshold metrics at threshold (rows above it predicted positive), the thresholds
+    with the best F1 and MCC and, if n_bootstrap, bootstrap confidence intervals.
+
+    Returns:
+        tuple: (report dict, sweep DataFrame of every threshold, see Curve.sweep)
+    """
+    curve = Curve(labels, probabilities)
+    sweep = curve.sweep()
+    tp, fp, fn, tn = curve.confusion_at(threshold)
+    report = {
+        'rows': curve.n,
+        'positives': curve.positives,
+        'roc_auc': curve.roc_auc(),
+        'average_precision': curve.average_precision(),
+        'threshold': threshold,
+        'at_threshold': {
+            'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+            **{name: float(value) for name, value in confusion_metrics(tp, fp, fn, tn).items()}
+        }
+    }
+    if len(sweep):
+        report['best_f1'] = _operating_point(sweep, int(sweep['f1'].values.argmax()))
+        report['best_mcc'] = _operating_point(sweep, int(sweep['mcc'].values.argmax()))
+    if n_bootstrap:
+        report['confidence'] = confidence
+        report['n_bootstrap'] = n_bootstrap
+        report['confidence_intervals'] = bootstrap_intervals(curve, threshold, n_bootstrap, confidence, seed=seed)
+    return report, sweep
+
+
+def json_safe(value):
+    """value with NaN floats replaced by None, which JSON has no literal for"""
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def write_report(report, sweep, report_path):
+    """
+    Write the report as JSON to report_path and the sweep to parquet alongside it. Metrics
+    undefined for the labels (ROC AUC of a single class) are written as null.
+    """
+    with open(report_path, 'w') as f:
+        json.dump(json_safe(report), f, indent=2, allow_nan=False)
+    sweep_path = os.path.splitext(report_path)[0] + '_sweep.parquet'
+    pq.write_table(pa.Table.from_pandas(sweep, preserve_index=False), sweep_path, compression='zstd')
+    print(f'Report written to {report_path}, threshold sweep to {sweep_path}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Evaluate the predictions of a labelled annotated file: ROC/PR curves, metrics at every threshold and bootstrap confidence intervals')
+    parser.add_argument('--input_path', type=str, required=True, help='Annotated output of predict.py with label and human_probability columns')
+    parser.add_argument('--report_path', type=str, required=True, help='JSON report to write. The metrics at every threshold are written to <report>_sweep.parquet')
+    parser.add_argument('--threshold', type=float, default=0.99, help='Operating threshold: rows with human_probability above it are predicted positive. Defaults to the threshold of the prediction column')
+    parser.add_argument('--n_bootstrap', type=int, default=1000, help='Bootstrap resamples for the confidence intervals. 0 skips them')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the intervals')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the bootstrap resampling')
+    args = parser.parse_args()
+
+    table = read_column_table(args.input_path, ['label', 'human_probability'])
+    report, sweep = evaluate(table['label'].to_numpy(), table['human_probability'].to_numpy(), args.threshold, args.n_bootstrap, args.confidence, args.seed)
+    write_report(report, sweep, args.report_path)
+    print(json.dumps(json_safe({key: value for key, value in report.items() if key != 'confidence_intervals'}), indent=2))
@@ -0,0 +1,132 @@
+import string
+from functools import lru_cache
+
+import numpy as np
+import torch
+
+# characters checked against the HF tokenizer at startup, on top of its own vocabulary.
+# Anything outside the checked set is sent to the HF tokenizer instead
+PROBE_CHARACTERS = string.ascii_letters + string.digits + '*-.Ω'
+
+
+class CharacterTokenizer:
+    """
+    Vectorised stand-in for a one-token-per-character PreTrainedTokenizerFast such as
+    the FAbCon tokenizer. A batch of sequences is viewed as a 2D array of unicode code
+    points, mapped through a lookup table to token ids and written straight into
+    preallocated, right-padded input_ids / attention_mask tensors, with the tokenizer's
+    special tokens either side.
+
+    Build it with from_tokenizer, which checks it against the HF tokenizer.
+
+    Args:
+        token_ids (dict): Token id of each checked character, keyed by code point
+        pad_id (int): Padding token id
+        prefix_ids (list): Special token ids the tokenizer adds before each sequence
+        suffix_ids (list): Special token ids the tokenizer adds after each sequence
+    """
+    def __init__(self, token_ids, pad_id, prefix_ids, suffix_ids):
+        self.lookup = np.full(max(token_ids) + 1, -1, dtype=np.int64)
+        self.lookup[list(token_ids)] = list(token_ids.values())
+        self.pad_id = pad_id
+        self.prefix_ids = np.asarray(prefix_ids, dtype=np.int64)
+        self.suffix_ids = np.asarray(suffix_ids, dtype=np.int64)
+
+    def encode(self, sequences):
+        """
+        Returns:
+            tuple: (input_ids, attention_mask) int64 tensors, or None if a sequence holds
+            a character that was not checked against the HF tokenizer
+        """
+        code_points = np.array(sequences, dtype=str)
+        code_points = code_points.view(np.uint32).reshape(len(sequences), -1).astype(np.int64)
+        lengths = np.count_nonzero(code_points, axis=1)
+        max_length = int(lengths.max()) if len(lengths) else 0
+        code_points = code_points[:, :max_length]
+
+        in_table = code_points < len(self.lookup)
+        ids = np.full(code_points.shape, -1, dtype=np.int64)
+        ids[in_table] = self.lookup[code_points[in_table]]
+        content = np.arange(max_length) < lengths[:, None]
+        if (ids[content] < 0).any():
+            return None
+
+        n_prefix = len(self.prefix_ids)
+        n_suffix = len(self.suffix_ids)
+        width = n_prefix + max_length + n_suffix
+        input_ids = torch.full((len(sequences), width), self.pad_id, dtype=torch.int64)
+        input_ids_array = input_ids.numpy()
+        input_ids_array[:, :n_prefix] = self.prefix_ids
+        input_ids_array[:, n_prefix:n_prefix + max_length] = np.where(content, ids, self.pad_id)
+        rows = np.arange(len(sequences))
+        for offset, token_id in enumerate(self.suffix_ids):
+            input_ids_array[rows, n_prefix + lengths + offset] = token_id
+
+        attention_mask = torch.from_numpy(
+            (np.arange(width) < (lengths + n_prefix + n_suffix)[:, None]).astype(np.int64)
+        )
+        return input_ids, attention_mask
+
+    @classmethod
+    def from_tokenizer(cls, tokenizer, n_check_sequences=256, seed=0):
+        """
+        Build a CharacterTokenizer equivalent to tokenizer, or return None if it cannot be.
+
+        Every single-character vocabulary entry and probe character is tokenized alone
+        with the HF tokenizer; those that come out as one token between the same special
+        tokens go into the lookup table. Padded batches of random sequences built from
+        them must then tokenize identically both ways.
+        """
+        if tokenizer.padding_side != 'right' or tokenizer.pad_token_id is None:
+            return None
+
+        characters = sorted(
+            {token for token in tokenizer.get_vocab() if len(token) == 1} | set(PROBE_CHARACTERS)
+        )
+        encoded = tokenizer(characters)['input_ids']
+        n_special = tokenizer.num_special_tokens_to_add()
+        single = [(character, ids) for character, ids in zip(characters, encoded) if len(ids) == n_special + 1]
+        if not single:
+            return None
+
+        # the content token is the one position where two characters' encodings differ;
+        # the special tokens are whatever surrounds it
+        first = single[0][1]
+        other = next((ids for _, ids in single if ids != first), None)
+        if other is None:
+            return None
+        differing = [position for position, (a, b) in enumerate(zip(first, other)) if a != b]
+        if len(differing) != 1:
+            return None
+        position = differing[0]
+        prefix_ids, suffix_ids = first[:position], first[position + 1:]
+
+        token_ids = {
+            ord(character): ids[position]
+            for character, ids in single
+            if ids[:position] == prefix_ids and ids[position + 1:] == suffix_ids
+        }
+        character_tokenizer = cls(token_ids, tokenizer.pad_token_id, prefix_ids, suffix_ids)
+
+        rng = np.random.default_rng(seed)
+        alphabet = np.array([chr(code_point) for code_point in token_ids])
+        check_sequences = [
+            ''.join(rng.choice(alphabet, size=rng.integers(1, 160)))
+            for _ in range(n_check_sequences)
+        ]
+        for start in range(0, n_check_sequences, 32):
+            batch = check_sequences[start:start + 32]
+            expected = tokenizer(batch, return_tensors='pt', padding=True)
+            input_ids, attention_mask = character_tokenizer.encode(batch)
+            if not (torch.equal(input_ids, expected['input_ids']) and torch.equal(attention_mask, expected['attention_mask'])):
+                return None
+        return character_tokenizer
+
+
+@lru_cache(maxsize=None)
+def character_tokenizer_for(tokenizer):
+    """CharacterTokenizer for tokenizer, checked once per process; None if it does not match"""
+    character_tokenizer = CharacterTokenizer.from_tokenizer(tokenizer)
+    if character_tokenizer is None:
+        print('Vectorised tokenizer does not match the HF tokenizer, using the HF tokenizer')
+    return character_tokenizer
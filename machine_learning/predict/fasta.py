@@ -0,0 +1,237 @@
+import numpy as np
+import pyarrow as pa
+
+from utils import NUCLEOTIDE_LETTERS, translate_unique_pairs
+
+RECORD_SCHEMA = pa.schema([('sequence_id', pa.large_string()), ('sequence', pa.large_string())])
+SEQUENCE_VH_SCHEMA = pa.schema([('sequence_id', pa.large_string()), ('sequence_vh', pa.large_string())])
+# letters the translation accepts, IUPAC ambiguity codes included, and gaps
+NUCLEOTIDE_BYTES = np.frombuffer((NUCLEOTIDE_LETTERS + NUCLEOTIDE_LETTERS.lower() + '-.').encode(), dtype=np.uint8)
+GAP_BYTES = np.frombuffer(b'-.', dtype=np.uint8)
+# unambiguous bases and N. The ambiguity codes are amino acid letters too, so at least half
+# the letters of a nucleotide sequence must be these
+BASE_BYTES = np.frombuffer(b'ACGTUNacgtun', dtype=np.uint8)
+NEWLINE = ord('\n')
+
+
+def _exclusive_cumsum(counts):
+    starts = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=starts[1:])
+    return starts
+
+
+def _lines(data):
+    """Start and end of each line of data, which ends with a newline. Ends exclude any '\\r'"""
+    newlines = np.flatnonzero(data == NEWLINE)
+    starts = np.concatenate([[0], newlines[:-1] + 1])
+    carriage_return = (newlines > starts) & (data[np.maximum(newlines - 1, 0)] == ord('\r'))
+    return starts, newlines - carriage_return
+
+
+def _gather(data, starts, lengths):
+    """The byte ranges data[start:start + length], concatenated in one pass"""
+    offsets = _exclusive_cumsum(lengths)
+    return data[np.arange(offsets[-1]) + np.repeat(starts - offsets[:-1], lengths)]
+
+
+def _line_contents(data, starts, ends, selected):
+    """
+    The contents of the selected lines, concatenated. Cheaper than _gather for most of
+    a block, as it builds a boolean mask rather than an index per byte
+    """
+    line_ends = np.append(starts[1:], len(data))
+    keep = np.repeat(
+        np.column_stack([selected, np.zeros(len(selected), dtype=bool)]).ravel(),
+        np.column_stack([ends - starts, line_ends - ends]).ravel()
+    )
+    return data[keep]
+
+
+def _string_array(values, lengths):
+    """LargeStringArray of consecutive strings of the given lengths in values"""
+    array = pa.LargeStringArray.from_buffers(
+        len(lengths), pa.py_buffer(_exclusive_cumsum(lengths)), pa.py_buffer(values)
+    )
+    array.validate(full=True)
+    return array
+
+
+def _record_ids(data, header_starts, header_ends):
+    """Header text after the leading '>' or '@' up to the first space or tab"""
+    header_lengths = header_ends - header_starts - 1
+    headers = _gather(data, header_starts + 1, header_lengths)
+    header_offsets = _exclusive_cumsum(header_lengths)
+    whitespace = np.flatnonzero((headers == ord(' ')) | (headers == ord('\t')))
+    first_whitespace = np.searchsorted(whitespace, header_offsets[:-1])
+    id_ends = header_offsets[1:].copy()
+    has_whitespace = first_whitespace < len(whitespace)
+    id_ends[has_whitespace] = np.minimum(id_ends[has_whitespace], whitespace[first_whitespace[has_whitespace]])
+    id_lengths = id_ends - header_offsets[:-1]
+    return _string_array(_gather(headers, header_offsets[:-1], id_lengths), id_lengths)
+
+
+def parse_fasta(data):
+    """
+    Records of a block of FASTA holding only whole records, as a uint8 array ending with a
+    newline. Sequences may be wrapped over several lines.
+
+    Returns:
+        tuple: (record batch of sequence_id and sequence, number of bytes consumed)
+    """
+    starts, ends = _lines(data)
+    non_empty = ends > starts
+    is_header = np.zeros(len(starts), dtype=bool)
+    is_header[non_empty] = data[starts[non_empty]] == ord('>')
+    record = np.cumsum(is_header) - 1
+    if (non_empty & ~is_header & (record < 0)).any():
+        raise ValueError('FASTA input must start with a ">" header line')
+
+    is_sequence = non_empty & ~is_header
+    line_lengths = ends[is_sequence] - starts[is_sequence]
+    sequence_lengths = np.bincount(record[is_sequence], weights=line_lengths, minlength=is_header.sum()).astype(np.int64)
+    # the sequence lines are in record order, so gathering them all concatenates each
+    # record's lines
+    sequences = _string_array(_line_contents(data, starts, ends, is_sequence), sequence_lengths)
+
+    ids = _record_ids(data, starts[is_header], ends[is_header])
+    return pa.record_batch([ids, sequences], schema=RECORD_SCHEMA), len(data)
+
+
+def parse_fastq(data):
+    """
+    Records of a block of four-line FASTQ, as a uint8 array ending with a newline. A
+    trailing partial record is left unconsumed.
+
+    Returns:
+        tuple: (record batch of sequence_id and sequence, number of bytes consumed)
+    """
+    starts, ends = _lines(data)
+    n_records = len(starts) // 4
+    headers = slice(0, 4 * n_records, 4)
+    if n_records and (data[starts[headers]] != ord('@')).any():
+        raise ValueError('FASTQ records must be four lines starting with an "@" header line')
+
+    sequence_lines = slice(1, 4 * n_records, 4)
+    quality_lines = slice(3, 4 * n_records, 4)
+    sequence_lengths = ends[sequence_lines] - starts[sequence_lines]
+    if (ends[quality_lines] - starts[quality_lines] != sequence_lengths).any():
+        raise ValueError('FASTQ quality lines must be as long as their sequences')
+    ids = _record_ids(data, starts[headers], ends[headers])
+    is_sequence = np.zeros(len(starts), dtype=bool)
+    is_sequence[sequence_lines] = True
+    sequences = _string_array(_line_contents(data, starts, ends, is_sequence), sequence_lengths)
+    consumed = starts[4 * n_records] if 4 * n_records < len(starts) else len(data)
+    return pa.record_batch([ids, sequences], schema=RECORD_SCHEMA), int(consumed)
+
+
+def read_records(stream, file_format, block_size=64 * 1024 * 1024):
+    """
+    Yield record batches of sequence_id and sequence from a FASTA or FASTQ stream, one per
+    block_size bytes read. Each block is parsed with whole-array operations on its bytes,
+    and a record split across blocks is carried over to the next one.
+    """
+    parse = parse_fasta if file_format == 'fasta' else parse_fastq
+    pending = b''
+    while True:
+        block = stream.read(block_size)
+        final = not block
+        data = pending + block
+        if final:
+            if data and not data.endswith(b'\n'):
+                data += b'\n'
+            complete = len(data)
+        elif file_format == 'fasta':
+            # the last record may continue in the next block
+            complete = data.rfind(b'\n>') + 1
+        else:
+            complete = data.rfind(b'\n') + 1
+
+        consumed = 0
+        if complete:
+            batch, consumed = parse(np.frombuffer(data, dtype=np.uint8, count=complete))
+            if batch.num_rows:
+                yield batch
+        if final:
+            if consumed < len(data) and data[consumed:].strip():
+                raise ValueError(f'Incomplete {file_format.upper()} record at the end of the input')
+            return
+        pending = data[consumed:]
+
+
+def is_nucleotide(batch, previous=None):
+    """
+    Whether the records of a batch of sequence_id and sequence are nucleotide rather than
+    amino acid sequences. A sequence is nucleotide if every letter is a nucleotide code or
+    a gap and at least half of its letters are bases or N; amino acid heavy chains hold
+    letters such as E, F, I, L, P and Q that are not nucleotide codes. Empty sequences
+    count as either.
+
+    Args:
+        batch (pa.RecordBatch): Records, see RECORD_SCHEMA
+        previous (bool): What the earlier batches of the same file were, None if undecided
+
+    Returns:
+        bool: or previous if every sequence is empty
+
+    Raises:
+        ValueError: If the records mix nucleotide and amino acid sequences, or are not of
+            the type of the earlier batches
+    """
+    sequences = batch['sequence']
+    values = sequences.buffers()[2]
+    offsets = np.frombuffer(sequences.buffers()[1], dtype=np.int64)[:len(sequences) + 1]
+    if values is None or offsets[-1] == offsets[0]:
+        return previous
+    values = np.frombuffer(values, dtype=np.uint8)[offsets[0]:offsets[-1]]
+    record = np.repeat(np.arange(len(sequences)), np.diff(offsets))
+
+    def count(flags):
+        return np.bincount(record, weights=flags, minlength=len(sequences))
+
+    letters = count(~np.isin(values, GAP_BYTES))
+    nucleotide = (count(~np.isin(values, NUCLEOTIDE_BYTES)) == 0) & (2 * count(np.isin(values, BASE_BYTES)) >= letters)
+    present = letters > 0
+    nucleotide_records = np.flatnonzero(present & nucleotide)
+    amino_acid_records = np.flatnonzero(present & ~nucleotide)
+    if len(nucleotide_records) and len(amino_acid_records):
+        ids = batch['sequence_id']
+        raise ValueError(
+            f'Input mixes nucleotide and amino acid sequences: {ids[int(nucleotide_records[0])]} is nucleotide, '
+            f'{ids[int(amino_acid_records[0])]} amino acid'
+        )
+    if not len(nucleotide_records) and not len(amino_acid_records):
+        return previous
+    block_is_nucleotide = bool(len(nucleotide_records))
+    if previous is not None and block_is_nucleotide != previous:
+        kind = 'nucleotide' if block_is_nucleotide else 'amino acid'
+        raise ValueError(f'Input mixes nucleotide and amino acid sequences: {kind} sequences from {batch["sequence_id"][0]} on')
+    return block_is_nucleotide
+
+
+def read_sequence_vh(stream, file_format, chunk_size=None, translation_processes=1, block_size=64 * 1024 * 1024):
+    """
+    Yield tables of sequence_id and sequence_vh from a FASTA or FASTQ stream, of at most
+    chunk_size rows if given. Every block is checked to hold nucleotide or amino acid
+    sequences only, of the same type throughout the file (see is_nucleotide); nucleotide
+    sequences are taken to be in frame and are translated with the vectorised AIRR
+    translation, without a germline back-fill.
+    """
+    nucleotide = None
+    for batch in read_records(stream, file_format, block_size):
+        nucleotide = is_nucleotide(batch, nucleotide)
+        sequences = batch['sequence']
+        if nucleotide:
+            sequences = pa.array(
+                translate_unique_pairs(
+                    sequences.to_numpy(zero_copy_only=False),
+                    np.full(len(sequences), '', dtype=object),
+                    n_processes=translation_processes
+                ),
+                type=pa.large_string()
+            )
+        table = pa.table([batch['sequence_id'], sequences], schema=SEQUENCE_VH_SCHEMA)
+        if chunk_size is None:
+            yield table
+        else:
+            for start in range(0, table.num_rows, chunk_size):
+                yield table.slice(start, chunk_size)
@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from aiohttp import web
+
+from predict import AutoantibodyClassifier, HUMAN_THRESHOLD
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent predict calls into batched forward passes. The first request
+    to arrive opens a batch, which closes after max_wait_ms or once it holds
+    max_batch_size sequences, whichever comes first. Batches run one at a time on a
+    single worker thread so the event loop keeps accepting requests (and filling the
+    next batch) while the model runs.
+
+    Args:
+        classifier (AutoantibodyClassifier): Warm model
+        max_batch_size (int): Most sequences scored in one forward pass
+        max_wait_ms (float): Longest a request waits for others to join its batch
+        latency_window (int): Number of recent requests the latency percentiles cover
+    """
+    def __init__(self, classifier, max_batch_size=64, max_wait_ms=10, latency_window=10000):
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.latencies = deque(maxlen=latency_window)
+        self.batch_sizes = deque(maxlen=latency_window)
+        self.requests = 0
+        self.errors = 0
+
+    async def predict(self, sequence):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((sequence, future, time.perf_counter()))
+        return await future
+
+    async def next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.next_batch()
+            sequences = [sequence for sequence, _, _ in batch]
+            try:
+                human_probabilities = await loop.run_in_executor(
+                    self.executor, self.classifier.predict_sequences, sequences
+                )
+            except Exception as e:
+                self.errors += len(batch)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            self.batch_sizes.append(len(batch))
+            for (_, future, submitted), human_probability in zip(batch, human_probabilities):
+                self.requests += 1
+                self.latencies.append(finished - submitted)
+                # the caller may have disconnected and cancelled its future
+                if not future.done():
+                    future.set_result(float(human_probability))
+
+    def metrics(self):
+        latencies_ms = np.array(self.latencies) * 1000
+        percentiles = (
+            dict(zip(['p50', 'p90', 'p99'], np.percentile(latencies_ms, [50, 90, 99]).round(2).tolist()))
+            if len(latencies_ms) else {'p50': None, 'p90': None, 'p99': None}
+        )
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'queue_depth': self.queue.qsize(),
+            'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else None,
+            'latency_ms': percentiles
+        }
+
+
+def create_app(classifier, max_batch_size=64, max_wait_ms=10):
+    """
+    aiohttp application with
+        POST /predict  {"sequence": "..."} -> {"sequence_vh": ..., "human_probability": ..., "prediction": ...}
+        GET  /metrics  latency percentiles, queue depth and batch sizes
+        GET  /health
+    """
+    batcher = MicroBatcher(classifier, max_batch_size, max_wait_ms)
+
+    async def predict(request):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text='Request body must be JSON')
+        sequence = body.get('sequence') if isinstance(body, dict) else None
+        if not isinstance(sequence, str) or not sequence.strip():
+            raise web.HTTPBadRequest(text='No sequence provided')
+
+        sequence = ''.join(sequence.split()).upper()
+        human_probability = await batcher.predict(sequence)
+        return web.json_response({
+            'sequence_vh': sequence,
+            'human_probability': human_probability,
+            'prediction': 'human' if human_probability > HUMAN_THRESHOLD else ''
+        })
+
+    async def metrics(request):
+        return web.json_response(batcher.metrics())
+
+    async def health(request):
+        return web.json_response({'status': 'ok'})
+
+    async def start_batcher(app):
+        app['batcher_task'] = asyncio.create_task(batcher.run())
+
+    async def stop_batcher(app):
+        app['batcher_task'].cancel()
+        batcher.executor.shutdown(wait=True)
+
+    app = web.Application()
+    app.router.add_post('/predict', predict)
+    app.router.add_get('/metrics', metrics)
+    app.router.add_get('/health', health)
+    app.on_startup.append(start_batcher)
+    app.on_cleanup.append(stop_batcher)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='HTTP inference server which keeps the model loaded and batches concurrent requests')
+    parser.add_argument('--tokenizer_path', type=str, default='./fabcon-small/', help='Path to the tokenizer for your model')
+    parser.add_argument('--model_path', type=str, required=True, help='Path to the model')
+    parser.add_argument('--host', type=str, default='0.0.0.0', help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--max_batch_size', type=int, default=64, help='Most requests coalesced into one forward pass')
+    parser.add_argument('--max_wait_ms', type=float, default=10, help='Longest a request waits for others to join its batch')
+    parser.add_argument('--max_tokens', type=int, default=4096, help='Maximum number of padded tokens per batch')
+    parser.add_argument('--backend', type=str, default='torch', choices=['torch', 'onnx'], help='Inference backend')
+    parser.add_argument('--quantize', type=str, default='none', choices=['none', 'int8'], help='Dynamic int8 quantization of the linear layers')
+    parser.add_argument('--intra_op_threads', type=int, default=0, help='Threads used within each operator. 0 leaves the backend default')
+    args = parser.parse_args()
+
+    classifier = AutoantibodyClassifier(
+        args.tokenizer_path,
+        args.model_path,
+        args.max_tokens,
+        args.backend,
+        intra_op_threads=args.intra_op_threads,
+        quantize=args.quantize
+    )
+    web.run_app(create_app(classifier, args.max_batch_size, args.max_wait_ms), host=args.host, port=args.port)
@@ -0,0 +1,217 @@
+import os
+import resource
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from fasta import SEQUENCE_VH_SCHEMA, read_sequence_vh
+
+# columns the model needs: sequence_vh, or the AIRR alignment pair it is translated from
+SEQUENCE_COLUMNS = ['sequence_vh']
+AIRR_COLUMNS = ['sequence_alignment', 'germline_alignment_d_mask']
+LABEL_COLUMNS = ['label']
+# columns analyse_metrics reads from the annotated output
+METRICS_COLUMNS = ['v_call', 'c_call', 'cdr3_aa', 'mu_count_total', 'prediction', 'human_probability']
+# low-cardinality gene calls, loaded as categoricals
+CATEGORICAL_COLUMNS = ['v_call', 'c_call']
+# compression of text input, detected from the file extension
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.zst': 'zstd', '.bz2': 'bz2'}
+# FASTA/FASTQ inputs, read as their record ids and (translated) sequences
+SEQUENCE_FILE_FORMATS = {'.fasta': 'fasta', '.fa': 'fasta', '.faa': 'fasta', '.fna': 'fasta', '.fastq': 'fastq', '.fq': 'fastq'}
+# filesystems registered for URI schemes, see register_filesystem
+FILESYSTEMS = {}
+
+
+def register_filesystem(scheme, filesystem):
+    """
+    Read scheme:// URIs through filesystem, a pyarrow.fs.FileSystem, rather than the one
+    pyarrow picks for the scheme. For example
+
+        register_filesystem('s3', SubTreeFileSystem(directory, LocalFileSystem()))
+
+    makes s3://bucket/key read directory/bucket/key.
+    """
+    FILESYSTEMS[scheme] = filesystem
+
+
+def resolve_path(input_path):
+    """(filesystem, path) of a local path or a URI such as s3://bucket/key"""
+    scheme, separator, path = input_path.partition('://')
+    if not separator:
+        return pafs.LocalFileSystem(), os.path.abspath(input_path)
+    if scheme in FILESYSTEMS:
+        return FILESYSTEMS[scheme], path
+    return pafs.FileSystem.from_uri(input_path)
+
+
+def input_format(input_path):
+    """
+    Returns:
+        tuple: (file_format, compression) where file_format is csv, tsv, parquet, fasta
+        or fastq and compression is the codec of a compressed text file, or None
+    """
+    text_path, extension = os.path.splitext(input_path)
+    compression = COMPRESSION_EXTENSIONS.get(extension)
+    if compression is None:
+        text_path = input_path
+    if text_path.endswith('.csv'):
+        return 'csv', compression
+    elif text_path.endswith('.tsv'):
+        return 'tsv', compression
+    elif text_path.endswith('.parquet') and compression is None:
+        return 'parquet', None
+    elif os.path.splitext(text_path)[1] in SEQUENCE_FILE_FORMATS:
+        return SEQUENCE_FILE_FORMATS[os.path.splitext(text_path)[1]], compression
+    else:
+        raise ValueError('Input file extension not recognised. Please choose one of .csv, .tsv, .fasta, .fastq (optionally .gz, .zst or .bz2), or .parquet')
+
+
+def open_input(input_path):
+    """
+    Open a local or remote input file: parquet as a random access file, text and
+    FASTA/FASTQ as a stream which is decompressed as it is read if the file is compressed
+    """
+    filesystem, path = resolve_path(input_path)
+    file_format, compression = input_format(input_path)
+    if file_format == 'parquet':
+        return filesystem.open_input_file(path)
+    return filesystem.open_input_stream(path, compression=compression)
+
+
+def input_size(input_path):
+    """Size of the input file in bytes, as stored"""
+    filesystem, path = resolve_path(input_path)
+    return filesystem.get_file_info(path).size
+
+
+def delimiter(file_format):
+    return '\t' if file_format == 'tsv' else ','
+
+
+def file_columns(input_path):
+    """Column names of an input file, in file order, without reading its rows"""
+    file_format, _ = input_format(input_path)
+    if file_format in ('fasta', 'fastq'):
+        return SEQUENCE_VH_SCHEMA.names
+    with open_input(input_path) as f:
+        if file_format == 'parquet':
+            return pq.read_schema(f).names
+        reader = pv.open_csv(f, parse_options=pv.ParseOptions(delimiter=delimiter(file_format)))
+        return reader.schema.names
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def read_table(input_path, columns, translation_processes=1):
+    """
+    Read only the given columns of an input file (see input_format) into an Arrow table,
+    with the gene call columns dictionary encoded. Nucleotide FASTA/FASTQ sequences are
+    translated with translation_processes processes.
+
+    Returns:
+        tuple: (table, bytes_read) where bytes_read counts the compressed column chunks
+        read from parquet, or the whole file as stored for text formats, which have to
+        be scanned
+    """
+    file_format, _ = input_format(input_path)
+    with open_input(input_path) as f:
+        if file_format == 'parquet':
+            # gene calls are decoded straight to dictionary arrays rather than encoded after
+            parquet_file = pq.ParquetFile(f, read_dictionary=[name for name in CATEGORICAL_COLUMNS if name in columns])
+            table = parquet_file.read(columns=columns)
+            metadata = parquet_file.metadata
+            projected = [
+                index for index in range(metadata.num_columns)
+                if metadata.schema.column(index).path.split('.')[0] in columns
+            ]
+            bytes_read = sum(
+                metadata.row_group(row_group).column(index).total_compressed_size
+                for row_group in range(metadata.num_row_groups)
+                for index in projected
+            )
+        elif file_format in ('fasta', 'fastq'):
+            table = pa.concat_tables([
+                SEQUENCE_VH_SCHEMA.empty_table(),
+                *read_sequence_vh(f, file_format, translation_processes=translation_processes)
+            ]).select(columns)
+            bytes_read = input_size(input_path)
+        else:
+            table = pv.read_csv(
+                f,
+                parse_options=pv.ParseOptions(delimiter=delimiter(file_format)),
+                # empty and 'NA'-like strings are missing, as they are for pandas
+                convert_options=pv.ConvertOptions(include_columns=columns, strings_can_be_null=True)
+            )
+            bytes_read = input_size(input_path)
+
+    for name in CATEGORICAL_COLUMNS:
+        if name in table.column_names and not pa.types.is_dictionary(table.schema.field(name).type):
+            table = table.set_column(table.column_names.index(name), name, pc.dictionary_encode(table[name]))
+    return table, bytes_read
+
+
+def read_column_table(input_path, columns):
+    """
+    Arrow table of whichever of the given columns the file has, e.g. METRICS_COLUMNS for
+    analyse_metrics, with v_call/c_call dictionary encoded. Other columns are not read.
+    """
+    available = file_columns(input_path)
+    selected = [name for name in available if name in columns]
+    table, bytes_read = read_table(input_path, selected)
+    print(f'Read {bytes_read / 1e6:.1f} MB ({len(selected)} of {len(available)} columns) from {input_path}, peak RSS {peak_rss_mb():.0f} MB')
+    return table
+
+
+def read_sequence_file_chunks(input_path, chunk_size, translation_processes=1):
+    """Yield a FASTA/FASTQ input as tables of sequence_id and sequence_vh of at most chunk_size rows"""
+    file_format, _ = input_format(input_path)
+    with open_input(input_path) as f:
+        yield from read_sequence_vh(f, file_format, chunk_size, translation_processes)
+
+
+def read_for_inference(input_path, translation_processes=1):
+    """
+    Split the input into the columns prediction needs, as a DataFrame, and everything
+    else, kept as an Arrow table and only joined back on at write time (see
+    join_passthrough). Rows stay in file order in both. The sequence_id of FASTA/FASTQ
+    records is passed through, so it keys the output.
+
+    Returns:
+        tuple: (dataframe, passthrough, column_order) where column_order is the file's column order
+    """
+    available = file_columns(input_path)
+    if 'sequence_vh' in available:
+        needed = SEQUENCE_COLUMNS + LABEL_COLUMNS
+    else:
+        needed = AIRR_COLUMNS + LABEL_COLUMNS
+
+    table, bytes_read = read_table(input_path, available, translation_processes)
+    selected = [name for name in available if name in needed]
+    dataframe = table.select(selected).to_pandas()
+    passthrough = table.drop_columns(selected)
+    print(f'Read {bytes_read / 1e6:.1f} MB from {input_path}: {len(selected)} columns for inference, {passthrough.num_columns} passed through, peak RSS {peak_rss_mb():.0f} MB')
+    return dataframe, passthrough, available
+
+
+def join_passthrough(merged_df, passthrough, column_order):
+    """
+    Arrow table of the annotated rows with the passthrough columns joined back on by row
+    position. The input's columns keep their file order, followed by the new ones.
+    """
+    annotated = pa.Table.from_pandas(merged_df, preserve_index=False)
+    columns = {}
+    for name in column_order:
+        if name in passthrough.column_names:
+            columns[name] = passthrough[name]
+        elif name in annotated.column_names:
+            columns[name] = annotated[name]
+    for name in annotated.column_names:
+        if name not in columns:
+            columns[name] = annotated[name]
+    return pa.table(columns)
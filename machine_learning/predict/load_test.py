@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+import numpy as np
+
+from utils import random_heavy_chains
+
+
+async def run_load_test(url, n_requests, concurrency, n_distinct):
+    """
+    Fire n_requests single-sequence predictions at the inference server from
+    concurrency simultaneous clients and report throughput and client-side latency.
+    """
+    sequences = random_heavy_chains(n_distinct)
+    latencies = []
+    failures = 0
+    next_request = iter(range(n_requests))
+
+    async def client(session):
+        nonlocal failures
+        for i in next_request:
+            start = time.perf_counter()
+            async with session.post(f'{url}/predict', json={'sequence': sequences[i % n_distinct]}) as response:
+                await response.read()
+                if response.status != 200:
+                    failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    async with aiohttp.ClientSession() as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+
+        async with session.get(f'{url}/metrics') as response:
+            server_metrics = await response.json()
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f'{n_requests} requests from {concurrency} clients in {seconds:.2f}s: {n_requests / seconds:.1f} requests/s, {failures} failures')
+    print('Client latency ms: ' + ', '.join(
+        f'{name} {value:.1f}' for name, value in zip(['p50', 'p90', 'p99'], np.percentile(latencies_ms, [50, 90, 99]))
+    ))
+    print(f'Server metrics: {json.dumps(server_metrics)}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test the inference server with concurrent single-sequence requests')
+    parser.add_argument('--url', type=str, default='http://localhost:8080', help='Base URL of the inference server')
+    parser.add_argument('--n_requests', type=int, default=2000, help='Total number of requests')
+    parser.add_argument('--concurrency', type=int, default=64, help='Number of simultaneous clients')
+    parser.add_argument('--n_distinct', type=int, default=1000, help='Number of distinct synthetic sequences cycled through')
+    args = parser.parse_args()
+
+    asyncio.run(run_load_test(args.url, args.n_requests, args.concurrency, args.n_distinct))
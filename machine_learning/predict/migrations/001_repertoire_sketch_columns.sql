@@ -0,0 +1,13 @@
+-- Columns for the repertoire sketch metrics of analyse_metrics.RepertoireSketches,
+-- written by aws_handler.upload_metrics_batch. Apply to each metrics table before
+-- deploying a pipeline that uploads them, e.g.
+--
+--   psql "$FRANKLIN_METRICS_DSN" -v table=autoantibody_dev -f 001_repertoire_sketch_columns.sql
+
+ALTER TABLE :"table"
+    ADD COLUMN IF NOT EXISTS distinct_clonotypes bigint,
+    ADD COLUMN IF NOT EXISTS human_probability_quantiles text,
+    ADD COLUMN IF NOT EXISTS mu_count_quantiles text,
+    ADD COLUMN IF NOT EXISTS cdr3_length_quantiles text,
+    ADD COLUMN IF NOT EXISTS top_human_v_genes text,
+    ADD COLUMN IF NOT EXISTS sketches text;
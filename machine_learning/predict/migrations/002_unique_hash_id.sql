@@ -0,0 +1,19 @@
+-- Unique index on hash_id, which aws_handler.upload_metrics_batch upserts on
+-- (ON CONFLICT (hash_id)). Rows uploaded more than once for a hash_id before the
+-- upsert, e.g. by retried Nextflow tasks, are removed first, keeping the latest.
+-- Apply to each metrics table, e.g.
+--
+--   psql "$FRANKLIN_METRICS_DSN" -v table=autoantibody_dev -f 002_unique_hash_id.sql
+
+\set hash_id_index :table '_hash_id_key'
+
+BEGIN;
+
+DELETE FROM :"table" AS older
+USING :"table" AS newer
+WHERE older.hash_id = newer.hash_id
+  AND (COALESCE(older.date, '-infinity'), older.ctid) < (COALESCE(newer.date, '-infinity'), newer.ctid);
+
+CREATE UNIQUE INDEX IF NOT EXISTS :"hash_id_index" ON :"table" (hash_id);
+
+COMMIT;
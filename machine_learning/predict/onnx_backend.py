@@ -0,0 +1,208 @@
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import onnxruntime as ort
+import torch
+from transformers import (
+    PreTrainedTokenizerFast,
+    FalconForSequenceClassification,
+)
+
+from prediction_cache import artifact_is_current, model_fingerprint, record_fingerprint
+from utils import random_heavy_chains
+
+
+def default_onnx_path(model_path):
+    """The exported model sits next to the PyTorch model directory"""
+    return os.path.normpath(model_path) + '.onnx'
+
+
+class LogitsOnly(torch.nn.Module):
+    """Wraps the classifier so the exported graph has plain tensor inputs and outputs"""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
+def export_onnx(model_path, onnx_path=None, opset_version=17):
+    """
+    Export the trained FalconForSequenceClassification to ONNX with dynamic batch and
+    sequence axes, recording the fingerprint of model_path alongside it (see
+    load_onnx_classifier).
+
+    Args:
+        model_path (str): Path to the PyTorch model
+        onnx_path (str): Output file. Defaults to model_path + '.onnx'
+        opset_version (int): ONNX opset to target
+
+    Returns:
+        str: Path of the exported model
+    """
+    onnx_path = onnx_path or default_onnx_path(model_path)
+    model = FalconForSequenceClassification.from_pretrained(model_path).eval()
+
+    # non-pad dummy ids; the vocabulary's first few ids are special tokens
+    input_ids = torch.randint(5, model.config.vocab_size, (2, 16))
+    attention_mask = torch.ones_like(input_ids)
+    dynamic_axes = {
+        'input_ids': {0: 'batch', 1: 'sequence'},
+        'attention_mask': {0: 'batch', 1: 'sequence'},
+        'logits': {0: 'batch'}
+    }
+    with torch.no_grad():
+        torch.onnx.export(
+            LogitsOnly(model),
+            (input_ids, attention_mask),
+            onnx_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['logits'],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version
+        )
+    record_fingerprint(onnx_path, model_fingerprint(model_path))
+    return onnx_path
+
+
+class OnnxSequenceClassifier:
+    """
+    onnxruntime session with the same call signature as the PyTorch classifier, so it
+    can be dropped into predict.score_batches. Runs on CPU only.
+
+    Args:
+        onnx_path (str): Exported model, see export_onnx
+        intra_op_threads (int): Threads used within each operator. 0 lets onnxruntime decide
+    """
+    def __init__(self, onnx_path, intra_op_threads=0):
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session_options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(
+            onnx_path,
+            sess_options=session_options,
+            providers=['CPUExecutionProvider']
+        )
+
+    def __call__(self, input_ids, attention_mask):
+        logits = self.session.run(
+            ['logits'],
+            {
+                'input_ids': input_ids.cpu().numpy().astype(np.int64),
+                'attention_mask': attention_mask.cpu().numpy().astype(np.int64)
+            }
+        )[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+    def to(self, device):
+        if torch.device(device).type != 'cpu':
+            sys.exit('The onnx backend runs on CPU only')
+        return self
+
+    def eval(self):
+        return self
+
+
+def load_onnx_classifier(model_path, onnx_path=None, intra_op_threads=0):
+    """
+    Load the ONNX classifier, exporting it from model_path first if it does not exist yet
+    or was exported from different weights, so a retrained model is never served from a
+    stale graph
+    """
+    onnx_path = onnx_path or default_onnx_path(model_path)
+    if not artifact_is_current(onnx_path, model_fingerprint(model_path)):
+        print(f'Exporting {model_path} to {onnx_path}')
+        export_onnx(model_path, onnx_path)
+    return OnnxSequenceClassifier(onnx_path, intra_op_threads)
+
+
+def human_probabilities(model, tokenizer, sequences, batch_size=16):
+    """Human probability of each sequence, in fixed-size batches"""
+    probabilities = []
+    with torch.no_grad():
+        for start in range(0, len(sequences), batch_size):
+            inputs = tokenizer(sequences[start:start + batch_size], return_tensors='pt', padding=True)
+            logits = model(input_ids=inputs['input_ids'], attention_mask=inputs['attention_mask']).logits
+            probabilities.append(torch.softmax(logits, dim=1)[:, -1].numpy())
+    return np.concatenate(probabilities)
+
+
+def check_parity(model_path, tokenizer_path, onnx_path=None, n_sequences=512, tolerance=1e-4, intra_op_threads=0):
+    """
+    Compare human_probability from the ONNX and PyTorch classifiers on synthetic heavy
+    chains.
+
+    Returns:
+        float: Maximum absolute difference in human_probability
+    """
+    tokenizer = PreTrainedTokenizerFast.from_pretrained(tokenizer_path)
+    sequences = ['Ḣ' + sequence for sequence in random_heavy_chains(n_sequences)]
+
+    torch_model = FalconForSequenceClassification.from_pretrained(model_path).eval()
+    onnx_model = load_onnx_classifier(model_path, onnx_path, intra_op_threads)
+
+    difference = np.abs(
+        human_probabilities(torch_model, tokenizer, sequences) - human_probabilities(onnx_model, tokenizer, sequences)
+    ).max()
+    print(f'Max human_probability difference over {n_sequences} sequences: {difference:.2e} (tolerance {tolerance:.0e})')
+    return difference
+
+
+def compare_throughput(model_path, tokenizer_path, onnx_path=None, n_sequences=2048, batch_size=16, intra_op_threads=0):
+    """Sequences per second of each backend on a synthetic repertoire"""
+    tokenizer = PreTrainedTokenizerFast.from_pretrained(tokenizer_path)
+    sequences = ['Ḣ' + sequence for sequence in random_heavy_chains(n_sequences)]
+
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    backends = {
+        'torch': FalconForSequenceClassification.from_pretrained(model_path).eval(),
+        'onnx': load_onnx_classifier(model_path, onnx_path, intra_op_threads)
+    }
+    for name, model in backends.items():
+        # warm up so one-off allocation and graph optimisation are not timed
+        human_probabilities(model, tokenizer, sequences[:batch_size], batch_size)
+        start = time.perf_counter()
+        human_probabilities(model, tokenizer, sequences, batch_size)
+        seconds = time.perf_counter() - start
+        print(f'{name}: {n_sequences / seconds:.1f} sequences/s')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the classifier to ONNX and check it against PyTorch')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Export the model to ONNX')
+    export_parser.add_argument('--model_path', type=str, required=True, help='Path to the model')
+    export_parser.add_argument('--onnx_path', type=str, default=None, help='Output file. Defaults to the model path with a .onnx suffix')
+    export_parser.add_argument('--opset_version', type=int, default=17, help='ONNX opset version')
+
+    for command, help_text in [
+        ('parity', 'Check ONNX human_probability matches PyTorch within a tolerance'),
+        ('benchmark', 'Compare PyTorch and ONNX throughput on synthetic sequences')
+    ]:
+        command_parser = subparsers.add_parser(command, help=help_text)
+        command_parser.add_argument('--model_path', type=str, required=True, help='Path to the model')
+        command_parser.add_argument('--tokenizer_path', type=str, default='./fabcon-small/', help='Path to the tokenizer for your model')
+        command_parser.add_argument('--onnx_path', type=str, default=None, help='Exported model. Exported first if missing or exported from other weights')
+        command_parser.add_argument('--n_sequences', type=int, default=512 if command == 'parity' else 2048, help='Number of synthetic sequences')
+        command_parser.add_argument('--intra_op_threads', type=int, default=0, help='onnxruntime intra-op threads, 0 for the default')
+    subparsers.choices['parity'].add_argument('--tolerance', type=float, default=1e-4, help='Maximum allowed absolute difference')
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        print(export_onnx(args.model_path, args.onnx_path, args.opset_version))
+    elif args.command == 'parity':
+        difference = check_parity(
+            args.model_path, args.tokenizer_path, args.onnx_path, args.n_sequences, args.tolerance, args.intra_op_threads
+        )
+        if difference > args.tolerance:
+            sys.exit('ONNX model does not match PyTorch within tolerance')
+    else:
+        compare_throughput(args.model_path, args.tokenizer_path, args.onnx_path, args.n_sequences, intra_op_threads=args.intra_op_threads)
@@ -0,0 +1,190 @@
+import queue
+import threading
+import time
+
+import numpy as np
+import torch
+from transformers import PreTrainedTokenizerFast
+
+from predict import (
+    OutputWriter,
+    TokenBudgetBatchSampler,
+    add_fabcon_sequence,
+    annotate_predictions,
+    deduplicate_sequences,
+    load_model,
+    make_collate_fn,
+    print_metrics,
+    read_input_chunks,
+    sequence_lengths,
+)
+from utils import TranslationCache
+
+# marks the end of a stage's output
+END = object()
+
+
+class Stage(threading.Thread):
+    """
+    One step of the pipeline, run in its own thread between two bounded queues.
+
+    work is called with an iterator over the stage's inputs (None for the first stage)
+    and yields its outputs (the last stage yields nothing). Time spent waiting on an
+    empty inbox is counted as starved, time spent waiting on a full outbox as blocked,
+    and the rest as busy.
+    """
+    def __init__(self, name, work, inbox=None, outbox=None):
+        super().__init__(name=name, daemon=True)
+        self.work = work
+        self.inbox = inbox
+        self.outbox = outbox
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.elapsed = 0.0
+        self.error = None
+
+    def inputs(self):
+        while True:
+            start = time.perf_counter()
+            item = self.inbox.get()
+            self.starved += time.perf_counter() - start
+            if item is END:
+                return
+            yield item
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            for output in self.work(self.inputs() if self.inbox is not None else None) or ():
+                if self.outbox is not None:
+                    put_start = time.perf_counter()
+                    self.outbox.put(output)
+                    self.blocked += time.perf_counter() - put_start
+        except BaseException as e:
+            self.error = e
+            # keep consuming so the stages upstream are not left blocked on a full queue
+            if self.inbox is not None:
+                for _ in self.inputs():
+                    pass
+        finally:
+            if self.outbox is not None:
+                self.outbox.put(END)
+            self.elapsed = time.perf_counter() - start
+
+    @property
+    def busy(self):
+        return self.elapsed - self.starved - self.blocked
+
+
+def report_stages(stages):
+    print(f"{'stage':<10}{'busy s':>10}{'starved s':>12}{'blocked s':>12}{'busy %':>9}")
+    for stage in stages:
+        busy_percent = 100 * stage.busy / stage.elapsed if stage.elapsed else 0.0
+        print(f'{stage.name:<10}{stage.busy:>10.2f}{stage.starved:>12.2f}{stage.blocked:>12.2f}{busy_percent:>9.1f}')
+
+
+def predict_pipelined(
+    input_path: str,
+    output_file: str,
+    tokenizer_path: str,
+    model_path: str,
+    device,
+    chunk_size: int = 100000,
+    max_tokens: int = 4096,
+    translation_processes: int = 1,
+    backend: str = 'torch',
+    onnx_path: str = None,
+    intra_op_threads: int = 0,
+    quantize: str = None,
+    queue_size: int = 4,
+    row_group_size: int = 1000000,
+    predictions_only: bool = False,
+    metrics_file: str = None
+):
+    """
+    predict_stream with its stages overlapped: reading, translation, tokenization,
+    inference and writing each run in their own thread, connected by queues of at most
+    queue_size items, so the model is fed ready-tokenized batches while the next chunks
+    are still being read and translated. Output is identical to predict_stream and in
+    the same order. At the end each stage's busy, starved (waiting for input) and
+    blocked (waiting for the next stage) time is printed; a model stage that is
+    rarely starved is running flat out.
+    """
+    tokenizer = PreTrainedTokenizerFast.from_pretrained(tokenizer_path)
+    model, _ = load_model(model_path, device, backend, onnx_path, intra_op_threads, quantize)
+    collate_fn = make_collate_fn(tokenizer)
+    # clonotypes recur across chunks, so translations are kept between them
+    translation_cache = TranslationCache()
+    writer = OutputWriter(output_file, row_group_size, predictions_only, metrics_file)
+    labels = []
+    probs = []
+
+    def read(_):
+        yield from read_input_chunks(input_path, chunk_size, translation_processes)
+
+    def translate(chunks):
+        for chunk in chunks:
+            original_columns = add_fabcon_sequence(chunk, translation_processes, translation_cache)
+            codes, sequences = deduplicate_sequences(original_columns)
+            yield original_columns, codes, sequences
+
+    def tokenize(translated_chunks):
+        # each chunk is sent ahead of its batches, so the model stage knows where one
+        # chunk's batches end and the next begin
+        for original_columns, codes, sequences in translated_chunks:
+            yield original_columns, codes, sequences
+            batch_sampler = TokenBudgetBatchSampler(sequence_lengths(sequences, tokenizer), max_tokens)
+            for batch in batch_sampler:
+                yield collate_fn([(index, sequences[index]) for index in batch])
+
+    def infer(items):
+        chunk = None
+        with torch.no_grad():
+            for item in items:
+                if isinstance(item, tuple):
+                    if chunk is not None:
+                        yield chunk
+                    original_columns, codes, sequences = item
+                    chunk = original_columns, codes, np.full(len(sequences), np.nan, dtype=np.float32)
+                    continue
+                logits = model(
+                    input_ids=item['input_ids'].to(device),
+                    attention_mask=item['attention_mask'].to(device)
+                ).logits
+                chunk[2][item['indices'].numpy()] = torch.softmax(logits.cpu(), dim=1)[:, -1].numpy()
+        if chunk is not None:
+            yield chunk
+
+    def write(scored_chunks):
+        for original_columns, codes, human_probabilities in scored_chunks:
+            merged_df = annotate_predictions(original_columns, codes, human_probabilities)
+            writer.write(merged_df)
+            print(f'Rows written: {writer.rows_written}')
+
+            if 'label' in merged_df.columns:
+                labels.append(merged_df['label'].values)
+                probs.append(merged_df['human_probability'].values)
+
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(4)]
+    stages = [
+        Stage('read', read, outbox=queues[0]),
+        Stage('translate', translate, queues[0], queues[1]),
+        Stage('tokenize', tokenize, queues[1], queues[2]),
+        Stage('infer', infer, queues[2], queues[3]),
+        Stage('write', write, queues[3])
+    ]
+    for stage in stages:
+        stage.start()
+    for stage in stages:
+        stage.join()
+    writer.close()
+
+    for stage in stages:
+        if stage.error is not None:
+            raise stage.error
+
+    report_stages(stages)
+    if translation_cache.hits + translation_cache.misses:
+        print(f'Translation cache hit rate: {translation_cache.hit_rate:.3f}')
+    if labels:
+        print_metrics(np.concatenate(labels), np.concatenate(probs))
@@ -3,9 +3,10 @@ import numpy as np
 import argparse
 import torch
 import torch.distributed as dist
-from torch.nn.parallel import DistributedDataParallel as DDP
 import os 
 import sys
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datasets import (
     Dataset
 )
@@ -14,18 +15,26 @@ from transformers import (
     FalconForSequenceClassification,
 )
 from tqdm import tqdm
-from torch.utils.data import DataLoader, Dataset, DistributedSampler
-
-from sklearn.metrics import (
-    roc_auc_score, 
-    recall_score, 
-    precision_score, 
-    f1_score,
-    matthews_corrcoef,
-    average_precision_score
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+from analyse_metrics import MetricsAccumulator
+from evaluation import evaluate
+from utils import TranslationCache, translate_unique_pairs
+from prediction_cache import PredictionCache, model_fingerprint
+from fast_tokenizer import character_tokenizer_for
+from fasta import SEQUENCE_VH_SCHEMA
+from ingest import (
+    delimiter,
+    input_format,
+    join_passthrough,
+    open_input,
+    read_for_inference,
+    read_sequence_file_chunks,
+    read_table,
 )
 
-from utils import get_full_aa_sub
+# human_probability above which a sequence is annotated as 'human'
+HUMAN_THRESHOLD = 0.99
 
 class AntibodyRepertoireDataset(Dataset):
     def __init__(self, sequences):
@@ -35,129 +44,296 @@ class AntibodyRepertoireDataset(Dataset):
         return len(self.sequences)
 
     def __getitem__(self,index):
-        return self.sequences[index]
+        # index travels with the sequence so results can be scattered back into input order
+        return index, self.sequences[index]
+
+
+class TokenBudgetBatchSampler(Sampler):
+    """
+    Batch sampler which packs sequences of similar tokenized length together so that
+    each padded batch holds at most max_tokens tokens.
+
+    Sequences are sorted longest first, so the first sequence in each batch sets the
+    padded length and the batch size is simply max_tokens // that length. For the
+    distributed path the batches are dealt round-robin across replicas, repeating
+    batches from the start when needed so every rank runs the same number of steps
+    (the same padding strategy DistributedSampler uses).
+
+    Args:
+        lengths (array-like): Tokenized length of each sequence in the dataset
+        max_tokens (int): Budget of padded tokens (batch size * longest sequence) per batch
+        num_replicas (int): Number of ranks taking part
+        rank (int): Rank of this process
+    """
+    def __init__(self, lengths, max_tokens, num_replicas=1, rank=0):
+        lengths = np.asarray(lengths, dtype=np.int64)
+        order = np.argsort(-lengths, kind='stable')
+        sorted_lengths = lengths[order]
+
+        batches = []
+        position = 0
+        while position < len(order):
+            # a sequence longer than the budget still gets a batch of its own
+            batch_size = max(1, max_tokens // int(sorted_lengths[position]))
+            batches.append(order[position:position + batch_size])
+            position += batch_size
+
+        real_tokens = int(lengths.sum())
+        padded_tokens = int(sum(len(batch) * lengths[batch[0]] for batch in batches))
+        self.padding_efficiency = real_tokens / padded_tokens if padded_tokens else 1.0
+
+        if num_replicas > 1 and len(batches) % num_replicas:
+            padding = num_replicas - len(batches) % num_replicas
+            batches += (batches * padding)[:padding]
+        self.batches = batches[rank::num_replicas]
 
+    def __len__(self):
+        return len(self.batches)
 
-def setup(rank, world_size):
-    dist.init_process_group("nccl", rank=rank, world_size=world_size)
-    torch.cuda.set_device(rank)
+    def __iter__(self):
+        for batch in self.batches:
+            yield batch.tolist()
 
-def cleanup():
-    dist.destroy_process_group()
 
+def sequence_lengths(sequences, tokenizer):
+    """
+    Tokenized length of each sequence. The FAbCon vocabulary is one token per residue
+    (the chain token included), so this is the string length plus any special tokens
+    the tokenizer adds, without running the tokenizer over the whole dataset.
+    """
+    n_special = tokenizer.num_special_tokens_to_add()
+    return np.fromiter((len(sequence) for sequence in sequences), dtype=np.int64, count=len(sequences)) + n_special
 
-def predict_gpu(
-    input_path: str,
-    output_file: str,
-    tokenizer_path: str,
-    model_path: str,
-    local_rank: int = 0,
-    world_size: int = 1
-): 
-    setup(local_rank,
-          world_size)
 
-    if input_path.endswith('.csv'):
-        # LOAD DATASET
-        dataset_to_predict = pd.read_csv(input_path)
+def make_collate_fn(tokenizer):
+    # checked against the HF tokenizer once per process; None if it does not match
+    character_tokenizer = character_tokenizer_for(tokenizer)
 
-        available_columns = dataset_to_predict.columns
-        dataset_to_predict['fabcon_sequence'] = 'Ḣ' + dataset_to_predict['sequence_vh']
-        original_columns = dataset_to_predict.copy()
-        
-        # DEDUPLICATE UNIQUE SEQUENCES
-        dataset_to_predict_deduplicated = dataset_to_predict.drop_duplicates(subset=['fabcon_sequence'])
-        
-        if 'label' in available_columns:
-            dataset_to_predict_deduplicated = dataset_to_predict_deduplicated[['fabcon_sequence','label']].copy()
-            dataset_to_predict_deduplicated['label'] = dataset_to_predict_deduplicated['label'].astype(int)
-        else:
-            dataset_to_predict_deduplicated = dataset_to_predict_deduplicated[['fabcon_sequence']].copy()
-    
-    # Similar modification for .tsv and .parquet files
-    elif input_path.endswith('.tsv') or input_path.endswith('.parquet'):
-        if input_path.endswith('.tsv'):
-            dataset_to_predict = pd.read_csv(input_path, sep='\t')
+    def collate_fn(batch, tokenizer=tokenizer):
+        indices, text = zip(*batch)
+        encoded = character_tokenizer.encode(text) if character_tokenizer is not None else None
+        if encoded is not None:
+            tokenized_input = {'input_ids': encoded[0], 'attention_mask': encoded[1]}
         else:
-            dataset_to_predict = pd.read_parquet(input_path)
-        available_columns = dataset_to_predict.columns
-
-        if 'sequence_vh' in available_columns:
-            dataset_to_predict['fabcon_sequence'] = 'Ḣ' + dataset_to_predict['sequence_vh']
-            original_columns = dataset_to_predict.copy()
-            
-            # DEDUPLICATE UNIQUE SEQUENCES
-            dataset_to_predict_deduplicated = dataset_to_predict.drop_duplicates(subset=['fabcon_sequence'])
-
-        elif 'sequence_alignment' in available_columns and 'germline_alignment_d_mask' in available_columns:
-            dataset_to_predict['sequence_vh'] = dataset_to_predict.apply(
-                lambda row: get_full_aa_sub(str(row['sequence_alignment']), str(row['germline_alignment_d_mask'])), 
-                axis=1
+            # pads to max length in batch
+            tokenized_input = tokenizer(
+                list(text),
+                return_tensors='pt',
+                padding=True,
+                max_length=256
             )
-            dataset_to_predict['fabcon_sequence'] = 'Ḣ' + dataset_to_predict['sequence_vh']
-            original_columns = dataset_to_predict.copy()
-            
-            # DEDUPLICATE UNIQUE SEQUENCES
-            dataset_to_predict_deduplicated = dataset_to_predict.drop_duplicates(subset=['fabcon_sequence'])
-        else: 
-            raise NameError('tsv file must have sequence_alignment and germline_alignment_d_mask columns, or sequence_vh column with fully backfilled') 
-
-    tokenizer = PreTrainedTokenizerFast.from_pretrained(tokenizer_path)
-
-    def collate_fn(text, tokenizer=tokenizer):
-        # pads to max length in batch
-        tokenized_input = tokenizer(
-            text,
-            return_tensors='pt',
-            padding=True,
-            max_length=256
-        )
-        tokenized_input['text'] = text
+        tokenized_input['indices'] = torch.tensor(indices)
         return tokenized_input
-    
-    model = FalconForSequenceClassification.from_pretrained(model_path).to(local_rank)
-    model = DDP(model, device_ids=[local_rank])
-
-    sequences = dataset_to_predict_deduplicated['fabcon_sequence'].unique().tolist()
+    return collate_fn
 
-    dataset = AntibodyRepertoireDataset(sequences)
-    sampler = DistributedSampler(dataset, num_replicas=world_size, rank=local_rank)
 
-    dataloader = DataLoader(dataset, batch_size=16, sampler=sampler,
-                            collate_fn=collate_fn)
-    sequences = []
-    human_probabilities = []
+def score_batches(model, dataloader, device, n_sequences, verbose=True):
+    """
+    Run the model over every batch and scatter the human probabilities back into
+    an array aligned with the dataset order. Positions this process did not score
+    (other ranks' shards) are left as NaN.
+    """
+    human_probabilities = np.full(n_sequences, np.nan, dtype=np.float32)
     with torch.no_grad():
-        for batch in tqdm(dataloader):
+        for batch in tqdm(dataloader, disable=not verbose):
             inputs = {
-                'input_ids': batch['input_ids'].to(local_rank),
-                'attention_mask': batch['attention_mask'].to(local_rank)
+                'input_ids': batch['input_ids'].to(device),
+                'attention_mask': batch['attention_mask'].to(device)
             }
 
             o = model(**inputs).logits
-            probs = torch.softmax(o.cpu(), dim=1).detach().numpy()  
-            
-            probs = probs[:, -1] 
-            # sequences are stored in batch['text']
-            # probabilities are stored in probs
-            human_probabilities.extend(probs)
-            sequences.extend(batch['text'])
-    
-    output_df = pd.DataFrame({
-        'sequence_vh': sequences,
-        'human_probability': human_probabilities
-    })
-
-    merged_df = original_columns.merge(
-        output_df,
-        left_on='fabcon_sequence',
-        right_on='sequence_vh',
-        how='left'
+            probs = torch.softmax(o.cpu(), dim=1).detach().numpy()
+
+            probs = probs[:, -1]
+            human_probabilities[batch['indices'].numpy()] = probs
+    return human_probabilities
+
+
+def score_sequences(model, tokenizer, sequences, device, max_tokens, prediction_cache=None, num_replicas=1, rank=0, verbose=True):
+    """
+    Human probability of each sequence, aligned with sequences. Sequences already in
+    prediction_cache are not re-scored; the rest are batched by length, run through the
+    model and written back to the cache. With num_replicas > 1 each rank scores its share
+    of the misses and the results are gathered on rank 0, which alone holds the cache and
+    returns the full array. The other ranks' positions are left as NaN on ranks > 0.
+    verbose=False silences the padding report and progress bar for small, frequent calls.
+    """
+    if rank == 0 and prediction_cache is not None:
+        human_probabilities = prediction_cache.lookup(sequences)
+    else:
+        human_probabilities = np.full(len(sequences), np.nan, dtype=np.float32)
+    if num_replicas > 1:
+        # every rank has to agree on the misses for the batches to partition them
+        cached = [human_probabilities if rank == 0 else None]
+        dist.broadcast_object_list(cached, src=0)
+        human_probabilities = cached[0]
+
+    misses = np.flatnonzero(np.isnan(human_probabilities))
+    if len(misses) == 0:
+        return human_probabilities
+    miss_sequences = [sequences[index] for index in misses]
+
+    dataset = AntibodyRepertoireDataset(miss_sequences)
+    batch_sampler = TokenBudgetBatchSampler(
+        sequence_lengths(miss_sequences, tokenizer),
+        max_tokens,
+        num_replicas=num_replicas,
+        rank=rank
     )
+    if verbose:
+        print(f'Padding efficiency: {batch_sampler.padding_efficiency:.3f}')
+
+    dataloader = DataLoader(dataset, batch_sampler=batch_sampler,
+                            collate_fn=make_collate_fn(tokenizer))
+    scored = score_batches(model, dataloader, device, len(miss_sequences), verbose)
+    if num_replicas > 1:
+        scored = gather_probabilities(scored, device)
+    human_probabilities[misses] = scored
+
+    if rank == 0 and prediction_cache is not None:
+        prediction_cache.store(miss_sequences, scored)
+    return human_probabilities
+
+
+def gather_probabilities(human_probabilities, device):
+    """
+    Combine every rank's partially filled probabilities on rank 0. Each position is
+    scored by at least one rank (several, for the batches repeated to even out the
+    shards) and is NaN elsewhere, so an element-wise max with NaN as -1 recovers the
+    full array. Ranks other than 0 get their own array back.
+    """
+    gathered = torch.from_numpy(np.nan_to_num(human_probabilities, nan=-1.0)).to(device)
+    dist.reduce(gathered, dst=0, op=dist.ReduceOp.MAX)
+    if dist.get_rank() != 0:
+        return human_probabilities
+    gathered = gathered.cpu().numpy()
+    gathered[gathered < 0] = np.nan
+    return gathered
+
+
+def setup(rank, world_size, backend="nccl"):
+    dist.init_process_group(backend, rank=rank, world_size=world_size)
+    if backend == "nccl":
+        torch.cuda.set_device(rank)
+
+def cleanup():
+    dist.destroy_process_group()
+
+
+def read_input(input_path):
+    """Read a local or remote, optionally compressed, input file (see ingest.input_format)"""
+    file_format, _ = input_format(input_path)
+    if file_format in ('fasta', 'fastq'):
+        return read_table(input_path, SEQUENCE_VH_SCHEMA.names)[0].to_pandas()
+    with open_input(input_path) as f:
+        if file_format == 'parquet':
+            return pd.read_parquet(f)
+        return pd.read_csv(f, sep=delimiter(file_format))
+
+
+def read_input_chunks(input_path, chunk_size, translation_processes=1):
+    """
+    Yield the input file as DataFrames of at most chunk_size rows. Parquet files are
+    read batch by batch within their row groups, text files with pandas' chunked reader
+    and FASTA/FASTQ block by block, decompressing as they go, so only one chunk is held
+    in memory at a time. Nucleotide FASTA/FASTQ is translated as it is read.
+    """
+    file_format, _ = input_format(input_path)
+    if file_format in ('fasta', 'fastq'):
+        for table in read_sequence_file_chunks(input_path, chunk_size, translation_processes):
+            yield table.to_pandas()
+        return
+    with open_input(input_path) as f:
+        if file_format == 'parquet':
+            parquet_file = pq.ParquetFile(f)
+            for record_batch in parquet_file.iter_batches(batch_size=chunk_size):
+                yield record_batch.to_pandas()
+        else:
+            yield from pd.read_csv(f, sep=delimiter(file_format), chunksize=chunk_size)
+
+
+def read_sequences(input_path, translation_processes=1, rank=0, world_size=1):
+    """
+    Read the columns inference needs, add fabcon_sequence and list its distinct sequences.
+    The remaining input columns are returned as an Arrow table to be joined back on at
+    write time. In a distributed run only rank 0 reads the file; the other ranks are sent
+    the sequences and get None in place of the input columns and codes.
+
+    Returns:
+        tuple: (original_columns, codes, sequences, passthrough) where codes and sequences
+        are as for deduplicate_sequences and passthrough is (Arrow table, file column order)
+    """
+    original_columns = None
+    codes = None
+    sequences = None
+    passthrough = None
+    if rank == 0:
+        dataset_to_predict, passthrough_table, column_order = read_for_inference(input_path, translation_processes)
+        passthrough = passthrough_table, column_order
+        original_columns = add_fabcon_sequence(dataset_to_predict, translation_processes)
+        codes, sequences = deduplicate_sequences(original_columns)
+    if world_size > 1:
+        shared = [sequences]
+        dist.broadcast_object_list(shared, src=0)
+        sequences = shared[0]
+    return original_columns, codes, sequences, passthrough
+
+
+def add_fabcon_sequence(dataset_to_predict, translation_processes=1, translation_cache=None):
+    """
+    Add the fabcon_sequence column (heavy chain token + amino acid sequence), translating
+    sequence_vh from the AIRR alignment columns first if it is not already present. Each
+    distinct alignment pair is translated once, consulting translation_cache if given.
+    """
+    available_columns = dataset_to_predict.columns
+
+    if 'sequence_vh' in available_columns:
+        dataset_to_predict['fabcon_sequence'] = 'Ḣ' + dataset_to_predict['sequence_vh']
+
+    elif 'sequence_alignment' in available_columns and 'germline_alignment_d_mask' in available_columns:
+        dataset_to_predict['sequence_vh'] = translate_unique_pairs(
+            dataset_to_predict['sequence_alignment'],
+            dataset_to_predict['germline_alignment_d_mask'],
+            n_processes=translation_processes,
+            cache=translation_cache
+        )
+        dataset_to_predict['fabcon_sequence'] = 'Ḣ' + dataset_to_predict['sequence_vh']
+    else: 
+        raise NameError('tsv file must have sequence_alignment and germline_alignment_d_mask columns, or sequence_vh column with fully backfilled') 
+
+    return dataset_to_predict
+
+
+def deduplicate_sequences(original_columns):
+    """
+    Distinct fabcon_sequence values, in order of first appearance, and each row's integer
+    code into them, so predictions can be broadcast back to the rows without another
+    join on the sequence strings. Missing sequences get code -1.
+
+    Returns:
+        tuple: (codes, sequences) where codes is an np.ndarray and sequences a list
+    """
+    codes, sequences = pd.factorize(original_columns['fabcon_sequence'])
+    return codes, sequences.tolist()
+
+
+def annotate_predictions(original_columns, codes, human_probabilities):
+    """
+    Add human_probability and prediction columns to original_columns, taking each row's
+    probability from human_probabilities by its code (see deduplicate_sequences). Rows
+    with code -1 get NaN.
+    """
+    merged_df = original_columns.copy(deep=False)
+    # only the rows' own probabilities are gathered, so human_probabilities may be an
+    # on-disk memmap
+    human_probability = np.full(len(codes), np.nan, dtype=np.float32)
+    present = codes >= 0
+    human_probability[present] = human_probabilities[codes[present]]
+    merged_df['human_probability'] = human_probability
 
     # Define conditions
     conditions = [
-        merged_df['human_probability'] > 0.99
+        merged_df['human_probability'] > HUMAN_THRESHOLD
     ]
 
     # Define choices for each condition
@@ -167,29 +343,296 @@ def predict_gpu(
     merged_df['prediction'] = np.select(
         conditions, choices, default=""
     )
+    return merged_df
+
+
+# compression of text output, detected from the file extension
+TEXT_COMPRESSION = {'.gz': 'gzip', '.zst': 'zstd'}
+PREDICTION_COLUMNS = ['row_id', 'human_probability', 'prediction']
+
+
+def parquet_schema(table):
+    """
+    Parquet schema of an output whose first chunk is table. A column with no values in
+    the first chunk has no type to go on: pandas reads an empty text column as float and
+    an empty object column has Arrow type null. Such columns are written as large_string,
+    which whatever later chunks hold in them can be cast to (see conform_table).
+    """
+    fields = []
+    for field in table.schema:
+        column = table[field.name]
+        if pa.types.is_null(field.type) or (pa.types.is_floating(field.type) and len(column) and column.null_count == len(column)):
+            field = field.with_type(pa.large_string())
+        fields.append(field)
+    return pa.schema(fields, metadata=table.schema.metadata)
+
+
+def conform_table(table, schema):
+    """Cast each column of a chunk to the output schema, e.g. a column that is empty in this chunk, or was in the first"""
+    return pa.table(
+        [table[field.name] if table[field.name].type == field.type else table[field.name].cast(field.type) for field in schema],
+        schema=schema
+    )
+
+
+class OutputWriter:
+    """
+    Writes annotated chunks, DataFrames or Arrow tables, to the output file as they
+    arrive. The header (or parquet schema, see parquet_schema) is taken from the first
+    chunk written.
+
+    .parquet output is zstd compressed and buffered into row groups of row_group_size
+    rows. .csv and .tsv output, optionally compressed as .gz or .zst, is written through
+    one stream kept open until close.
+
+    Args:
+        output_file (str): .csv, .tsv, .csv.gz, .tsv.gz, .csv.zst, .tsv.zst or .parquet file
+        row_group_size (int): Rows per parquet row group
+        predictions_only (bool): Write only row_id (the row's position in the input),
+            human_probability and prediction instead of every input column
+        metrics_file (str): If given, the analyse_metrics metrics of every chunk written
+            are accumulated as it is written and saved to this JSON file on close
+    """
+    def __init__(self, output_file, row_group_size=1000000, predictions_only=False, metrics_file=None):
+        text_file, extension = os.path.splitext(output_file)
+        self.compression = TEXT_COMPRESSION.get(extension)
+        if self.compression is None:
+            text_file = output_file
+        if not (text_file.endswith(('.csv', '.tsv')) or (self.compression is None and text_file.endswith('.parquet'))):
+            sys.exit('File extension not recognised. Please choose one of .csv, .tsv (optionally .gz or .zst), or .parquet')
+        self.output_file = output_file
+        self.sep = '\t' if text_file.endswith('.tsv') else ','
+        self.row_group_size = row_group_size
+        self.predictions_only = predictions_only
+        self.metrics_file = metrics_file
+        self.metrics = MetricsAccumulator() if metrics_file is not None else None
+        self.parquet_writer = None
+        self.text_stream = None
+        self.pending = []
+        self.pending_rows = 0
+        self.rows_written = 0
+
+    def write(self, merged_df):
+        if self.metrics is not None:
+            self.metrics.update(merged_df)
+        if self.predictions_only:
+            merged_df = pa.table({
+                'row_id': np.arange(self.rows_written, self.rows_written + len(merged_df)),
+                'human_probability': merged_df['human_probability'],
+                'prediction': merged_df['prediction']
+            })
+
+        if self.output_file.endswith('.parquet'):
+            self.write_parquet(merged_df)
+        else:
+            if isinstance(merged_df, pa.Table):
+                merged_df = merged_df.to_pandas()
+            if self.text_stream is None:
+                self.text_stream = pa.output_stream(self.output_file, compression=self.compression)
+            merged_df.to_csv(self.text_stream, index=None, sep=self.sep, header=self.rows_written == 0)
+        self.rows_written += len(merged_df)
+
+    def write_parquet(self, merged_df):
+        table = merged_df if isinstance(merged_df, pa.Table) else pa.Table.from_pandas(merged_df, preserve_index=False)
+        if self.parquet_writer is None:
+            self.parquet_writer = pq.ParquetWriter(self.output_file, parquet_schema(table), compression='zstd')
+        table = conform_table(table, self.parquet_writer.schema)
+
+        # chunks are smaller than a row group in --stream mode, so they are held back
+        # until there are enough rows to fill one
+        self.pending.append(table)
+        self.pending_rows += table.num_rows
+        if self.pending_rows >= self.row_group_size:
+            pending = pa.concat_tables(self.pending)
+            full_rows = pending.num_rows - pending.num_rows % self.row_group_size
+            self.parquet_writer.write_table(pending.slice(0, full_rows), row_group_size=self.row_group_size)
+            self.pending = [pending.slice(full_rows)]
+            self.pending_rows = pending.num_rows - full_rows
+
+    def close(self):
+        if self.parquet_writer is not None:
+            if self.pending_rows:
+                self.parquet_writer.write_table(pa.concat_tables(self.pending))
+            self.parquet_writer.close()
+        if self.text_stream is not None:
+            self.text_stream.close()
+        if self.metrics is not None:
+            self.metrics.save(self.metrics_file)
+
+
+def write_output(merged_df, output_file, row_group_size=1000000, predictions_only=False, metrics_file=None):
+    writer = OutputWriter(output_file, row_group_size, predictions_only, metrics_file)
+    writer.write(merged_df)
+    writer.close()
+
+
+def compute_metrics(labels, probs, threshold=HUMAN_THRESHOLD):
+    """
+    ROC AUC, average precision and, predicting human above threshold as the prediction
+    column does, F1, precision, recall and MCC (see evaluation.evaluate)
+    """
+    return metrics_from_report(evaluate(labels, probs, threshold)[0])
+
+
+def metrics_from_report(report):
+    return {
+        'roc_auc': report['roc_auc'],
+        'average_precision_score': report['average_precision'],
+        **{name: report['at_threshold'][name] for name in ('f1', 'precision', 'recall', 'mcc')}
+    }
+
+
+def print_metrics(labels, probs):
+    report, _ = evaluate(labels, probs, HUMAN_THRESHOLD)
+    metrics = metrics_from_report(report)
+    print('roc_auc:', metrics['roc_auc'], 'average_precision_score', metrics['average_precision_score'], 'f1:', metrics['f1'], 'precision:', metrics['precision'], 'recall:', metrics['recall'], 'mcc', metrics['mcc'], 'at threshold', HUMAN_THRESHOLD)
+    if 'best_f1' in report:
+        print('best f1:', report['best_f1']['f1'], 'above', report['best_f1']['threshold'], 'best mcc:', report['best_mcc']['mcc'], 'above', report['best_mcc']['threshold'])
+
+
+def write_annotated(original_columns, codes, human_probabilities, output_file, passthrough=None, row_group_size=1000000, predictions_only=False, metrics_file=None):
+    """
+    Annotate the input with its predictions, join the passthrough columns (see
+    read_sequences) back on, write it and print metrics if it is labelled.
+    row_group_size, predictions_only and metrics_file are as for OutputWriter.
+    """
+    merged_df = annotate_predictions(original_columns, codes, human_probabilities)
+    # the passthrough gene calls are joined for predictions_only output too if the
+    # metrics need them, though they are not written
+    if passthrough is None or (predictions_only and metrics_file is None):
+        write_output(merged_df, output_file, row_group_size, predictions_only, metrics_file)
+    else:
+        write_output(join_passthrough(merged_df, *passthrough), output_file, row_group_size, predictions_only, metrics_file)
+
+    if 'label' in merged_df.columns:
+        print_metrics(merged_df['label'].values, merged_df['human_probability'].values)
+
+
+def load_model(model_path, device, backend='torch', onnx_path=None, intra_op_threads=0, quantize=None):
+    """
+    Load the classifier for the chosen backend. 'onnx' runs an exported copy of the model
+    under onnxruntime on CPU, exported next to model_path on first use and again whenever
+    the model changes. quantize='int8' runs the torch model with dynamically quantized
+    linear layers, cached next to model_path and quantized again when the model changes.
+
+    Returns:
+        tuple: (model, weights_path) where weights_path is what the prediction cache fingerprints
+    """
+    if quantize not in (None, 'none', 'int8'):
+        sys.exit('Quantization not recognised. Please choose one of none or int8')
+    if quantize == 'int8' and backend != 'torch':
+        sys.exit('--quantize int8 is only supported with the torch backend')
+
+    if backend == 'onnx':
+        # onnxruntime is only needed, and only imported, for this backend
+        from onnx_backend import default_onnx_path, load_onnx_classifier
+        onnx_path = onnx_path or default_onnx_path(model_path)
+        return load_onnx_classifier(model_path, onnx_path, intra_op_threads).to(device), onnx_path
+    elif backend == 'torch':
+        if intra_op_threads:
+            torch.set_num_threads(intra_op_threads)
+        if quantize == 'int8':
+            from quantization import load_quantized_model
+            return load_quantized_model(model_path)
+        return FalconForSequenceClassification.from_pretrained(model_path).to(device), model_path
+    else:
+        sys.exit('Backend not recognised. Please choose one of torch or onnx')
+
+
+def open_prediction_cache(cache_path, weights_path, tokenizer_path, max_entries):
+    if cache_path is None:
+        return None
+    return PredictionCache(cache_path, model_fingerprint(weights_path, tokenizer_path), max_entries)
+
+
+def close_prediction_cache(prediction_cache):
+    if prediction_cache is not None:
+        prediction_cache.report()
+        prediction_cache.close()
+
+
+class AutoantibodyClassifier:
+    """
+    Tokenizer and model held in memory for repeated predictions, e.g. loaded once at
+    Lambda init and reused by every warm invocation. Runs on CPU.
+
+    Args:
+        tokenizer_path (str): Path to the tokenizer for the model
+        model_path (str): Path to the model
+        max_tokens (int): Maximum number of padded tokens per batch
+        backend, onnx_path, intra_op_threads, quantize: As for load_model
+    """
+    def __init__(self, tokenizer_path, model_path, max_tokens=4096, backend='torch', onnx_path=None, intra_op_threads=0, quantize=None):
+        self.tokenizer = PreTrainedTokenizerFast.from_pretrained(tokenizer_path)
+        self.device = torch.device('cpu')
+        self.model, _ = load_model(model_path, self.device, backend, onnx_path, intra_op_threads, quantize)
+        self.model.eval()
+        self.max_tokens = max_tokens
+
+    def predict_sequences(self, sequences):
+        """
+        Args:
+            sequences (list[str]): Fully backfilled VH amino acid sequences (sequence_vh)
+
+        Returns:
+            np.ndarray: human_probability of each sequence, in the order given. Repeated
+            sequences are scored once
+        """
+        codes, unique_sequences = pd.factorize(np.array(['Ḣ' + sequence for sequence in sequences], dtype=object))
+        human_probabilities = score_sequences(
+            self.model, self.tokenizer, unique_sequences.tolist(), self.device, self.max_tokens, verbose=False
+        )
+        return human_probabilities[codes]
+
+    def predict_file(self, input_path, output_file, translation_processes=1, metrics_file=None):
+        """The predict_cpu pipeline for one file, run on the resident model"""
+        original_columns, codes, sequences, passthrough = read_sequences(input_path, translation_processes)
+        human_probabilities = score_sequences(self.model, self.tokenizer, sequences, self.device, self.max_tokens)
+        write_annotated(original_columns, codes, human_probabilities, output_file, passthrough, metrics_file=metrics_file)
 
-    # Save output file
-    if output_file.endswith('.csv'):
-        merged_df.to_csv(output_file, index=None)
-    elif output_file.endswith('.tsv'):
-        merged_df.to_csv(output_file, index=None, sep="\t")
-    elif output_file.endswith('.parquet'):
-        merged_df.to_parquet(output_file, index=None)
-    else:  
-        sys.exit('File extension not recognised. Please choose one of .csv, .tsv, or .parquet')
-        
-    if 'label' in available_columns:
-        labels = merged_df['label'].values
-        probs = merged_df['human_probability'].values
-        probs_binary = [1 if x > 0.5 else 0 for x in probs]
-        auc = roc_auc_score(labels, probs)
-        aupr = average_precision_score(labels, probs)
-        f1 = f1_score(labels, probs_binary)
-        precision = precision_score(labels, probs_binary)
-        recall = recall_score(labels, probs_binary)
-        mcc = matthews_corrcoef(labels, probs_binary)
-        
-        print('roc_auc:', auc, 'average_precision_score', aupr, 'f1:', f1, 'precision:', precision, 'recall:', recall, 'mcc', mcc)
+
+def predict_gpu(
+    input_path: str,
+    output_file: str,
+    tokenizer_path: str,
+    model_path: str,
+    local_rank: int = 0,
+    world_size: int = 1,
+    max_tokens: int = 4096,
+    translation_processes: int = 1,
+    cache_path: str = None,
+    cache_max_entries: int = 10000000,
+    row_group_size: int = 1000000,
+    predictions_only: bool = False,
+    metrics_file: str = None
+): 
+    setup(local_rank,
+          world_size)
+
+    # LOAD DATASET AND DEDUPLICATE UNIQUE SEQUENCES
+    original_columns, codes, sequences, passthrough = read_sequences(input_path, translation_processes, local_rank, world_size)
+
+    tokenizer = PreTrainedTokenizerFast.from_pretrained(tokenizer_path)
+    prediction_cache = open_prediction_cache(cache_path if local_rank == 0 else None, model_path, tokenizer_path, cache_max_entries)
+    
+    # inference needs no gradient synchronisation, so each rank runs a plain model
+    model = FalconForSequenceClassification.from_pretrained(model_path).to(local_rank)
+
+    human_probabilities = score_sequences(
+        model,
+        tokenizer,
+        sequences,
+        local_rank,
+        max_tokens,
+        prediction_cache,
+        num_replicas=world_size,
+        rank=local_rank
+    )
+    
+    # Save output file once, from rank 0
+    if local_rank == 0:
+        write_annotated(original_columns, codes, human_probabilities, output_file, passthrough, row_group_size, predictions_only, metrics_file)
+    close_prediction_cache(prediction_cache)
 
     cleanup()
 
@@ -197,135 +640,120 @@ def predict_cpu(
     input_path: str,
     output_file: str,
     tokenizer_path: str,
-    model_path: str
+    model_path: str,
+    max_tokens: int = 4096,
+    translation_processes: int = 1,
+    cache_path: str = None,
+    cache_max_entries: int = 10000000,
+    backend: str = 'torch',
+    onnx_path: str = None,
+    intra_op_threads: int = 0,
+    quantize: str = None,
+    local_rank: int = 0,
+    world_size: int = 1,
+    row_group_size: int = 1000000,
+    predictions_only: bool = False,
+    metrics_file: str = None
 ): 
-    if input_path.endswith('.csv'):
-        dataset_to_predict = pd.read_csv(input_path)
-
-        available_columns = dataset_to_predict.columns
-        dataset_to_predict['fabcon_sequence'] = 'Ḣ'+dataset_to_predict['sequence_vh']
-        original_columns = dataset_to_predict.copy()
-        
-        # DEDUPLICATE UNIQUE SEQUENCES
-        dataset_to_predict_deduplicated = dataset_to_predict.drop_duplicates(subset=['fabcon_sequence'])
-        
-        if 'label' in available_columns:
-            dataset_to_predict_deduplicated = dataset_to_predict_deduplicated[['fabcon_sequence','label']].copy()
-            dataset_to_predict_deduplicated['label'] = dataset_to_predict_deduplicated['label'].astype(int)
-        else:
-            dataset_to_predict_deduplicated = dataset_to_predict_deduplicated[['fabcon_sequence']].copy()
-    
-    elif input_path.endswith('.tsv') or input_path.endswith('.parquet'):
-        if input_path.endswith('.tsv'):
-            dataset_to_predict = pd.read_csv(input_path, sep='\t')
-        else:
-            dataset_to_predict = pd.read_parquet(input_path)
-        available_columns = dataset_to_predict.columns
-
-        if 'sequence_vh' in available_columns:
-            dataset_to_predict['fabcon_sequence'] = 'Ḣ'+dataset_to_predict['sequence_vh']
-            original_columns = dataset_to_predict.copy()
-            
-            # DEDUPLICATE UNIQUE SEQUENCES
-            dataset_to_predict_deduplicated = dataset_to_predict.drop_duplicates(subset=['fabcon_sequence'])
-
-        elif 'sequence_alignment' in available_columns and 'germline_alignment_d_mask' in available_columns:
-            dataset_to_predict['sequence_vh'] = dataset_to_predict.apply(
-            lambda row: get_full_aa_sub(str(row['sequence_alignment']), str(row['germline_alignment_d_mask'])), 
-            axis=1
-            )
-            dataset_to_predict['fabcon_sequence'] = 'Ḣ'+dataset_to_predict['sequence_vh']
-            original_columns = dataset_to_predict.copy()
-            
-            # DEDUPLICATE UNIQUE SEQUENCES
-            dataset_to_predict_deduplicated = dataset_to_predict.drop_duplicates(subset=['fabcon_sequence'])
-        else: 
-            raise NameError('tsv file must have sequence_alignment and germline_alignment_d_mask columns, or sequence_vh column with fully backfilled') 
+    """
+    Predict on CPU. Launched with torchrun --nproc_per_node > 1 the sequences are sharded
+    across worker processes over gloo: each worker runs its own copy of the model on
+    intra_op_threads threads (by default an equal share of the available cores) and rank
+    0 gathers the probabilities and writes the output.
+    """
+    if world_size > 1:
+        setup(local_rank, world_size, "gloo")
+        intra_op_threads = intra_op_threads or max(1, len(os.sched_getaffinity(0)) // world_size)
+
+    original_columns, codes, sequences, passthrough = read_sequences(input_path, translation_processes, local_rank, world_size)
     
     tokenizer = PreTrainedTokenizerFast.from_pretrained(tokenizer_path)
-
-    def collate_fn(text, tokenizer=tokenizer):
-        tokenized_input = tokenizer(
-            text,
-            return_tensors='pt',
-            padding=True,
-            max_length=256
-        )
-        tokenized_input['text'] = text
-        return tokenized_input
     
     device = torch.device('cpu')
-    model = FalconForSequenceClassification.from_pretrained(model_path).to(device)
+    # rank 0 exports or quantizes the model first if it has changed, so no rank loads an
+    # artifact another is still writing; the others then load the up to date artifact
+    if world_size > 1 and local_rank != 0:
+        dist.barrier()
+    model, weights_path = load_model(model_path, device, backend, onnx_path, intra_op_threads, quantize)
+    if world_size > 1 and local_rank == 0:
+        dist.barrier()
+    prediction_cache = open_prediction_cache(cache_path if local_rank == 0 else None, weights_path, tokenizer_path, cache_max_entries)
+
+    human_probabilities = score_sequences(
+        model,
+        tokenizer,
+        sequences,
+        device,
+        max_tokens,
+        prediction_cache,
+        num_replicas=world_size,
+        rank=local_rank
+    )
+    
+    if local_rank == 0:
+        write_annotated(original_columns, codes, human_probabilities, output_file, passthrough, row_group_size, predictions_only, metrics_file)
+    close_prediction_cache(prediction_cache)
 
-    sequences = dataset_to_predict_deduplicated['fabcon_sequence'].unique().tolist()
+    if world_size > 1:
+        cleanup()
 
-    dataset = AntibodyRepertoireDataset(sequences)
+def predict_stream(
+    input_path: str,
+    output_file: str,
+    tokenizer_path: str,
+    model_path: str,
+    device,
+    chunk_size: int = 100000,
+    max_tokens: int = 4096,
+    translation_processes: int = 1,
+    cache_path: str = None,
+    cache_max_entries: int = 10000000,
+    backend: str = 'torch',
+    onnx_path: str = None,
+    intra_op_threads: int = 0,
+    quantize: str = None,
+    row_group_size: int = 1000000,
+    predictions_only: bool = False,
+    metrics_file: str = None
+):
+    """
+    Out-of-core variant of predict_cpu for inputs larger than memory. The input is read
+    chunk_size rows at a time and each chunk is translated, deduplicated, scored and
+    appended to the output before the next one is read, so peak memory is bounded by the
+    chunk size rather than the file size. Sequences repeated across chunks are scored
+    once per chunk they appear in, unless a prediction cache is used.
+    """
+    tokenizer = PreTrainedTokenizerFast.from_pretrained(tokenizer_path)
 
-    dataloader = DataLoader(dataset, batch_size=16, 
-                            collate_fn=collate_fn, shuffle=False)
-    
-    sequences = []
-    human_probabilities = []
-    with torch.no_grad():
-        for batch in tqdm(dataloader):
-            inputs = {
-                'input_ids': batch['input_ids'].to(device),
-                'attention_mask': batch['attention_mask'].to(device)
-            }
+    model, weights_path = load_model(model_path, device, backend, onnx_path, intra_op_threads, quantize)
+    prediction_cache = open_prediction_cache(cache_path, weights_path, tokenizer_path, cache_max_entries)
 
-            o = model(**inputs).logits
-            probs = torch.softmax(o.cpu(), dim=1).detach().numpy()  
-            
-            probs = probs[:, -1] 
-            human_probabilities.extend(probs)
-            sequences.extend(batch['text'])
-    
-    output_df = pd.DataFrame({
-        'sequence_vh': sequences,
-        'human_probability': human_probabilities
-    })
-
-    merged_df = original_columns.merge(
-        output_df,
-        left_on='fabcon_sequence',
-        right_on='sequence_vh',
-        how='left'
-    )
+    writer = OutputWriter(output_file, row_group_size, predictions_only, metrics_file)
+    # clonotypes recur across chunks, so translations are kept between them
+    translation_cache = TranslationCache()
+    labels = []
+    probs = []
+    for chunk in read_input_chunks(input_path, chunk_size, translation_processes):
+        original_columns = add_fabcon_sequence(chunk, translation_processes, translation_cache)
+        codes, sequences = deduplicate_sequences(original_columns)
 
-    # Define conditions
-    conditions = [
-        merged_df['human_probability'] > 0.99
-    ]
+        human_probabilities = score_sequences(model, tokenizer, sequences, device, max_tokens, prediction_cache)
 
-    # Define choices for each condition
-    choices = ['human']
+        merged_df = annotate_predictions(original_columns, codes, human_probabilities)
+        writer.write(merged_df)
+        print(f'Rows written: {writer.rows_written}')
 
-    # Apply conditions to create 'prediction' column
-    merged_df['prediction'] = np.select(
-        conditions, choices, default=""
-    )
+        if 'label' in merged_df.columns:
+            labels.append(merged_df['label'].values)
+            probs.append(merged_df['human_probability'].values)
+    writer.close()
+    close_prediction_cache(prediction_cache)
+    if translation_cache.hits + translation_cache.misses:
+        print(f'Translation cache hit rate: {translation_cache.hit_rate:.3f}')
+
+    if labels:
+        print_metrics(np.concatenate(labels), np.concatenate(probs))
 
-    if output_file.endswith('.csv'):
-        merged_df.to_csv(output_file, index=None)
-    elif output_file.endswith('.tsv'):
-        merged_df.to_csv(output_file, index=None, sep="\t")
-    elif output_file.endswith('.parquet'):
-        merged_df.to_parquet(output_file, index=None)
-    else:  
-        sys.exit('File extension not recognised. Please choose one of .csv, .tsv, or .parquet')
-        
-    if 'label' in available_columns:
-        labels = merged_df['label'].values
-        probs = merged_df['human_probability'].values
-        probs_binary = [1 if x>0.5 else 0 for x in probs]
-        auc = roc_auc_score(labels, probs)
-        aupr = average_precision_score(labels, probs)
-        f1 = f1_score(labels,probs_binary)
-        precision = precision_score(labels,probs_binary)
-        recall = recall_score(labels,probs_binary)
-        mcc = matthews_corrcoef(labels, probs_binary)
-        
-        print('roc_auc:',auc,'average_precision_score',aupr,'f1:',f1,'precision:',precision,'recall:',recall,'mcc',mcc)
 def main(
     input_path: str,
     output_file: str,
@@ -334,23 +762,140 @@ def main(
     tokenizer_path: str,
     model_path: str,
     local_rank: int = 0,
-    world_size: int = 1
+    world_size: int = 1,
+    max_tokens: int = 4096,
+    stream: bool = False,
+    chunk_size: int = 100000,
+    translation_processes: int = 1,
+    cache_path: str = None,
+    cache_max_entries: int = 10000000,
+    backend: str = 'torch',
+    onnx_path: str = None,
+    intra_op_threads: int = 0,
+    quantize: str = None,
+    pipeline: bool = False,
+    queue_size: int = 4,
+    row_group_size: int = 1000000,
+    predictions_only: bool = False,
+    spill_dir: str = None,
+    n_buckets: int = 256,
+    metrics_file: str = None
 ):
-    if run_mode == "gpu":
+    if backend != 'torch' and run_mode == "gpu":
+        sys.exit(f'The {backend} backend runs on CPU only. Use --run_mode cpu')
+    if quantize == 'int8' and run_mode == "gpu":
+        sys.exit('Dynamic int8 quantization runs on CPU only. Use --run_mode cpu')
+    if pipeline:
+        if world_size > 1:
+            sys.exit('--pipeline runs as a single process. Launch with --nproc_per_node=1')
+        if cache_path is not None:
+            sys.exit('--cache_path is not supported with --pipeline')
+        # only imported for this mode, as it imports from this module
+        from pipeline import predict_pipelined
+        device = torch.device('cuda', local_rank) if run_mode == "gpu" else torch.device('cpu')
+        predict_pipelined(
+            input_path,
+            output_file,
+            tokenizer_path,
+            model_path,
+            device,
+            chunk_size,
+            max_tokens,
+            translation_processes,
+            backend,
+            onnx_path,
+            intra_op_threads,
+            quantize,
+            queue_size,
+            row_group_size,
+            predictions_only,
+            metrics_file
+        )
+    elif spill_dir is not None:
+        if world_size > 1:
+            sys.exit('--spill_dir runs as a single process. Launch with --nproc_per_node=1')
+        # only imported for this mode, as it imports from this module
+        from dedup import predict_partitioned
+        device = torch.device('cuda', local_rank) if run_mode == "gpu" else torch.device('cpu')
+        predict_partitioned(
+            input_path,
+            output_file,
+            tokenizer_path,
+            model_path,
+            device,
+            spill_dir,
+            n_buckets,
+            chunk_size,
+            max_tokens,
+            translation_processes,
+            cache_path,
+            cache_max_entries,
+            backend,
+            onnx_path,
+            intra_op_threads,
+            quantize,
+            row_group_size,
+            predictions_only,
+            metrics_file
+        )
+    elif stream:
+        if world_size > 1:
+            sys.exit('--stream runs as a single process. Launch with --nproc_per_node=1')
+        device = torch.device('cuda', local_rank) if run_mode == "gpu" else torch.device('cpu')
+        predict_stream(
+            input_path,
+            output_file,
+            tokenizer_path,
+            model_path,
+            device,
+            chunk_size,
+            max_tokens,
+            translation_processes,
+            cache_path,
+            cache_max_entries,
+            backend,
+            onnx_path,
+            intra_op_threads,
+            quantize,
+            row_group_size,
+            predictions_only,
+            metrics_file
+        )
+    elif run_mode == "gpu":
         predict_gpu(
             input_path,
             output_file,
             tokenizer_path,
             model_path,
             local_rank,
-            world_size
+            world_size,
+            max_tokens,
+            translation_processes,
+            cache_path,
+            cache_max_entries,
+            row_group_size,
+            predictions_only,
+            metrics_file
         )
     else:
         predict_cpu(
             input_path,
             output_file,
             tokenizer_path,
-            model_path
+            model_path,
+            max_tokens,
+            translation_processes,
+            cache_path,
+            cache_max_entries,
+            backend,
+            onnx_path,
+            intra_op_threads,
+            quantize,
+            local_rank,
+            world_size,
+            row_group_size,
+            predictions_only,
+            metrics_file
         )
 
 
@@ -364,11 +909,28 @@ if __name__ == "__main__":
                                      --file_source [BOOLEAN] \
                                      --run_mode [CPU OR GPU]
                                      """)
-    parser.add_argument('--input_path', type=str, required=True, help='.csv format file with columns: sequence_vh, label (1 for viral 0 otherwise, optional)')
-    parser.add_argument('--output_file', type=str, required=True, help='output file name with extensions. Can be full path or just file name')
+    parser.add_argument('--input_path', type=str, required=True, help='.csv, .tsv or .parquet file with columns: sequence_vh, label (1 for viral 0 otherwise, optional), or a FASTA/FASTQ file of amino acid or in-frame nucleotide heavy chains, whose record ids key the output. Text may be compressed as .gz, .zst or .bz2, and the path may be an s3:// URI')
+    parser.add_argument('--output_file', type=str, required=True, help='output file name with extensions: .parquet, or .csv/.tsv optionally compressed as .gz or .zst. Can be full path or just file name')
     parser.add_argument('--tokenizer_path', type=str, default='./fabcon-small/', help='Path to the tokenizer for your model')
     parser.add_argument('--model_path', type=str, required=True, help='Path to the model')
     parser.add_argument('--run_mode', type=str, required=True, help='mode. Either cpu or gpu')
+    parser.add_argument('--max_tokens', type=int, default=4096, help='Maximum number of padded tokens per batch. Sequences are grouped by length to fill this budget')
+    parser.add_argument('--stream', action='store_true', help='Read, predict and write the input in chunks so memory is bounded by --chunk_size rather than the file size')
+    parser.add_argument('--chunk_size', type=int, default=100000, help='Number of rows per chunk in --stream mode')
+    parser.add_argument('--translation_processes', type=int, default=1, help='Number of processes used to translate sequence_alignment into sequence_vh for AIRR inputs')
+    parser.add_argument('--cache_path', type=str, default=None, help='SQLite file used as a persistent prediction cache. Sequences already scored by the same model are not re-scored')
+    parser.add_argument('--cache_max_entries', type=int, default=10000000, help='Maximum number of sequences kept in the prediction cache')
+    parser.add_argument('--backend', type=str, default='torch', choices=['torch', 'onnx'], help='Inference backend. onnx runs the exported model under onnxruntime on CPU')
+    parser.add_argument('--onnx_path', type=str, default=None, help='Exported ONNX model. Defaults to the model path with a .onnx suffix, exported on first use and again whenever the model changes')
+    parser.add_argument('--intra_op_threads', type=int, default=0, help='Threads used within each operator on CPU. 0 leaves the backend default, or splits the cores evenly between torchrun workers')
+    parser.add_argument('--pipeline', action='store_true', help='Like --stream, but reading, translation, tokenization, inference and writing run concurrently in separate threads. Prints per-stage busy/idle times')
+    parser.add_argument('--queue_size', type=int, default=4, help='Items buffered between --pipeline stages')
+    parser.add_argument('--row_group_size', type=int, default=1000000, help='Rows per row group of .parquet output')
+    parser.add_argument('--predictions_only', action='store_true', help='Write only row_id (the row number in the input), human_probability and prediction rather than every input column')
+    parser.add_argument('--spill_dir', type=str, default=None, help='Deduplicate out of core: spill the input to hash-partitioned buckets in this directory, score each distinct sequence once and stream the rows back. For inputs whose distinct sequences do not fit in memory. Uses --chunk_size')
+    parser.add_argument('--n_buckets', type=int, default=256, help='Number of hash buckets for --spill_dir. Memory is bounded by the size of one bucket')
+    parser.add_argument('--metrics_file', type=str, default=None, help='Also write the analyse_metrics metrics of the output to this JSON file, computed as the output is written. Files of several runs can be merged with analyse_metrics.py --metrics_files')
+    parser.add_argument('--quantize', type=str, default='none', choices=['none', 'int8'], help='int8 applies dynamic quantization to the linear layers on CPU. The quantized weights are cached next to the model. Check accuracy first with quantization.py validate')
 
     args = parser.parse_args()
 
@@ -382,7 +944,24 @@ if __name__ == "__main__":
         args.tokenizer_path, 
         args.model_path,
         rank,
-        world_size
+        world_size,
+        args.max_tokens,
+        args.stream,
+        args.chunk_size,
+        args.translation_processes,
+        args.cache_path,
+        args.cache_max_entries,
+        args.backend,
+        args.onnx_path,
+        args.intra_op_threads,
+        args.quantize,
+        args.pipeline,
+        args.queue_size,
+        args.row_group_size,
+        args.predictions_only,
+        args.spill_dir,
+        args.n_buckets,
+        args.metrics_file
         )
     
     # else:
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+
+def model_fingerprint(*paths):
+    """
+    SHA-256 over the names and contents of every file under the given model and
+    tokenizer directories. Any change to the weights, config or vocabulary gives a
+    different fingerprint.
+
+    Args:
+        *paths (str): Model and tokenizer directories (or single files)
+
+    Returns:
+        str: hex digest
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.isfile(path):
+            files = [path]
+        else:
+            files = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(path)
+                for name in names
+            )
+        for file_path in files:
+            digest.update(os.path.relpath(file_path, path).encode())
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint_path(artifact_path):
+    """Sidecar recording the fingerprint of the model an artifact, e.g. an ONNX export, was made from"""
+    return artifact_path + '.fingerprint'
+
+
+def artifact_is_current(artifact_path, fingerprint):
+    """Whether artifact_path exists and was made from the model with this fingerprint"""
+    if not (os.path.exists(artifact_path) and os.path.exists(fingerprint_path(artifact_path))):
+        return False
+    with open(fingerprint_path(artifact_path)) as f:
+        return f.read().strip() == fingerprint
+
+
+def record_fingerprint(artifact_path, fingerprint):
+    """Record the fingerprint of the model artifact_path was just made from, see artifact_is_current"""
+    with open(fingerprint_path(artifact_path), 'w') as f:
+        f.write(fingerprint)
+
+
+def sequence_key(sequence):
+    return hashlib.sha256(sequence.encode()).digest()
+
+
+class PredictionCache:
+    """
+    Persistent SQLite cache of human probabilities keyed by the SHA-256 of the
+    fabcon_sequence. The cache belongs to a single model: it records the model
+    fingerprint it was filled with and is emptied when opened with a different one.
+
+    Args:
+        cache_path (str): SQLite file, created if it does not exist
+        fingerprint (str): Fingerprint of the model and tokenizer, see model_fingerprint
+        max_entries (int): Size limit. Least recently used entries are evicted beyond it
+    """
+    def __init__(self, cache_path, fingerprint, max_entries=10000000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        # concurrent runs may share the file, so wait on each other's writes
+        self.connection = sqlite3.connect(cache_path, timeout=600)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS predictions (
+                    key BLOB PRIMARY KEY,
+                    human_probability REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self.connection.execute("CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (last_used)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)")
+
+            stored = self.connection.execute("SELECT value FROM metadata WHERE name = 'fingerprint'").fetchone()
+            if stored is None or stored[0] != fingerprint:
+                if stored is not None:
+                    print('Model fingerprint changed, clearing prediction cache')
+                self.connection.execute("DELETE FROM predictions")
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO metadata (name, value) VALUES ('fingerprint', ?)", (fingerprint,)
+                )
+
+    def lookup(self, sequences):
+        """
+        Returns:
+            np.ndarray: float32 probabilities aligned with sequences, NaN where not cached
+        """
+        human_probabilities = np.full(len(sequences), np.nan, dtype=np.float32)
+        with self.connection:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (position INTEGER PRIMARY KEY, key BLOB)")
+            self.connection.execute("DELETE FROM lookup")
+            self.connection.executemany(
+                "INSERT INTO lookup (position, key) VALUES (?, ?)",
+                ((position, sequence_key(sequence)) for position, sequence in enumerate(sequences))
+            )
+            rows = self.connection.execute("""
+                SELECT lookup.position, predictions.human_probability
+                FROM lookup JOIN predictions ON predictions.key = lookup.key
+            """).fetchall()
+            self.connection.execute(
+                "UPDATE predictions SET last_used = ? WHERE key IN (SELECT key FROM lookup)", (time.time(),)
+            )
+            self.connection.execute("DELETE FROM lookup")
+
+        if rows:
+            positions, probabilities = zip(*rows)
+            human_probabilities[list(positions)] = probabilities
+        self.hits += len(rows)
+        self.misses += len(sequences) - len(rows)
+        return human_probabilities
+
+    def store(self, sequences, human_probabilities):
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO predictions (key, human_probability, last_used) VALUES (?, ?, ?)",
+                (
+                    (sequence_key(sequence), float(probability), now)
+                    for sequence, probability in zip(sequences, human_probabilities)
+                )
+            )
+            n_entries = self.connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            if n_entries > self.max_entries:
+                self.connection.execute(
+                    "DELETE FROM predictions WHERE key IN (SELECT key FROM predictions ORDER BY last_used LIMIT ?)",
+                    (n_entries - self.max_entries,)
+                )
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self):
+        print(f'Prediction cache: {self.hits} hits, {self.misses} misses, hit rate {self.hit_rate:.3f}')
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,127 @@
+import argparse
+import os
+
+import numpy as np
+import torch
+from transformers import (
+    FalconConfig,
+    FalconForSequenceClassification,
+    PreTrainedTokenizerFast,
+)
+
+from prediction_cache import artifact_is_current, model_fingerprint, record_fingerprint
+
+
+def default_quantized_path(model_path):
+    """The quantized weights sit next to the PyTorch model directory"""
+    return os.path.normpath(model_path) + '.int8.pt'
+
+
+def quantize_model(model):
+    """Dynamic int8 quantization of the linear layers, which hold nearly all of Falcon's weights"""
+    return torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_quantized_model(model_path, quantized_path=None):
+    """
+    Load the int8 classifier. The quantized state dict is cached at quantized_path
+    (model_path + '.int8.pt' by default) and created from the fp32 model on first use,
+    and again whenever the fp32 weights change (see prediction_cache.artifact_is_current).
+
+    Args:
+        model_path (str): Path to the fp32 model
+        quantized_path (str): Cached quantized weights
+
+    Returns:
+        tuple: (model, quantized_path)
+    """
+    quantized_path = quantized_path or default_quantized_path(model_path)
+    fingerprint = model_fingerprint(model_path)
+    if artifact_is_current(quantized_path, fingerprint):
+        # quantize an untrained model of the same shape so the int8 state dict has somewhere to go
+        model = quantize_model(FalconForSequenceClassification(FalconConfig.from_pretrained(model_path)))
+        model.load_state_dict(torch.load(quantized_path))
+    else:
+        print(f'Quantizing {model_path} to {quantized_path}')
+        model = quantize_model(FalconForSequenceClassification.from_pretrained(model_path))
+        torch.save(model.state_dict(), quantized_path)
+        record_fingerprint(quantized_path, fingerprint)
+    return model, quantized_path
+
+
+def validate_quantization(input_path, tokenizer_path, model_path, quantized_path=None, max_tokens=4096):
+    """
+    Score a labelled file with the fp32 and int8 models and report how far the int8
+    model drifts: the largest change in human_probability, the number of rows whose
+    prediction flips at the human threshold, and the change in each metric predict.py
+    reports for labelled runs.
+
+    Returns:
+        dict: Drift summary and the metrics of both models
+    """
+    # predict.py imports this module lazily, so import it here rather than at the top
+    from predict import (
+        HUMAN_THRESHOLD,
+        add_fabcon_sequence,
+        annotate_predictions,
+        compute_metrics,
+        deduplicate_sequences,
+        read_input,
+        score_sequences,
+    )
+
+    dataset_to_predict = read_input(input_path)
+    if 'label' not in dataset_to_predict.columns:
+        raise NameError('Validation needs a labelled file with a label column')
+    original_columns = add_fabcon_sequence(dataset_to_predict)
+    codes, sequences = deduplicate_sequences(original_columns)
+
+    tokenizer = PreTrainedTokenizerFast.from_pretrained(tokenizer_path)
+    device = torch.device('cpu')
+    models = {
+        'fp32': FalconForSequenceClassification.from_pretrained(model_path).to(device),
+        'int8': load_quantized_model(model_path, quantized_path)[0]
+    }
+
+    annotated = {}
+    for name, model in models.items():
+        human_probabilities = score_sequences(model, tokenizer, sequences, device, max_tokens)
+        annotated[name] = annotate_predictions(original_columns, codes, human_probabilities)
+
+    labels = original_columns['label'].astype(int).values
+    metrics = {name: compute_metrics(labels, merged_df['human_probability'].values) for name, merged_df in annotated.items()}
+    summary = {
+        'max_probability_drift': float(np.abs(
+            annotated['fp32']['human_probability'].values - annotated['int8']['human_probability'].values
+        ).max()),
+        'prediction_flips': int((annotated['fp32']['prediction'] != annotated['int8']['prediction']).sum()),
+        'metric_deltas': {name: metrics['int8'][name] - metrics['fp32'][name] for name in metrics['fp32']},
+        'metrics': metrics
+    }
+
+    print(f"Max human_probability drift: {summary['max_probability_drift']:.2e}")
+    print(f"Prediction flips at {HUMAN_THRESHOLD}: {summary['prediction_flips']} of {len(labels)} rows")
+    for name, delta in summary['metric_deltas'].items():
+        print(f"{name}: fp32 {metrics['fp32'][name]:.4f}, int8 {metrics['int8'][name]:.4f} (delta {delta:+.4f})")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Quantize the classifier to int8 and validate it against fp32')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    quantize_parser = subparsers.add_parser('quantize', help='Write the int8 weights next to the model')
+    validate_parser = subparsers.add_parser('validate', help='Compare fp32 and int8 predictions on a labelled file')
+    for command_parser in (quantize_parser, validate_parser):
+        command_parser.add_argument('--model_path', type=str, required=True, help='Path to the fp32 model')
+        command_parser.add_argument('--quantized_path', type=str, default=None, help='Quantized weights. Defaults to the model path with a .int8.pt suffix')
+    validate_parser.add_argument('--input_path', type=str, required=True, help='Labelled .csv, .tsv or .parquet file with a label column')
+    validate_parser.add_argument('--tokenizer_path', type=str, default='./fabcon-small/', help='Path to the tokenizer for your model')
+    validate_parser.add_argument('--max_tokens', type=int, default=4096, help='Maximum number of padded tokens per batch')
+
+    args = parser.parse_args()
+
+    if args.command == 'quantize':
+        print(load_quantized_model(args.model_path, args.quantized_path)[1])
+    else:
+        validate_quantization(args.input_path, args.tokenizer_path, args.model_path, args.quantized_path, args.max_tokens)
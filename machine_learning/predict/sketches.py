@@ -0,0 +1,227 @@
+import base64
+import zlib
+
+import numpy as np
+import pandas as pd
+
+
+def hash_strings(values):
+    """64-bit hashes of an array of strings"""
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+def mix_hashes(left, right):
+    """Hashes of pairs of values from the hashes of each, mixed so every bit of the result depends on both"""
+    with np.errstate(over='ignore'):
+        mixed = left * np.uint64(0x9E3779B97F4A7C15) ^ right
+        # splitmix64 finaliser
+        mixed ^= mixed >> np.uint64(30)
+        mixed *= np.uint64(0xBF58476D1CE4E5B9)
+        mixed ^= mixed >> np.uint64(27)
+        mixed *= np.uint64(0x94D049BB133111EB)
+        mixed ^= mixed >> np.uint64(31)
+    return mixed
+
+
+def _encode(array):
+    return base64.b64encode(zlib.compress(array.tobytes())).decode('ascii')
+
+
+def _decode(text, dtype):
+    return np.frombuffer(zlib.decompress(base64.b64decode(text)), dtype=dtype).copy()
+
+
+class HyperLogLog:
+    """
+    Estimate of the number of distinct values among the 64-bit hashes added, in 2**precision
+    one-byte registers. The relative standard error is 1.04 / sqrt(2**precision), 0.8% for
+    the default precision of 14. Sketches merge by a register-wise max, after folding the
+    more precise one down to the other's precision (see reduce).
+    """
+    def __init__(self, precision=14, registers=None):
+        if not 4 <= precision <= 18:
+            raise ValueError('HyperLogLog precision must be between 4 and 18')
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8) if registers is None else registers
+
+    def update(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        # a guard bit below the remaining bits caps the rank at 64 - precision + 1
+        rest = (hashes << np.uint64(self.precision)) | np.uint64(1 << (self.precision - 1))
+        high = (rest >> np.uint64(32)).astype(np.float64)
+        low = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        with np.errstate(divide='ignore'):
+            leading_zeros = np.where(high > 0, 31 - np.floor(np.log2(high)), 63 - np.floor(np.log2(low)))
+        rank = leading_zeros.astype(np.int64) + 1
+
+        # the largest rank per register, from which of the 64 possible (register, rank)
+        # pairs occur
+        seen = np.bincount(index << 6 | rank, minlength=len(self.registers) << 6).reshape(-1, 64) > 0
+        largest = np.where(seen.any(axis=1), 63 - np.argmax(seen[:, ::-1], axis=1), 0).astype(np.uint8)
+        np.maximum(self.registers, largest, out=self.registers)
+
+    def reduce(self, precision):
+        """
+        The sketch these hashes would have given at a lower precision. The index bits
+        dropped become the leading bits of the rank: a register whose dropped bits are
+        not all zero has its rank set by them, otherwise its rank grows by their number.
+        """
+        if precision > self.precision:
+            raise ValueError(f'Cannot raise HyperLogLog precision from {self.precision} to {precision}')
+        dropped = self.precision - precision
+        groups = self.registers.reshape(2 ** precision, 2 ** dropped).astype(np.int64)
+        low_bits = np.arange(2 ** dropped)
+        # rank of the dropped bits alone, for the registers whose dropped bits are not all zero
+        prefix_rank = dropped - np.floor(np.log2(np.maximum(low_bits, 1))).astype(np.int64)
+        ranks = np.where(low_bits > 0, prefix_rank, dropped + groups)
+        ranks = np.where(groups > 0, ranks, 0)
+        return HyperLogLog(precision, ranks.max(axis=1).astype(np.uint8))
+
+    def merge(self, other):
+        if other.precision < self.precision:
+            reduced = self.reduce(other.precision)
+            self.precision, self.registers = reduced.precision, reduced.registers
+        elif other.precision > self.precision:
+            other = other.reduce(self.precision)
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            # linear counting is more accurate while many registers are still empty
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def to_dict(self):
+        return {'precision': self.precision, 'registers': _encode(self.registers)}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['precision'], _decode(state['registers'], np.uint8))
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch of the values added. Level h holds items standing for 2**h values
+    each; a level over its capacity is sorted and every other item, from a random offset,
+    is promoted to the next level. The rank error of a quantile is about 2/k, and the
+    sketch holds about 3k items whatever the number of values. Merging concatenates the
+    levels and compacts them again.
+    """
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        # sorted up front with the faster unstable sort, which leaves the compactions
+        # below merging sorted runs
+        self.levels[0] = np.concatenate([self.levels[0], np.sort(values)])
+        self.compress()
+
+    def compress(self):
+        while sum(len(items) for items in self.levels) > sum(self.capacity(level) for level in range(len(self.levels))):
+            level = next(level for level, items in enumerate(self.levels) if len(items) > self.capacity(level))
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            # promoted items come out sorted, so a stable sort of the next level only
+            # has to merge sorted runs
+            items = np.sort(self.levels[level], kind='stable')
+            kept = len(items) % 2
+            promoted = items[kept + self.rng.integers(2)::2]
+            self.levels[level] = items[:kept]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def merge(self, other):
+        self.k = min(self.k, other.k)
+        self.n += other.n
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.compress()
+
+    def quantiles(self, fractions):
+        """Estimated quantiles at the given fractions, or NaN for an empty sketch"""
+        if not self.n:
+            return [np.nan] * len(fractions)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level_items), 2 ** level, dtype=np.int64) for level, level_items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, np.asarray(fractions) * cumulative[-1], side='left')
+        return items[order][np.minimum(positions, len(items) - 1)].tolist()
+
+    def to_dict(self):
+        return {
+            'k': self.k,
+            'n': self.n,
+            'level_sizes': [len(items) for items in self.levels],
+            'items': _encode(np.concatenate(self.levels))
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state['k'])
+        sketch.n = state['n']
+        items = _decode(state['items'], np.float64)
+        bounds = np.cumsum([0] + state['level_sizes'])
+        sketch.levels = [items[bounds[level]:bounds[level + 1]] for level in range(len(state['level_sizes']))]
+        return sketch
+
+
+class HeavyHitters:
+    """
+    Misra-Gries summary of the most frequent items, keeping counts of at most capacity
+    items. A count is under its true value by at most n / (capacity + 1), so every item
+    more frequent than that is kept. Summaries merge by adding counts and pruning again.
+    """
+    def __init__(self, capacity=64, counts=None, n=0):
+        self.capacity = capacity
+        self.counts = dict(counts or {})
+        self.n = n
+
+    def update(self, counts):
+        """Add a chunk's exact {item: count}, e.g. from a bincount of its categories"""
+        for item, count in counts.items():
+            if count:
+                self.counts[item] = self.counts.get(item, 0) + count
+                self.n += count
+        self.prune()
+
+    def prune(self):
+        if len(self.counts) > self.capacity:
+            threshold = sorted(self.counts.values(), reverse=True)[self.capacity]
+            self.counts = {item: count - threshold for item, count in self.counts.items() if count > threshold}
+
+    def merge(self, other):
+        self.capacity = min(self.capacity, other.capacity)
+        for item, count in other.counts.items():
+            self.counts[item] = self.counts.get(item, 0) + count
+        self.n += other.n
+        self.prune()
+
+    def top(self, k):
+        """The k items with the largest (lower bound) counts, most frequent first"""
+        return dict(sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:k])
+
+    def to_dict(self):
+        return {'capacity': self.capacity, 'counts': self.counts, 'n': self.n}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['capacity'], state['counts'], state['n'])
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# the predict modules import each other by bare name, as they do when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiny_model import residue_tokenizer, save_tiny_model
+
+
+@pytest.fixture
+def tiny_model(tmp_path):
+    """Path of a tiny classifier, and a function that replaces its weights with those of another seed"""
+    model_path = str(tmp_path / 'model')
+    save_tiny_model(model_path, seed=0)
+    return model_path, lambda seed: save_tiny_model(model_path, seed)
+
+
+@pytest.fixture
+def tiny_tokenizer(tmp_path):
+    """Path of a one-token-per-residue tokenizer whose ids fit the tiny classifier"""
+    tokenizer_path = str(tmp_path / 'tokenizer')
+    residue_tokenizer().save_pretrained(tokenizer_path)
+    return tokenizer_path
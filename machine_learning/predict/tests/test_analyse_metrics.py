@@ -0,0 +1,124 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyse_metrics import MetricsAccumulator, analyze_antibody_data, merge_metrics_files
+from predict import OutputWriter
+
+# KLL sketches larger than the test data keep every value, so their quantiles do not
+# depend on how the rows were chunked
+EXACT_K = 10000
+
+
+def annotated_chunk(n_rows, seed):
+    """Annotated rows with the columns analyse_metrics reads, a few values missing"""
+    rng = np.random.default_rng(seed)
+    probabilities = rng.random(n_rows).astype(np.float32)
+    chunk = pd.DataFrame({
+        'v_call': rng.choice(['IGHV4-34*01', 'IGHV3-30*02', 'IGHV1-2*01', 'IGHV1-69*01'], n_rows),
+        'c_call': rng.choice(['IGHG1', 'IGHG2', 'IGHG3', 'IGHG4', 'IGHM', 'IGHA1'], n_rows),
+        'cdr3_aa': [f'CAR{"G" * int(length)}DYW' for length in rng.integers(2, 20, n_rows)],
+        'mu_count_total': rng.integers(0, 40, n_rows),
+        'prediction': np.where(probabilities > 0.99, 'human', 'other'),
+        'human_probability': probabilities
+    })
+    chunk.loc[chunk.index[::17], 'v_call'] = None
+    return chunk
+
+
+def save_accumulator(path, chunk, **sizes):
+    accumulator = MetricsAccumulator(**sizes)
+    accumulator.update(chunk)
+    accumulator.save(path)
+    return str(path)
+
+
+def test_merge_files_keeps_their_sketch_sizes(tmp_path):
+    paths = [
+        save_accumulator(tmp_path / 'a.json', annotated_chunk(2000, 0), precision=12, k=100, capacity=16),
+        save_accumulator(tmp_path / 'b.json', annotated_chunk(2000, 1), precision=12, k=100, capacity=16)
+    ]
+    sketches = merge_metrics_files(paths).sketches
+    assert sketches.clonotypes.precision == 12
+    assert sketches.human_probabilities.k == 100
+    assert sketches.human_v_genes.capacity == 16
+
+
+def test_merge_files_of_different_sizes(tmp_path):
+    first, second = annotated_chunk(2000, 0), annotated_chunk(2000, 1)
+    paths = [
+        save_accumulator(tmp_path / 'a.json', first, precision=14),
+        save_accumulator(tmp_path / 'b.json', second, precision=10)
+    ]
+    merged = merge_metrics_files(paths)
+
+    expected = MetricsAccumulator(precision=10)
+    expected.update(pd.concat([first, second]))
+    assert merged.sketches.clonotypes.precision == 10
+    assert merged.metrics()['distinct_clonotypes'] == expected.metrics()['distinct_clonotypes']
+
+
+def test_merge_files_shrinks_to_requested_sizes(tmp_path):
+    paths = [save_accumulator(tmp_path / 'a.json', annotated_chunk(2000, 0))]
+    sketches = merge_metrics_files(paths, precision=11, k=50, capacity=8).sketches
+    assert sketches.clonotypes.precision == 11
+    assert sketches.human_probabilities.k == 50
+    assert sketches.human_v_genes.capacity == 8
+    json.loads(sketches.to_json())
+
+
+def annotated_chunks(seed=0):
+    """Chunks of one annotated file, one of them without a single CDR3 or V call"""
+    chunks = [annotated_chunk(n_rows, seed + index) for index, n_rows in enumerate([1500, 700, 1, 1200])]
+    chunks[1]['cdr3_aa'] = None
+    chunks[1]['v_call'] = None
+    return chunks
+
+
+@pytest.mark.parametrize('extension', ['tsv', 'parquet'])
+def test_chunked_metrics_match_whole_file(tmp_path, extension):
+    chunks = annotated_chunks()
+    file_path = str(tmp_path / f'annotated.{extension}')
+    if extension == 'tsv':
+        pd.concat(chunks).to_csv(file_path, sep='\t', index=False)
+        # the rows as they read back, float32 probabilities having gone through text
+        whole = pd.read_csv(file_path, sep='\t')
+    else:
+        pd.concat(chunks).to_parquet(file_path, index=False)
+        whole = pd.read_parquet(file_path)
+    expected = analyze_antibody_data(file_path, k=EXACT_K)
+
+    accumulators = []
+    boundaries = np.cumsum([0] + [len(chunk) for chunk in chunks])
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        chunk = whole.iloc[start:end]
+        accumulator = MetricsAccumulator(k=EXACT_K)
+        accumulator.update(chunk)
+        # through JSON, as the partial metrics of shards are merged
+        accumulators.append(MetricsAccumulator.from_dict(json.loads(json.dumps(accumulator.to_dict()))))
+    merged = accumulators[0]
+    for accumulator in accumulators[1:]:
+        merged.merge(accumulator)
+    metrics = merged.metrics()
+
+    assert metrics.keys() == expected.keys()
+    for key in expected.keys() - {'sketches'}:
+        assert metrics[key] == expected[key], key
+
+
+def test_output_writer_metrics_match_written_file(tmp_path):
+    output_file = str(tmp_path / 'annotated.tsv')
+    metrics_file = str(tmp_path / 'metrics.json')
+    writer = OutputWriter(output_file, metrics_file=metrics_file)
+    for chunk in annotated_chunks(seed=10):
+        writer.write(chunk)
+    writer.close()
+
+    with open(metrics_file) as f:
+        written = json.load(f)['metrics']
+    expected = analyze_antibody_data(output_file)
+    # quantiles of the default size sketches depend on the chunking, within their rank error
+    for key in expected.keys() - {'sketches', 'human_probability_quantiles', 'mu_count_quantiles', 'cdr3_length_quantiles'}:
+        assert written[key] == expected[key], key
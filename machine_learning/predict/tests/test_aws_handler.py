@@ -0,0 +1,128 @@
+import os
+import uuid
+
+import pandas as pd
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+# a scratch database, e.g. postgresql://postgres@localhost/postgres; the tests create and drop their own schema
+DSN = os.environ.get('POSTGRES_DSN')
+pytestmark = pytest.mark.skipif(not DSN, reason='POSTGRES_DSN is not set')
+
+import aws_handler
+from analyse_metrics import MetricsAccumulator
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+# the metrics table as it was before the migrations, when rows were plain INSERTs
+BASE_TABLE = """
+    CREATE TABLE {table} (
+        hash_id text,
+        date timestamp,
+        total_rows bigint,
+        human_rows bigint,
+        IGHV4_34_percentage double precision,
+        IGHV3_30_percentage double precision,
+        IGHG_percentage double precision,
+        IGHG1_percentage double precision,
+        IGHG2_percentage double precision,
+        IGHG3_percentage double precision,
+        IGHG4_percentage double precision,
+        average_cdr3_length double precision,
+        average_mu_count double precision,
+        human_prediction_percentage double precision,
+        probability_histogram text
+    )
+"""
+
+
+def apply_migration(connection, name, schema, table):
+    """Run a migration as psql would with -v table=<table>, against schema.table"""
+    with open(os.path.join(MIGRATIONS, name)) as f:
+        statements = ''.join(line for line in f if not line.startswith('\\'))
+    statements = statements.replace(':"table"', f'"{schema}"."{table}"').replace(':"hash_id_index"', f'"{table}_hash_id_key"')
+    with connection.cursor() as cursor:
+        cursor.execute(statements)
+
+
+def metrics(n_rows):
+    accumulator = MetricsAccumulator()
+    accumulator.update(pd.DataFrame({
+        'v_call': ['IGHV4-34*01', 'IGHV1-2*01'] * n_rows,
+        'c_call': ['IGHG1', 'IGHM'] * n_rows,
+        'cdr3_aa': ['CARDYW', 'CARGGDYW'] * n_rows,
+        'mu_count_total': [3, 10] * n_rows,
+        'prediction': ['human', 'other'] * n_rows,
+        'human_probability': [0.995, 0.2] * n_rows
+    }))
+    return accumulator.metrics()
+
+
+@pytest.fixture
+def metrics_table(monkeypatch):
+    """A migrated metrics table in a scratch schema, uploaded to through aws_handler's pool"""
+    schema, table = f'metrics_test_{uuid.uuid4().hex[:8]}', 'autoantibody_test'
+    connection = psycopg2.connect(DSN)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE SCHEMA "{schema}"')
+        cursor.execute(BASE_TABLE.format(table=f'"{schema}"."{table}"'))
+    # a row uploaded twice by the old INSERT, which the unique index migration removes
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO "{schema}"."{table}" (hash_id, date, total_rows) VALUES (%s, %s, %s), (%s, %s, %s)',
+            ('retried', '2024-01-01', 1, 'retried', '2024-01-02', 2)
+        )
+    apply_migration(connection, '001_repertoire_sketch_columns.sql', schema, table)
+    apply_migration(connection, '002_unique_hash_id.sql', schema, table)
+
+    monkeypatch.setenv(aws_handler.METRICS_DSN_VARIABLE, DSN)
+    monkeypatch.setattr(aws_handler, 'connection_pool', None)
+    try:
+        yield connection, f'{schema}.{table}'
+    finally:
+        if aws_handler.connection_pool is not None:
+            aws_handler.connection_pool.closeall()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA "{schema}" CASCADE')
+        connection.close()
+
+
+def rows(connection, table_name):
+    schema, table = table_name.split('.')
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT hash_id, total_rows, distinct_clonotypes FROM "{schema}"."{table}" ORDER BY hash_id')
+        return cursor.fetchall()
+
+
+def test_migration_keeps_latest_duplicate(metrics_table):
+    connection, table_name = metrics_table
+    assert rows(connection, table_name) == [('retried', 2, None)]
+
+
+def test_upsert_is_idempotent(metrics_table):
+    connection, table_name = metrics_table
+    aws_handler.upload_metrics_batch([('run_a', metrics(5)), ('run_b', metrics(5))], table_name)
+    # a retried task uploads the same runs again, one with new metrics
+    aws_handler.upload_metrics_batch([('run_a', metrics(5)), ('run_b', metrics(7))], table_name)
+
+    assert rows(connection, table_name) == [('retried', 2, None), ('run_a', 10, 2), ('run_b', 14, 2)]
+
+
+def test_repeated_hash_id_in_batch_keeps_last(metrics_table):
+    connection, table_name = metrics_table
+    aws_handler.upload_metrics_batch([('run_a', metrics(1)), ('run_a', metrics(3))], table_name)
+    assert ('run_a', 6, 2) in rows(connection, table_name)
+
+
+def test_upload_metrics_to_rds_reuses_pool(metrics_table, monkeypatch):
+    connection, table_name = metrics_table
+    monkeypatch.setattr(aws_handler, 'RDS_METRICS_TABLE', table_name)
+    # Nextflow passes autoantibody_<stage>, which the upload ignores
+    aws_handler.upload_metrics_to_rds(metrics(2), 'retried', 'autoantibody_production')
+    pool = aws_handler.connection_pool
+    aws_handler.upload_metrics_to_rds(metrics(2), 'run_c', 'autoantibody_production')
+
+    assert aws_handler.connection_pool is pool
+    assert rows(connection, table_name) == [('retried', 4, 2), ('run_c', 4, 2)]
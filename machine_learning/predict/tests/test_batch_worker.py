@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from batch_worker import BatchWorker, SQLiteQueue
+
+
+def message_rows(queue):
+    return queue.connection.execute('SELECT id, receive_count, status FROM messages ORDER BY id').fetchall()
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    queue = SQLiteQueue(str(tmp_path / 'queue.sqlite'), visibility_timeout=0.3, max_receives=2)
+    yield queue
+    queue.connection.close()
+
+
+def test_received_job_is_hidden_until_visibility_timeout(job_queue):
+    job_queue.send({'hash_id': 'a'})
+    receipt, job = job_queue.receive(wait_seconds=0)
+    assert job == {'hash_id': 'a'}
+    assert job_queue.receive(wait_seconds=0) is None
+
+    # a worker that dies without releasing the job leaves it to reappear
+    time.sleep(0.4)
+    assert job_queue.receive(wait_seconds=0) == (receipt, job)
+    assert message_rows(job_queue) == [(receipt, 2, 'pending')]
+
+
+def test_extend_keeps_job_hidden(job_queue):
+    job_queue.send({'hash_id': 'a'})
+    receipt, _ = job_queue.receive(wait_seconds=0)
+    for _ in range(3):
+        time.sleep(0.2)
+        job_queue.extend(receipt)
+        assert job_queue.receive(wait_seconds=0) is None
+
+
+def test_release_retries_until_max_receives_then_fails(job_queue):
+    job_queue.send({'hash_id': 'a'})
+    receipt, _ = job_queue.receive(wait_seconds=0)
+    job_queue.release(receipt)
+    # released jobs are visible again at once
+    assert job_queue.receive(wait_seconds=0)[0] == receipt
+    job_queue.release(receipt)
+
+    assert message_rows(job_queue) == [(receipt, 2, 'failed')]
+    assert job_queue.receive(wait_seconds=0) is None
+
+
+class StubClassifier:
+    """Writes its input to the output path, or raises; stops the worker after one job"""
+    def __init__(self, worker_queue, fail=False, duration=0.0):
+        self.worker_queue = worker_queue
+        self.fail = fail
+        self.duration = duration
+        self.worker = None
+        self.visible_while_running = []
+
+    def predict_file(self, input_path, output_path, translation_processes=1, metrics_file=None):
+        self.worker.stop()
+        deadline = time.time() + self.duration
+        while time.time() < deadline:
+            self.visible_while_running.append(self.worker_queue.receive(wait_seconds=0))
+            time.sleep(0.1)
+        if self.fail:
+            raise RuntimeError('scoring failed')
+        with open(input_path) as source, open(output_path, 'w') as output:
+            output.write(source.read())
+        assert metrics_file is None
+
+
+def run_one_job(tmp_path, job_queue, **stub_options):
+    input_path = tmp_path / 'input.tsv'
+    input_path.write_text('sequence_vh\nQVQL\n')
+    output_uri = str(tmp_path / 'published.tsv')
+    job_queue.send({'input_uri': str(input_path), 'output_uri': output_uri, 'hash_id': 'a'})
+
+    classifier = StubClassifier(job_queue, **stub_options)
+    classifier.worker = BatchWorker(job_queue, classifier)
+    classifier.worker.poll()
+    return classifier, output_uri
+
+
+def test_successful_job_is_published_and_deleted(tmp_path, job_queue):
+    _, output_uri = run_one_job(tmp_path, job_queue)
+    with open(output_uri) as f:
+        assert f.read() == 'sequence_vh\nQVQL\n'
+    assert message_rows(job_queue) == []
+
+
+def test_failed_job_is_released_for_retry(tmp_path, job_queue):
+    run_one_job(tmp_path, job_queue, fail=True)
+    [(receipt, receive_count, status)] = message_rows(job_queue)
+    assert (receive_count, status) == (1, 'pending')
+    assert job_queue.receive(wait_seconds=0)[0] == receipt
+
+
+def test_running_job_stays_hidden_past_visibility_timeout(tmp_path, job_queue):
+    # the heartbeat extends the job's visibility every half timeout while it runs
+    classifier, _ = run_one_job(tmp_path, job_queue, duration=1.0)
+    assert len(classifier.visible_while_running) >= 5
+    assert all(message is None for message in classifier.visible_while_running)
+    assert message_rows(job_queue) == []
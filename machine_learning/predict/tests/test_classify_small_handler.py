@@ -0,0 +1,87 @@
+import importlib.util
+import json
+import os
+
+import pytest
+
+from tiny_model import residue_tokenizer, save_tiny_model
+
+pytest.importorskip('Bio')
+
+# the Lambda image puts the handler next to predict.py and its siblings, as this directory does
+HANDLER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
+    'autoantibody_app', 'api', 'functions', 'classify-small', 'handler.py'
+)
+MAX_SEQUENCES = 4
+MAX_SEQUENCE_LENGTH = 30
+
+
+@pytest.fixture(scope='module')
+def handler(tmp_path_factory):
+    """The classify-small handler module, loaded with the tiny classifier and small limits"""
+    directory = tmp_path_factory.mktemp('classify_small')
+    residue_tokenizer().save_pretrained(str(directory / 'tokenizer'))
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('TOKENIZER_PATH', str(directory / 'tokenizer'))
+        monkeypatch.setenv('MODEL_PATH', save_tiny_model(str(directory / 'model'), seed=0))
+        monkeypatch.setenv('MAX_SEQUENCES', str(MAX_SEQUENCES))
+        monkeypatch.setenv('MAX_SEQUENCE_LENGTH', str(MAX_SEQUENCE_LENGTH))
+        spec = importlib.util.spec_from_file_location('classify_small_handler', HANDLER_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+def invoke(handler, body):
+    response = handler.lambda_handler({'body': body if isinstance(body, str) else json.dumps(body)}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def probability(handler, sequence):
+    return str(float(handler.classifier.predict_sequences([sequence])[0]))
+
+
+def test_single_sequence_keeps_its_response_shape(handler):
+    status, body = invoke(handler, {'sequence': ' qvq\nlvq '})
+    assert status == 200
+    assert body == {
+        'sequence_vh_x': 'QVQLVQ',
+        'human_probability': probability(handler, 'QVQLVQ'),
+        'prediction': ''
+    }
+
+
+def test_sequences_list(handler):
+    status, body = invoke(handler, {'sequences': ['QVQL', 'evql', 'QVQL']})
+    assert status == 200
+    assert (body['n_sequences'], body['n_unique']) == (3, 2)
+    assert [result['sequence_vh_x'] for result in body['results']] == ['QVQL', 'EVQL', 'QVQL']
+    assert body['results'][1]['human_probability'] == probability(handler, 'EVQL')
+    assert all('id' not in result for result in body['results'])
+
+
+def test_fasta_keeps_record_ids(handler):
+    status, body = invoke(handler, {'fasta': '>h1 first\nQVQL\nVQSG\n>h2\nEVQL\n'})
+    assert status == 200
+    assert [(result['id'], result['sequence_vh_x']) for result in body['results']] == [('h1', 'QVQLVQSG'), ('h2', 'EVQL')]
+
+
+@pytest.mark.parametrize('body, message', [
+    ('{not json', 'Expecting'),
+    (['QVQL'], 'JSON object'),
+    ('"QVQL"', 'JSON object'),
+    ({}, 'No sequence provided'),
+    ({'sequence': '  '}, 'No sequence provided'),
+    ({'sequences': ['QVQL', '']}, 'Empty sequence provided'),
+    ({'sequence': 5}, 'sequence must be a string'),
+    ({'sequences': 5}, 'sequences must be a list of strings'),
+    ({'sequences': ['QVQL', 5]}, 'sequences must be a list of strings'),
+    ({'fasta': ['>h1', 'QVQL']}, 'fasta must be a string'),
+    ({'sequences': ['QVQL'] * (MAX_SEQUENCES + 1)}, f'Too many sequences: {MAX_SEQUENCES + 1}'),
+    ({'fasta': '>h1\n' + 'Q' * (MAX_SEQUENCE_LENGTH + 1) + '\n>h2\nEVQL\n'}, f'1 sequences are longer than {MAX_SEQUENCE_LENGTH}'),
+])
+def test_bad_requests_return_400(handler, body, message):
+    status, response = invoke(handler, body)
+    assert status == 400
+    assert message in response['error']
@@ -0,0 +1,56 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+import dedup
+from dedup import PartitionedDeduplicator
+
+
+def test_spilled_rows_keep_each_chunks_types(tmp_path):
+    chunks = [
+        pd.DataFrame({'fabcon_sequence': ['AAA', 'CCC', 'AAA'], 'sparse': [np.nan, np.nan, np.nan], 'counts': [1, 2, 3]}),
+        pd.DataFrame({'fabcon_sequence': ['CCC', None, 'GGG'], 'sparse': ['x', None, 'y'], 'counts': [np.nan, 5.0, np.nan]})
+    ]
+    deduplicator = PartitionedDeduplicator(str(tmp_path), n_buckets=4)
+    try:
+        for chunk in chunks:
+            deduplicator.add(chunk)
+        assert deduplicator.finish() == 3
+
+        sequences = [sequence for _, batch in deduplicator.unique_sequences(2) for sequence in batch]
+        spilled = list(deduplicator.row_chunks())
+        assert len(spilled) == len(chunks)
+        for (rows, _), chunk in zip(spilled, chunks):
+            pd.testing.assert_frame_equal(rows, chunk)
+        unique_ids = np.concatenate([ids for _, ids in spilled])
+        assert [sequences[i] if i >= 0 else None for i in unique_ids] == ['AAA', 'CCC', 'AAA', 'CCC', None, 'GGG']
+    finally:
+        deduplicator.cleanup()
+
+
+def test_failed_scoring_closes_prediction_cache(tmp_path, tiny_model, tiny_tokenizer, monkeypatch):
+    model_path, _ = tiny_model
+    pd.DataFrame({'sequence_vh': ['QVQLVQSG', 'EVQLVESG']}).to_csv(tmp_path / 'input.csv', index=False)
+    caches = []
+    open_prediction_cache = dedup.open_prediction_cache
+
+    def recording_open_prediction_cache(*args):
+        caches.append(open_prediction_cache(*args))
+        return caches[-1]
+    monkeypatch.setattr(dedup, 'open_prediction_cache', recording_open_prediction_cache)
+
+    def failing_score_sequences(*args, **kwargs):
+        raise RuntimeError('scoring failed')
+    monkeypatch.setattr(dedup, 'score_sequences', failing_score_sequences)
+
+    with pytest.raises(RuntimeError, match='scoring failed'):
+        dedup.predict_partitioned(
+            str(tmp_path / 'input.csv'), str(tmp_path / 'output.tsv'), tiny_tokenizer, model_path,
+            torch.device('cpu'), str(tmp_path), n_buckets=2, cache_path=str(tmp_path / 'cache.sqlite')
+        )
+    [cache] = caches
+    with pytest.raises(sqlite3.ProgrammingError):
+        cache.connection.execute('SELECT 1')
@@ -0,0 +1,90 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from evaluation import Curve, evaluate, write_report
+
+metrics = pytest.importorskip('sklearn.metrics')
+
+
+def predictions(n_rows, seed=0):
+    """0/1 labels and float32 probabilities that separate them imperfectly, a tenth of them tied"""
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(2, size=n_rows)
+    probabilities = np.clip(rng.normal(0.4 + 0.2 * labels, 0.2), 0, 1).astype(np.float32)
+    probabilities[:n_rows // 10] = np.round(probabilities[:n_rows // 10], 1)
+    return labels, probabilities
+
+
+def sklearn_at(labels, probabilities, threshold):
+    predicted = probabilities > threshold
+    return {
+        'precision': metrics.precision_score(labels, predicted, zero_division=0),
+        'recall': metrics.recall_score(labels, predicted, zero_division=0),
+        'f1': metrics.f1_score(labels, predicted, zero_division=0),
+        'mcc': metrics.matthews_corrcoef(labels, predicted)
+    }
+
+
+@pytest.mark.parametrize('threshold', [0.0, 0.3, 0.5, np.float32(0.7).item(), 0.99, 1.0])
+def test_evaluate_matches_sklearn(threshold):
+    labels, probabilities = predictions(5000)
+    report, _ = evaluate(labels, probabilities, threshold)
+
+    assert report['roc_auc'] == pytest.approx(metrics.roc_auc_score(labels, probabilities), abs=1e-12)
+    assert report['average_precision'] == pytest.approx(metrics.average_precision_score(labels, probabilities), abs=1e-12)
+    for name, value in sklearn_at(labels, probabilities, threshold).items():
+        assert report['at_threshold'][name] == pytest.approx(value, abs=1e-12), name
+
+
+def test_sweep_rows_match_sklearn():
+    labels, probabilities = predictions(2000, seed=1)
+    sweep = Curve(labels, probabilities).sweep()
+
+    assert len(sweep) == len(np.unique(probabilities))
+    assert sweep['threshold'].is_monotonic_decreasing
+    for _, row in sweep.iloc[::50].iterrows():
+        predicted = probabilities > np.float32(row['threshold'])
+        tn, fp, fn, tp = metrics.confusion_matrix(labels, predicted, labels=[0, 1]).ravel()
+        assert (row['tp'], row['fp'], row['fn'], row['tn']) == (tp, fp, fn, tn)
+        for name, value in sklearn_at(labels, probabilities, np.float32(row['threshold'])).items():
+            assert row[name] == pytest.approx(value, abs=1e-12), name
+
+
+def test_rows_missing_label_or_probability_are_dropped():
+    labels, probabilities = predictions(1000, seed=2)
+    labels = labels.astype(np.float64)
+    probabilities = probabilities.astype(np.float64)
+    labels[::7] = np.nan
+    probabilities[::11] = np.nan
+    present = ~(np.isnan(labels) | np.isnan(probabilities))
+    report, _ = evaluate(labels, probabilities, 0.5)
+
+    assert report['rows'] == present.sum()
+    assert report['roc_auc'] == pytest.approx(metrics.roc_auc_score(labels[present], probabilities[present]), abs=1e-12)
+
+
+def test_single_class_report_is_valid_json(tmp_path):
+    report, sweep = evaluate(np.ones(20), np.linspace(0, 1, 20), 0.5, n_bootstrap=10)
+    assert np.isnan(report['roc_auc'])
+
+    report_path = tmp_path / 'report.json'
+    write_report(report, sweep, str(report_path))
+    with open(report_path) as f:
+        written = json.loads(f.read(), parse_constant=lambda constant: pytest.fail(f'{constant} in the report'))
+    assert written['roc_auc'] is None
+    assert written['average_precision'] == 1.0
+    assert 'roc_auc' not in written['confidence_intervals']
+    assert len(pd.read_parquet(tmp_path / 'report_sweep.parquet')) == 20
+
+
+def test_resamples_missing_a_class_do_not_widen_small_set_intervals():
+    # two positives among ten, perfectly separated: about one Poisson resample in seven draws neither
+    labels = np.r_[np.zeros(8), np.ones(2)]
+    report, _ = evaluate(labels, np.linspace(0, 1, 10), 0.5, n_bootstrap=1000)
+
+    assert report['roc_auc'] == 1.0
+    assert report['confidence_intervals']['roc_auc'] == pytest.approx([1.0, 1.0])
+    assert report['confidence_intervals']['average_precision'] == pytest.approx([1.0, 1.0])
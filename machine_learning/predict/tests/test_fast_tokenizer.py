@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+import torch
+
+from fast_tokenizer import CharacterTokenizer
+from predict import make_collate_fn
+from tiny_model import RESIDUES, residue_tokenizer
+
+
+def random_sequences(n, alphabet=RESIDUES, seed=0):
+    rng = np.random.default_rng(seed)
+    return [''.join(rng.choice(list(alphabet), size=rng.integers(1, 140))) for _ in range(n)]
+
+
+@pytest.mark.parametrize('special_tokens', [True, False])
+def test_encode_matches_hf_tokenizer(special_tokens):
+    tokenizer = residue_tokenizer(special_tokens)
+    character_tokenizer = CharacterTokenizer.from_tokenizer(tokenizer)
+    assert character_tokenizer is not None
+
+    # residues outside the vocabulary map to <unk> both ways
+    sequences = random_sequences(100, RESIDUES + 'XBZ', seed=1)
+    input_ids, attention_mask = character_tokenizer.encode(sequences)
+    expected = tokenizer(sequences, return_tensors='pt', padding=True)
+    assert torch.equal(input_ids, expected['input_ids'])
+    assert torch.equal(attention_mask, expected['attention_mask'])
+
+
+def test_unchecked_character_falls_back_to_hf_tokenizer():
+    tokenizer = residue_tokenizer()
+    assert CharacterTokenizer.from_tokenizer(tokenizer).encode(['QVQLVQ', 'QVQ€']) is None
+
+    collate_fn = make_collate_fn(tokenizer)
+    sequences = ['QVQLVQ', 'QVQ€']
+    batch = collate_fn(list(enumerate(sequences)))
+    expected = tokenizer(sequences, return_tensors='pt', padding=True)
+    assert torch.equal(batch['input_ids'], expected['input_ids'])
+    assert torch.equal(batch['indices'], torch.tensor([0, 1]))
+
+
+def test_left_padded_tokenizer_is_not_replaced():
+    assert CharacterTokenizer.from_tokenizer(residue_tokenizer(padding_side='left')) is None
@@ -0,0 +1,93 @@
+import io
+
+import pytest
+
+from fasta import read_records, read_sequence_vh
+from utils import get_full_aa_sub
+
+# Bio.Seq, which the translation falls back to, warns about partial codons
+pytestmark = pytest.mark.filterwarnings('ignore::Bio.BiopythonWarning')
+
+HEAVY_CHAIN = 'QVQLVQSGAEVKKPGASVKVSCKASGYTFTSYGISWVRQAPGQGLEWMGWISAYNGNTNYAQKLQGRVTMTTDTSTSTAYMELRSLRSDDTAVYYCAR'
+
+
+def records(text, file_format='fasta', block_size=64 * 1024 * 1024):
+    """(sequence_id, sequence) of every record read from text"""
+    batches = read_records(io.BytesIO(text.encode()), file_format, block_size)
+    return [pair for batch in batches for pair in zip(batch['sequence_id'].to_pylist(), batch['sequence'].to_pylist())]
+
+
+def sequence_vh(text, file_format='fasta', block_size=64 * 1024 * 1024):
+    tables = read_sequence_vh(io.BytesIO(text.encode()), file_format, block_size=block_size)
+    return [pair for table in tables for pair in zip(table['sequence_id'].to_pylist(), table['sequence_vh'].to_pylist())]
+
+
+def fasta_text(n_records, width=None):
+    lines = []
+    for index in range(n_records):
+        sequence = HEAVY_CHAIN[index % 7:]
+        lines.append(f'>seq{index} description {index}')
+        lines.extend([sequence[start:start + width] for start in range(0, len(sequence), width)] if width else [sequence])
+    return '\n'.join(lines) + '\n'
+
+
+def expected_records(n_records):
+    return [(f'seq{index}', HEAVY_CHAIN[index % 7:]) for index in range(n_records)]
+
+
+@pytest.mark.parametrize('block_size', [7, 64, 100, 1000, 64 * 1024 * 1024])
+@pytest.mark.parametrize('width', [None, 60])
+def test_fasta_records_split_across_blocks(block_size, width):
+    assert records(fasta_text(30, width), block_size=block_size) == expected_records(30)
+
+
+def test_fasta_crlf_blank_lines_and_no_final_newline():
+    text = '>a first\r\nQVQL\r\nVQSG\r\n\r\n>b\r\nEVQL\r\n>c\tx\nQVQ'
+    assert records(text, block_size=5) == [('a', 'QVQLVQSG'), ('b', 'EVQL'), ('c', 'QVQ')]
+
+
+def test_fasta_must_start_with_header():
+    with pytest.raises(ValueError, match='header'):
+        records('QVQL\n>a\nQVQL\n')
+
+
+@pytest.mark.parametrize('block_size', [5, 50, 64 * 1024 * 1024])
+def test_fastq_records_split_across_blocks(block_size):
+    text = ''.join(f'@read{index} x\n{sequence}\n+\n{"I" * len(sequence)}\r\n' for index, sequence in expected_records(12))
+    assert records(text, 'fastq', block_size) == [(f'read{index}', sequence) for index, sequence in expected_records(12)]
+
+
+@pytest.mark.parametrize('text, message', [
+    ('@a\nACGT\n+\nIIII\nb\nACGT\n+\nIIII\n', '"@" header'),
+    ('@a\nACGT\n+\nIII\n', 'quality'),
+    ('@a\nACGT\n+\nIIII\n@b\nACGT\n', 'Incomplete'),
+])
+def test_fastq_validation(text, message):
+    with pytest.raises(ValueError, match=message):
+        records(text, 'fastq')
+
+
+def test_nucleotide_with_ambiguity_codes_is_translated():
+    text = '>r1\nATGRCCGAAGTG\n>r2\nATGGCCGAAGTG\n'
+    assert sequence_vh(text) == [('r1', get_full_aa_sub('ATGRCCGAAGTG', '')), ('r2', 'MAEV')]
+
+
+def test_lower_case_and_gapped_nucleotide_is_translated():
+    assert sequence_vh('>r1\natggcc---gaagtg\n') == [('r1', 'MAEV')]
+
+
+def test_amino_acid_is_not_translated():
+    # a CDR3 made of letters that are also nucleotide codes, but few bases, stays amino acids
+    text = '>h1\n' + HEAVY_CHAIN + '\n>h2\nCARDYW\n'
+    assert sequence_vh(text) == [('h1', HEAVY_CHAIN), ('h2', 'CARDYW')]
+
+
+def test_mixed_records_raise():
+    with pytest.raises(ValueError, match='r1 is nucleotide, h1 amino acid'):
+        sequence_vh(f'>r1\nATGGCCGAAGTG\n>h1\n{HEAVY_CHAIN}\n>r2\nATGGCC\n')
+
+
+def test_later_block_of_other_type_raises():
+    text = '>r1\nATGGCCGAAGTG\n' * 10 + f'>h1\n{HEAVY_CHAIN}\n'
+    with pytest.raises(ValueError, match='amino acid sequences from h1 on'):
+        sequence_vh(text, block_size=30)
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from inference_server import MicroBatcher, create_app
+
+
+class StubClassifier:
+    """Scores a sequence as its length / 100, recording the batches it is given"""
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def predict_sequences(self, sequences):
+        with self.lock:
+            self.batches.append(list(sequences))
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError('model failed')
+        return np.array([len(sequence) / 100 for sequence in sequences], dtype=np.float32)
+
+
+async def with_batcher(batcher, coroutine):
+    task = asyncio.create_task(batcher.run())
+    try:
+        return await coroutine
+    finally:
+        task.cancel()
+        batcher.executor.shutdown(wait=True)
+
+
+def test_concurrent_requests_coalesce_up_to_max_batch_size():
+    classifier = StubClassifier()
+    batcher = MicroBatcher(classifier, max_batch_size=4, max_wait_ms=200)
+    sequences = ['Q' * length for length in range(1, 11)]
+
+    async def requests():
+        return await asyncio.gather(*(batcher.predict(sequence) for sequence in sequences))
+
+    results = asyncio.run(with_batcher(batcher, requests()))
+    assert results == pytest.approx([len(sequence) / 100 for sequence in sequences])
+    assert [len(batch) for batch in classifier.batches] == [4, 4, 2]
+    assert [sequence for batch in classifier.batches for sequence in batch] == sequences
+
+
+def test_batch_closes_at_max_wait():
+    classifier = StubClassifier()
+    batcher = MicroBatcher(classifier, max_batch_size=64, max_wait_ms=150)
+
+    async def requests():
+        first = asyncio.create_task(batcher.predict('QVQ'))
+        await asyncio.sleep(0.05)
+        # joins the open batch
+        second = asyncio.create_task(batcher.predict('EVQL'))
+        await asyncio.gather(first, second)
+        # arrives after the batch closed, so opens its own
+        await batcher.predict('QVQLV')
+
+    start = time.perf_counter()
+    asyncio.run(with_batcher(batcher, requests()))
+    assert classifier.batches == [['QVQ', 'EVQL'], ['QVQLV']]
+    # each batch waited out its window, and no more than a window longer
+    assert 0.3 <= time.perf_counter() - start < 1.0
+    # the requests that opened a batch waited the whole window
+    assert batcher.latencies[0] >= 0.15
+    assert batcher.latencies[2] >= 0.15
+
+
+def test_error_reaches_every_request_of_the_batch():
+    classifier = StubClassifier(fail=True)
+    batcher = MicroBatcher(classifier, max_batch_size=8, max_wait_ms=50)
+
+    async def requests():
+        results = await asyncio.gather(*(batcher.predict(sequence) for sequence in ['QVQ', 'EVQ', 'DVQ']), return_exceptions=True)
+        # the batcher survives the failed batch
+        classifier.fail = False
+        return results, await batcher.predict('QVQL')
+
+    results, after = asyncio.run(with_batcher(batcher, requests()))
+    assert [str(result) for result in results] == ['model failed'] * 3
+    assert after == pytest.approx(0.04)
+    assert batcher.errors == 3
+    assert batcher.requests == 1
+
+
+def test_metrics_report_percentiles_and_queue_depth():
+    classifier = StubClassifier(delay=0.3)
+
+    async def requests():
+        async with TestClient(TestServer(create_app(classifier, max_batch_size=1, max_wait_ms=1))) as client:
+            metrics = await (await client.get('/metrics')).json()
+            assert metrics['latency_ms'] == {'p50': None, 'p90': None, 'p99': None}
+
+            posts = [asyncio.create_task(client.post('/predict', json={'sequence': f'qvq l{"v" * index}'})) for index in range(3)]
+            await asyncio.sleep(0.15)
+            # one request is being scored, one batch at a time, and the others wait in the queue
+            during = await (await client.get('/metrics')).json()
+            responses = [await (await post).json() for post in posts]
+            after = await (await client.get('/metrics')).json()
+            return during, responses, after
+
+    during, responses, after = asyncio.run(requests())
+    assert during['queue_depth'] == 2
+    assert responses[0] == {'sequence_vh': 'QVQL', 'human_probability': pytest.approx(0.04), 'prediction': ''}
+    assert after['requests'] == 3
+    assert after['queue_depth'] == 0
+    assert after['mean_batch_size'] == 1.0
+    latency = after['latency_ms']
+    assert 0 < latency['p50'] <= latency['p90'] <= latency['p99']
+    # the last request waited for the two batches ahead of it
+    assert latency['p99'] >= 600
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('onnxruntime')
+
+from transformers import FalconForSequenceClassification
+
+from onnx_backend import load_onnx_classifier
+from prediction_cache import fingerprint_path
+from tiny_model import batch, human_probability
+
+TOLERANCE = 1e-4
+
+
+def torch_probability(model_path):
+    return human_probability(FalconForSequenceClassification.from_pretrained(model_path).eval(), *batch())
+
+
+def test_onnx_matches_torch(tiny_model):
+    model_path, _ = tiny_model
+    onnx_model = load_onnx_classifier(model_path)
+    assert np.abs(human_probability(onnx_model, *batch()) - torch_probability(model_path)).max() < TOLERANCE
+
+
+def test_changed_weights_are_exported_again(tiny_model):
+    model_path, replace_weights = tiny_model
+    load_onnx_classifier(model_path)
+    onnx_path = os.path.normpath(model_path) + '.onnx'
+    assert os.path.exists(fingerprint_path(onnx_path))
+
+    replace_weights(seed=1)
+    onnx_model = load_onnx_classifier(model_path)
+    assert np.abs(human_probability(onnx_model, *batch()) - torch_probability(model_path)).max() < TOLERANCE
+
+
+def test_current_export_is_reused(tiny_model):
+    model_path, _ = tiny_model
+    load_onnx_classifier(model_path)
+    onnx_path = os.path.normpath(model_path) + '.onnx'
+    modified = os.path.getmtime(onnx_path)
+    load_onnx_classifier(model_path)
+    assert os.path.getmtime(onnx_path) == modified
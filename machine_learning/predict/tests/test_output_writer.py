@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from predict import OutputWriter
+
+
+def sparse_chunks():
+    """Two chunks as pandas reads a sparse TSV: a column empty in the first chunk only, and one empty in the second only"""
+    first = pd.DataFrame({'sequence_id': ['a', 'b'], 'sparse': [np.nan, np.nan], 'counts': [1, 2]})
+    second = pd.DataFrame({'sequence_id': ['c', 'd'], 'sparse': ['x', None], 'counts': [np.nan, np.nan]})
+    return first, second
+
+
+def test_parquet_column_empty_in_first_chunk(tmp_path):
+    output_file = str(tmp_path / 'out.parquet')
+    writer = OutputWriter(output_file, row_group_size=3)
+    for chunk in sparse_chunks():
+        writer.write(chunk)
+    writer.close()
+
+    written = pq.read_table(output_file)
+    assert written['sparse'].to_pylist() == [None, None, 'x', None]
+    assert written['counts'].to_pylist() == [1, 2, None, None]
+
+
+def test_parquet_null_typed_first_chunk(tmp_path):
+    output_file = str(tmp_path / 'out.parquet')
+    writer = OutputWriter(output_file)
+    writer.write(pd.DataFrame({'sparse': [None, None]}))
+    writer.write(pd.DataFrame({'sparse': ['x', 'y']}))
+    writer.close()
+
+    assert pq.read_table(output_file)['sparse'].to_pylist() == [None, None, 'x', 'y']
+
+
+def test_text_output_matches_parquet(tmp_path):
+    writer = OutputWriter(str(tmp_path / 'out.tsv'))
+    for chunk in sparse_chunks():
+        writer.write(chunk)
+    writer.close()
+
+    written = pd.read_csv(tmp_path / 'out.tsv', sep='\t')
+    assert written['sparse'].tolist()[2] == 'x'
+    assert len(written) == 4
@@ -0,0 +1,73 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+import pipeline
+from pipeline import predict_pipelined
+from predict import predict_stream
+from tiny_model import RESIDUES
+
+CPU = torch.device('cpu')
+
+
+def write_input(path, n_rows=230, seed=0):
+    """Labelled heavy chains of varied length, many repeated across chunks"""
+    rng = np.random.default_rng(seed)
+    distinct = [''.join(rng.choice(list(RESIDUES), size=rng.integers(20, 60))) for _ in range(n_rows // 3)]
+    pd.DataFrame({
+        'sequence_vh': rng.choice(distinct, size=n_rows),
+        'label': rng.integers(2, size=n_rows)
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def test_pipelined_output_matches_stream(tmp_path, tiny_model, tiny_tokenizer):
+    model_path, _ = tiny_model
+    input_path = write_input(tmp_path / 'input.csv')
+    predict_stream(input_path, str(tmp_path / 'stream.tsv'), tiny_tokenizer, model_path, CPU, chunk_size=50, max_tokens=512)
+    predict_pipelined(input_path, str(tmp_path / 'pipelined.tsv'), tiny_tokenizer, model_path, CPU, chunk_size=50, max_tokens=512, queue_size=1)
+
+    stream = pd.read_csv(tmp_path / 'stream.tsv', sep='\t')
+    assert len(stream) == 230
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / 'pipelined.tsv', sep='\t'), stream)
+
+
+def failing_on_second_call(function):
+    calls = []
+
+    def wrapper(*args, **kwargs):
+        calls.append(None)
+        if len(calls) == 2:
+            raise RuntimeError('stage failed')
+        return function(*args, **kwargs)
+    return wrapper
+
+
+@pytest.mark.parametrize('stage_function', ['add_fabcon_sequence', 'make_collate_fn', 'annotate_predictions'])
+def test_stage_error_is_raised_without_deadlock(tmp_path, tiny_model, tiny_tokenizer, monkeypatch, stage_function):
+    model_path, _ = tiny_model
+    input_path = write_input(tmp_path / 'input.csv', n_rows=600)
+    if stage_function == 'make_collate_fn':
+        # the tokenize stage fails on its second batch
+        make_collate_fn = pipeline.make_collate_fn
+        monkeypatch.setattr(pipeline, 'make_collate_fn', lambda tokenizer: failing_on_second_call(make_collate_fn(tokenizer)))
+    else:
+        monkeypatch.setattr(pipeline, stage_function, failing_on_second_call(getattr(pipeline, stage_function)))
+
+    errors = []
+
+    def run():
+        try:
+            # one item per queue, so the stages upstream of the failure block on full queues
+            predict_pipelined(input_path, str(tmp_path / 'out.tsv'), tiny_tokenizer, model_path, CPU, chunk_size=20, max_tokens=64, queue_size=1)
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive(), 'predict_pipelined deadlocked'
+    assert [str(error) for error in errors] == ['stage failed']
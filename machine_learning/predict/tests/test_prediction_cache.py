@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+
+from prediction_cache import PredictionCache, model_fingerprint
+
+
+def open_cache(tmp_path, fingerprint='model-a', max_entries=100):
+    return PredictionCache(str(tmp_path / 'cache.sqlite'), fingerprint, max_entries)
+
+
+def test_lookup_is_aligned_with_positions(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.store(['ḢQVQ', 'ḢEVQ'], np.array([0.25, 0.75], dtype=np.float32))
+
+    human_probabilities = cache.lookup(['ḢEVQ', 'ḢDVQ', 'ḢQVQ', 'ḢEVQ'])
+    assert human_probabilities.dtype == np.float32
+    np.testing.assert_array_equal(human_probabilities, [0.75, np.nan, 0.25, 0.75])
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert cache.lookup([]).shape == (0,)
+    cache.close()
+
+
+def test_cache_persists_for_the_same_fingerprint(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.store(['ḢQVQ'], [0.5])
+    cache.close()
+
+    cache = open_cache(tmp_path)
+    np.testing.assert_array_equal(cache.lookup(['ḢQVQ']), [0.5])
+    cache.close()
+
+
+def test_changed_fingerprint_clears_cache(tmp_path):
+    model_path = tmp_path / 'model'
+    model_path.mkdir()
+    (model_path / 'model.safetensors').write_bytes(b'weights')
+    fingerprint = model_fingerprint(str(model_path))
+    cache = open_cache(tmp_path, fingerprint)
+    cache.store(['ḢQVQ'], [0.5])
+    cache.close()
+
+    (model_path / 'model.safetensors').write_bytes(b'retrained weights')
+    assert model_fingerprint(str(model_path)) != fingerprint
+    cache = open_cache(tmp_path, model_fingerprint(str(model_path)))
+    assert np.isnan(cache.lookup(['ḢQVQ'])).all()
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = open_cache(tmp_path, max_entries=3)
+    for sequence in ['ḢA', 'ḢB', 'ḢC']:
+        cache.store([sequence], [0.5])
+        time.sleep(0.01)
+    # using ḢA makes ḢB the least recently used
+    cache.lookup(['ḢA'])
+    time.sleep(0.01)
+    cache.store(['ḢD'], [0.5])
+
+    assert cache.connection.execute('SELECT COUNT(*) FROM predictions').fetchone()[0] == 3
+    cached = ~np.isnan(cache.lookup(['ḢA', 'ḢB', 'ḢC', 'ḢD']))
+    assert cached.tolist() == [True, False, True, True]
+    cache.close()
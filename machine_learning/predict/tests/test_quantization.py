@@ -0,0 +1,28 @@
+import os
+
+import numpy as np
+from transformers import FalconForSequenceClassification
+
+from prediction_cache import fingerprint_path
+from quantization import load_quantized_model, quantize_model
+
+from tiny_model import batch, human_probability
+
+
+def test_quantized_weights_follow_the_model(tiny_model):
+    model_path, replace_weights = tiny_model
+    _, quantized_path = load_quantized_model(model_path)
+    assert os.path.exists(fingerprint_path(quantized_path))
+
+    replace_weights(seed=1)
+    model, _ = load_quantized_model(model_path)
+    expected = quantize_model(FalconForSequenceClassification.from_pretrained(model_path))
+    assert np.array_equal(human_probability(model, *batch()), human_probability(expected, *batch()))
+
+
+def test_current_quantized_weights_are_reused(tiny_model):
+    model_path, _ = tiny_model
+    _, quantized_path = load_quantized_model(model_path)
+    modified = os.path.getmtime(quantized_path)
+    load_quantized_model(model_path)
+    assert os.path.getmtime(quantized_path) == modified
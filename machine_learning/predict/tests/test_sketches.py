@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from sketches import HeavyHitters, HyperLogLog, KLLSketch, hash_strings
+
+
+def random_hashes(n, seed=0):
+    return np.random.default_rng(seed).integers(0, 2 ** 64, size=n, dtype=np.uint64)
+
+
+def test_hyperloglog_estimate_within_error():
+    hashes = random_hashes(200000)
+    sketch = HyperLogLog(14)
+    # every value three times, which must not change the estimate
+    for _ in range(3):
+        sketch.update(hashes)
+    assert abs(sketch.estimate() / len(hashes) - 1) < 4 * 1.04 / np.sqrt(2 ** 14)
+
+
+def test_hyperloglog_small_counts_exact_enough():
+    sketch = HyperLogLog(14)
+    sketch.update(hash_strings([f'clonotype{i}' for i in range(100)]))
+    assert sketch.estimate() == 100
+
+
+@pytest.mark.parametrize('precision, lower', [(14, 10), (14, 13), (18, 4), (12, 12)])
+def test_hyperloglog_reduce_matches_sketch_built_at_lower_precision(precision, lower):
+    hashes = random_hashes(100000)
+    sketch = HyperLogLog(precision)
+    sketch.update(hashes)
+    expected = HyperLogLog(lower)
+    expected.update(hashes)
+    assert np.array_equal(sketch.reduce(lower).registers, expected.registers)
+
+
+def test_hyperloglog_merge_of_different_precisions():
+    hashes = random_hashes(50000)
+    precise = HyperLogLog(14)
+    precise.update(hashes[:20000])
+    coarse = HyperLogLog(11)
+    coarse.update(hashes[20000:])
+    precise.merge(coarse)
+
+    expected = HyperLogLog(11)
+    expected.update(hashes)
+    assert precise.precision == 11
+    assert np.array_equal(precise.registers, expected.registers)
+
+
+def test_hyperloglog_round_trip():
+    sketch = HyperLogLog(12)
+    sketch.update(random_hashes(1000))
+    restored = HyperLogLog.from_dict(sketch.to_dict())
+    assert restored.precision == 12 and np.array_equal(restored.registers, sketch.registers)
+
+
+def test_kll_quantiles_within_rank_error():
+    values = np.random.default_rng(0).normal(size=200000)
+    sketch = KLLSketch(200)
+    for chunk in np.array_split(values, 17):
+        sketch.update(chunk)
+    fractions = [0.05, 0.25, 0.5, 0.75, 0.95]
+    ranks = np.searchsorted(np.sort(values), sketch.quantiles(fractions)) / len(values)
+    assert np.abs(ranks - fractions).max() < 0.02
+    assert sum(len(level) for level in sketch.levels) < 4 * 200
+
+
+def test_kll_merge_and_round_trip():
+    values = np.random.default_rng(1).random(100000)
+    left, right = KLLSketch(200), KLLSketch(100, seed=1)
+    left.update(values[:30000])
+    right.update(values[30000:])
+    left.merge(KLLSketch.from_dict(right.to_dict()))
+    assert left.n == len(values) and left.k == 100
+    assert abs(left.quantiles([0.5])[0] - 0.5) < 0.03
+
+
+def test_kll_ignores_missing_and_empty():
+    sketch = KLLSketch()
+    sketch.update([np.nan, np.nan])
+    assert sketch.n == 0
+    assert np.isnan(sketch.quantiles([0.5])[0])
+
+
+def test_heavy_hitters_keeps_frequent_items():
+    rng = np.random.default_rng(0)
+    summary = HeavyHitters(capacity=8)
+    truth = {}
+    for _ in range(20):
+        items = rng.zipf(1.5, size=5000) % 50
+        counts = dict(zip(*np.unique(items, return_counts=True)))
+        counts = {f'gene{item}': int(count) for item, count in counts.items()}
+        for item, count in counts.items():
+            truth[item] = truth.get(item, 0) + count
+        summary.update(counts)
+
+    n = sum(truth.values())
+    assert summary.n == n
+    for item, count in truth.items():
+        if count > n / (8 + 1):
+            assert truth[item] - n / (8 + 1) <= summary.counts[item] <= truth[item]
+    assert list(summary.top(1)) == [max(truth, key=truth.get)]
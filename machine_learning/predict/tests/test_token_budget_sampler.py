@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from predict import TokenBudgetBatchSampler
+
+
+def random_lengths(n, seed=0):
+    return np.random.default_rng(seed).integers(10, 160, size=n)
+
+
+@pytest.mark.parametrize('max_tokens', [160, 1000, 4096])
+def test_batches_hold_the_token_budget(max_tokens):
+    lengths = random_lengths(1000)
+    sampler = TokenBudgetBatchSampler(lengths, max_tokens)
+
+    batches = list(sampler)
+    assert len(batches) == len(sampler)
+    for batch in batches:
+        assert len(batch) * lengths[batch].max() <= max_tokens
+    # every sequence once, longest first
+    flat = np.concatenate(batches)
+    assert sorted(flat) == list(range(len(lengths)))
+    assert (np.diff(lengths[flat]) <= 0).all()
+    assert 0 < sampler.padding_efficiency <= 1
+
+
+def test_sequence_over_budget_gets_its_own_batch():
+    lengths = [20, 300, 30, 250, 20]
+    batches = list(TokenBudgetBatchSampler(lengths, max_tokens=200))
+    assert batches[:2] == [[1], [3]]
+    assert sorted(np.concatenate(batches[2:])) == [0, 2, 4]
+
+
+@pytest.mark.parametrize('n_sequences', [0, 1, 7, 500])
+@pytest.mark.parametrize('num_replicas', [2, 3, 4])
+def test_shards_cover_every_index_with_equal_steps(n_sequences, num_replicas):
+    lengths = random_lengths(n_sequences, seed=n_sequences)
+    shards = [TokenBudgetBatchSampler(lengths, 1000, num_replicas, rank) for rank in range(num_replicas)]
+
+    assert len({len(shard) for shard in shards}) == 1
+    covered = [index for shard in shards for batch in shard for index in batch]
+    assert set(covered) == set(range(n_sequences))
+    # only the padding batches, at most one per rank, are repeated
+    unsharded = len(TokenBudgetBatchSampler(lengths, 1000))
+    assert sum(len(shard) for shard in shards) - unsharded < num_replicas
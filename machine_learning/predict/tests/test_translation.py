@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import TranslationCache, get_full_aa_sub, get_full_aa_sub_batch, translate_unique_pairs
+
+# Bio.Seq warns about partial codons, which the random pairs are full of
+pytestmark = pytest.mark.filterwarnings('ignore::Bio.BiopythonWarning')
+
+
+def alignment_pairs(n_pairs, seed=0):
+    """
+    sequence_alignment / germline_alignment_d_mask pairs with leading gaps, IMGT gaps,
+    ambiguity codes, lower case and partial codons, plus the edge cases of the row-wise path
+    """
+    rng = np.random.default_rng(seed)
+    alphabet = list('ACGTN.-acgtRY')
+
+    def random_string(max_length):
+        return ''.join(rng.choice(alphabet, size=rng.integers(0, max_length + 1)))
+
+    aln_seqs = ['.' * rng.integers(0, 11) + random_string(40) for _ in range(n_pairs)]
+    germ_seqs = [random_string(50) for _ in range(n_pairs)]
+    aln_seqs += ['', '...', 'A..', '..ATG', np.nan]
+    germ_seqs += ['', 'A', 'ATG', 'AAA', 'ATG']
+    return aln_seqs, germ_seqs
+
+
+def row_wise(aln_seqs, germ_seqs):
+    return [get_full_aa_sub(str(aln), str(germ)) for aln, germ in zip(aln_seqs, germ_seqs)]
+
+
+def test_batch_matches_row_wise():
+    aln_seqs, germ_seqs = alignment_pairs(2000)
+    assert get_full_aa_sub_batch(aln_seqs, germ_seqs).tolist() == row_wise(aln_seqs, germ_seqs)
+
+
+def test_batch_in_parallel_chunks_matches_row_wise():
+    aln_seqs, germ_seqs = alignment_pairs(500, seed=1)
+    translated = get_full_aa_sub_batch(aln_seqs, germ_seqs, n_processes=2, chunk_size=120)
+    assert translated.tolist() == row_wise(aln_seqs, germ_seqs)
+
+
+@pytest.mark.parametrize('aln_seq, germ_seq', [('ATGXYZ', ''), ('..ATGAAA', 'ÉGG'), ('ATGAé', '')])
+def test_characters_outside_the_table_fail_as_row_wise(aln_seq, germ_seq):
+    with pytest.raises(Exception) as row_wise_error:
+        get_full_aa_sub(aln_seq, germ_seq)
+    with pytest.raises(row_wise_error.type):
+        get_full_aa_sub_batch(['ATGAAA', aln_seq], ['', germ_seq])
+
+
+def test_unique_pairs_broadcast_to_every_row():
+    aln_seqs, germ_seqs = alignment_pairs(300, seed=2)
+    rng = np.random.default_rng(3)
+    # expanded clones: each pair repeated a random number of times, in shuffled order
+    rows = rng.permutation(np.repeat(np.arange(len(aln_seqs)), rng.integers(1, 5, size=len(aln_seqs))))
+    aln_column = pd.Series(aln_seqs, dtype=object)[rows]
+    germ_column = pd.Series(germ_seqs, dtype=object)[rows]
+
+    expected = row_wise(aln_column, germ_column)
+    assert translate_unique_pairs(aln_column, germ_column).tolist() == expected
+
+    cache = TranslationCache(maxsize=100)
+    for _ in range(2):
+        assert translate_unique_pairs(aln_column, germ_column, cache=cache).tolist() == expected
+    assert len(cache.translations) == 100
+    assert cache.hits > 0
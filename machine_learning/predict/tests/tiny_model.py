@@ -0,0 +1,58 @@
+import torch
+from tokenizers import Regex, Tokenizer, models, pre_tokenizers, processors
+from transformers import FalconConfig, FalconForSequenceClassification, PreTrainedTokenizerFast
+
+SPECIAL_TOKENS = ['<pad>', '<unk>', '<s>', '</s>']
+RESIDUES = 'ACDEFGHIKLMNPQRSTVWY'
+
+
+def residue_tokenizer(special_tokens=True, padding_side='right'):
+    """One token per residue, as the FAbCon tokenizer, optionally with <s> and </s> either side"""
+    vocab = {token: token_id for token_id, token in enumerate(SPECIAL_TOKENS + list(RESIDUES + 'X'))}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token='<unk>'))
+    tokenizer.pre_tokenizer = pre_tokenizers.Split(Regex(''), 'isolated')
+    if special_tokens:
+        tokenizer.post_processor = processors.TemplateProcessing(
+            single='<s> $A </s>', special_tokens=[('<s>', vocab['<s>']), ('</s>', vocab['</s>'])]
+        )
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, pad_token='<pad>', unk_token='<unk>', bos_token='<s>', eos_token='</s>',
+        padding_side=padding_side
+    )
+
+
+def save_tiny_model(model_path, seed):
+    """A randomly initialised two-layer Falcon classifier, small enough to export and run in a test"""
+    torch.manual_seed(seed)
+    config = FalconConfig(
+        vocab_size=27,
+        hidden_size=32,
+        ffn_hidden_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_labels=2,
+        pad_token_id=0,
+        bias=False,
+        alibi=False,
+        new_decoder_architecture=False,
+        parallel_attn=True
+    )
+    FalconForSequenceClassification(config).eval().save_pretrained(model_path)
+    return model_path
+
+
+def batch(seed=1):
+    """Right padded token ids of different lengths, as the tokenizer batches them"""
+    generator = torch.Generator().manual_seed(seed)
+    input_ids = torch.randint(5, 27, (8, 24), generator=generator)
+    attention_mask = torch.ones_like(input_ids)
+    for row, length in enumerate(range(10, 26, 2)):
+        input_ids[row, length:] = 0
+        attention_mask[row, length:] = 0
+    return input_ids, attention_mask
+
+
+def human_probability(model, input_ids, attention_mask):
+    with torch.no_grad():
+        logits = model(input_ids=input_ids, attention_mask=attention_mask).logits
+    return torch.softmax(logits, dim=1)[:, -1].numpy()
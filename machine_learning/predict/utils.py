@@ -1,4 +1,12 @@
 from Bio.Seq import Seq
+from Bio.Data.CodonTable import TranslationError
+from collections import OrderedDict
+from functools import lru_cache
+import itertools
+import multiprocessing
+import numpy as np
+import pandas as pd
+import pyarrow as pa
 import re
 
 def get_full_aa_sub(aln_seq: str, germ_seq: str) -> str:
@@ -21,4 +29,273 @@ def get_full_aa_sub(aln_seq: str, germ_seq: str) -> str:
     cut_length = len(aln_seq) - len(the_seq)
     pasted = germ_seq[:int(cut_length)] + the_seq
     
-    return str(Seq(pasted.replace(".", "").replace("-", "")).translate())
\ No newline at end of file
+    return str(Seq(pasted.replace(".", "").replace("-", "")).translate())
+
+# IUPAC nucleotide letters (DNA and RNA, including ambiguity codes) accepted by Bio.Seq.translate
+NUCLEOTIDE_LETTERS = 'ACGTURYWSMKHBVDN'
+
+
+@lru_cache(maxsize=None)
+def get_codon_lookup_table():
+    """Build the uint8 lookup tables used by get_full_aa_sub_batch
+
+    Every codon over NUCLEOTIDE_LETTERS is translated once with Bio.Seq so the
+    table reproduces its handling of ambiguity codes ('GGN' -> 'G', 'TAN' -> 'X')
+    exactly.
+
+    Returns:
+        tuple: (nucleotide_codes, amino_acids). nucleotide_codes maps a byte to
+        its index in NUCLEOTIDE_LETTERS (either case), with any other byte mapped
+        to len(NUCLEOTIDE_LETTERS). amino_acids is indexed by three such codes
+        and holds the amino acid byte, or 0 where Bio.Seq would not translate.
+    """
+    n_letters = len(NUCLEOTIDE_LETTERS)
+    nucleotide_codes = np.full(256, n_letters, dtype=np.uint8)
+    for code, letter in enumerate(NUCLEOTIDE_LETTERS):
+        nucleotide_codes[ord(letter)] = code
+        nucleotide_codes[ord(letter.lower())] = code
+
+    amino_acids = np.zeros((n_letters + 1,) * 3, dtype=np.uint8)
+    for codon in itertools.product(range(n_letters), repeat=3):
+        try:
+            amino_acid = Seq(''.join(NUCLEOTIDE_LETTERS[code] for code in codon)).translate()
+        except TranslationError:
+            continue
+        amino_acids[codon] = ord(str(amino_acid))
+    return nucleotide_codes, amino_acids
+
+
+def _string_buffer(sequences):
+    """Flat uint8 buffer and int64 offsets of a list of strings (Arrow layout)"""
+    array = pa.array(sequences, type=pa.large_string())
+    offsets = np.frombuffer(array.buffers()[1], dtype=np.int64)[:len(array) + 1]
+    data = array.buffers()[2]
+    data = np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(0, dtype=np.uint8)
+    return data, offsets
+
+
+def _rows_of(positions, offsets):
+    """Row number of each position in a flat buffer"""
+    return np.searchsorted(offsets, positions, side='right') - 1
+
+
+def _exclusive_cumsum(counts):
+    starts = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=starts[1:])
+    return starts
+
+
+def _translate_chunk(aln_seqs, germ_seqs):
+    nucleotide_codes, amino_acids = get_codon_lookup_table()
+    n_letters = len(NUCLEOTIDE_LETTERS)
+    n_rows = len(aln_seqs)
+
+    aln, aln_offsets = _string_buffer(aln_seqs)
+    germ, germ_offsets = _string_buffer(germ_seqs)
+
+    # length of the leading run of '.' in each alignment is the germline back-fill length.
+    # Gaps are sparse, so everything is worked out from the gap positions alone:
+    # position - rank is constant along a run of consecutive dots
+    is_dot = aln == ord('.')
+    is_gap = is_dot | (aln == ord('-'))
+    gap_positions = np.flatnonzero(is_gap)
+    dot_positions = np.flatnonzero(is_dot)
+    dot_runs = dot_positions - np.arange(len(dot_positions))
+    first_dot = np.searchsorted(dot_positions, aln_offsets[:-1])
+    starts_with_dot = np.zeros(n_rows, dtype=bool)
+    has_dot = first_dot < len(dot_positions)
+    starts_with_dot[has_dot] = dot_positions[first_dot[has_dot]] == aln_offsets[:-1][has_dot]
+    run_end = np.searchsorted(dot_runs, dot_runs[np.minimum(first_dot, len(dot_positions) - 1)], side='right') \
+        if len(dot_positions) else first_dot
+    cut_length = np.where(starts_with_dot, np.minimum(run_end - first_dot, np.diff(aln_offsets)), 0)
+
+    # germline[:cut_length], gathered without touching the rest of the germline
+    prefix_lengths = np.minimum(cut_length, np.diff(germ_offsets))
+    prefix_starts = _exclusive_cumsum(prefix_lengths)
+    prefix = germ[np.arange(prefix_starts[-1]) + np.repeat(germ_offsets[:-1] - prefix_starts[:-1], prefix_lengths)]
+
+    # rows with multi-byte characters are left to get_full_aa_sub, since slicing
+    # by character and by byte would disagree
+    needs_fallback = np.zeros(n_rows, dtype=bool)
+    needs_fallback[_rows_of(np.flatnonzero(aln >= 128), aln_offsets)] = True
+    needs_fallback[_rows_of(np.flatnonzero(prefix >= 128), prefix_starts)] = True
+
+    # germline prefix + alignment with gaps stripped. The leading dots of the
+    # alignment are gaps themselves so the whole alignment can be kept
+    prefix_keep = (prefix != ord('.')) & (prefix != ord('-'))
+    prefix_kept_lengths = prefix_lengths - np.diff(np.searchsorted(np.flatnonzero(~prefix_keep), prefix_starts))
+    aln_kept_lengths = np.diff(aln_offsets) - np.diff(np.searchsorted(gap_positions, aln_offsets))
+    pasted = np.insert(
+        aln[~is_gap],
+        np.repeat(_exclusive_cumsum(aln_kept_lengths)[:-1], prefix_kept_lengths),
+        prefix[prefix_keep]
+    )
+    pasted_offsets = _exclusive_cumsum(prefix_kept_lengths + aln_kept_lengths)
+
+    # translate whole codons only; a trailing partial codon is dropped as Bio.Seq does
+    n_codons = np.diff(pasted_offsets) // 3
+    protein_offsets = _exclusive_cumsum(n_codons)
+    codon_starts = 3 * np.arange(protein_offsets[-1]) + np.repeat(pasted_offsets[:-1] - 3 * protein_offsets[:-1], n_codons)
+    codes = nucleotide_codes[pasted].astype(np.uint16)
+    protein = amino_acids.ravel()[
+        (codes[codon_starts] * (n_letters + 1) + codes[codon_starts + 1]) * (n_letters + 1) + codes[codon_starts + 2]
+    ]
+    needs_fallback[_rows_of(np.flatnonzero(protein == 0), protein_offsets)] = True
+
+    translated = pa.LargeStringArray.from_buffers(
+        n_rows, pa.py_buffer(protein_offsets), pa.py_buffer(protein)
+    ).to_numpy(zero_copy_only=False)
+    for row in np.flatnonzero(needs_fallback):
+        translated[row] = get_full_aa_sub(aln_seqs[row], germ_seqs[row])
+    return translated
+
+
+def get_full_aa_sub_batch(aln_seqs, germ_seqs, n_processes: int = 1, chunk_size: int = 100000):
+    """Vectorised get_full_aa_sub over whole columns
+
+    The germline back-fill, gap stripping and codon translation are done on flat
+    uint8 buffers of all sequences at once, translating codons through a lookup
+    table. Output is identical to applying get_full_aa_sub row by row; rows with
+    characters the table does not cover are passed to get_full_aa_sub itself.
+
+    Parameters
+    ----------
+    aln_seqs : iterable of str
+        sequence_alignment values.
+    germ_seqs : iterable of str
+        germline_alignment_d_mask values.
+    n_processes : int
+        Number of worker processes. Inputs longer than chunk_size are split into
+        chunks of chunk_size rows and translated in parallel.
+    chunk_size : int
+        Rows per chunk. Also bounds the size of the intermediate buffers.
+
+    Returns:
+        np.ndarray: object array of amino acid sequences
+    """
+    # str() matches the row-wise path, where missing values become 'nan'
+    aln_seqs = [str(s) for s in aln_seqs]
+    germ_seqs = [str(s) for s in germ_seqs]
+
+    chunks = [
+        (aln_seqs[start:start + chunk_size], germ_seqs[start:start + chunk_size])
+        for start in range(0, len(aln_seqs), chunk_size)
+    ]
+    if not chunks:
+        return np.array([], dtype=object)
+    if n_processes > 1 and len(chunks) > 1:
+        with multiprocessing.Pool(n_processes) as pool:
+            translated = pool.starmap(_translate_chunk, chunks)
+    else:
+        translated = [_translate_chunk(*chunk) for chunk in chunks]
+    return np.concatenate(translated)
+
+
+class TranslationCache:
+    """Bounded LRU cache of translations keyed by (sequence_alignment, germline_alignment_d_mask)
+
+    Used where the same clonotypes are translated repeatedly, e.g. across the
+    chunks of a streamed file. Misses are translated together with
+    get_full_aa_sub_batch.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of pairs held. The least recently used pairs are evicted first.
+    """
+    def __init__(self, maxsize: int = 200000):
+        self.maxsize = maxsize
+        self.translations = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def translate(self, aln_seqs, germ_seqs, n_processes: int = 1):
+        keys = list(zip(aln_seqs, germ_seqs))
+        translated = np.empty(len(keys), dtype=object)
+        missing = []
+        for index, key in enumerate(keys):
+            translation = self.translations.get(key)
+            if translation is None:
+                missing.append(index)
+            else:
+                self.translations.move_to_end(key)
+                translated[index] = translation
+
+        if missing:
+            translated[missing] = get_full_aa_sub_batch(
+                [keys[index][0] for index in missing],
+                [keys[index][1] for index in missing],
+                n_processes=n_processes
+            )
+            for index in missing:
+                self.translations[keys[index]] = translated[index]
+            while len(self.translations) > self.maxsize:
+                self.translations.popitem(last=False)
+
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        return translated
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def translate_unique_pairs(aln_seqs, germ_seqs, n_processes: int = 1, cache: TranslationCache = None):
+    """Translate each distinct (sequence_alignment, germline_alignment_d_mask) pair once
+
+    Expanded clones share identical alignment pairs, so the pairs are factorised
+    into integer codes, only the unique pairs are translated, and the results are
+    broadcast back to every row by code.
+
+    Parameters
+    ----------
+    aln_seqs : array-like
+        sequence_alignment values.
+    germ_seqs : array-like
+        germline_alignment_d_mask values.
+    n_processes : int
+        Passed to get_full_aa_sub_batch.
+    cache : TranslationCache, optional
+        Cache consulted for the unique pairs before translating them.
+
+    Returns:
+        np.ndarray: object array of amino acid sequences, one per row
+    """
+    # missing values are kept as their own category so they translate like str(nan) does
+    aln_codes, aln_uniques = pd.factorize(aln_seqs, use_na_sentinel=False)
+    germ_codes, germ_uniques = pd.factorize(germ_seqs, use_na_sentinel=False)
+    n_germ = max(len(germ_uniques), 1)
+    pair_codes, unique_pairs = pd.factorize(aln_codes.astype(np.int64) * n_germ + germ_codes)
+
+    unique_aln = np.asarray(aln_uniques, dtype=object)[unique_pairs // n_germ]
+    unique_germ = np.asarray(germ_uniques, dtype=object)[unique_pairs % n_germ]
+    if cache is not None:
+        translated = cache.translate(unique_aln, unique_germ, n_processes=n_processes)
+    else:
+        translated = get_full_aa_sub_batch(unique_aln, unique_germ, n_processes=n_processes)
+    return translated[pair_codes]
+
+
+def random_heavy_chains(n_sequences: int, min_length: int = 110, max_length: int = 140, seed: int = 0):
+    """Random amino acid sequences with heavy chain lengths, for benchmarks and checks
+
+    Parameters
+    ----------
+    n_sequences : int
+        Number of sequences.
+    min_length, max_length : int
+        Inclusive range of sequence lengths.
+    seed : int
+        Random seed.
+
+    Returns:
+        list: amino acid sequences without the chain token
+    """
+    rng = np.random.default_rng(seed)
+    amino_acids = np.frombuffer(b'ACDEFGHIKLMNPQRSTVWY', dtype=np.uint8)
+    lengths = rng.integers(min_length, max_length + 1, size=n_sequences)
+    residues = amino_acids[rng.integers(len(amino_acids), size=lengths.sum())].tobytes().decode()
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    return [residues[start:end] for start, end in zip(offsets[:-1], offsets[1:])]